@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""Local agent that aggregates spans sent by many processes on the same host.
+
+Workers send their encoded payloads to the agent through a
+`UnixSocketTransport`. The agent merges them into bigger batches, without
+decoding them, and forwards them to the collector over a single pooled
+connection. This cuts down the number of requests the collector has to
+handle when a host runs many worker processes.
+
+Usage::
+
+    python -m py_zipkin.agent --socket /var/run/zipkin.sock \\
+        --encoding V2_JSON --collector-host zipkin --collector-port 9411
+
+All the workers must use the encoding the agent has been started with.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+from six.moves import queue
+from six.moves import socketserver
+
+from py_zipkin.encoding import Encoding
+from py_zipkin.exception import ZipkinError
+from py_zipkin.thrift import encode_list_header
+from py_zipkin.transport import _forward_payload
+from py_zipkin.transport import _FRAME_HEADER
+from py_zipkin.transport import BaseTransportHandler
+from py_zipkin.transport import Payload
+from py_zipkin.transport import PooledHTTPTransport
+
+log = logging.getLogger("py_zipkin.agent")
+
+# Used when the upstream transport doesn't have a max payload size.
+_DEFAULT_MAX_PAYLOAD_BYTES = 1024 * 1024
+# Connections sending bigger frames are closed, they're probably garbage.
+_MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+# TType.STRUCT, first byte of every encoded list of thrift spans.
+_THRIFT_LIST_OF_STRUCTS = b"\x0c"
+_thrift_list_size = struct.Struct("!i")
+
+# Sentinel pushed in the queue to stop the sender thread.
+_STOP = object()
+# Sentinel pushed in the queue when a batch starts while the sender is idle.
+_WAKEUP = object()
+
+
+def _merge_thrift(payloads):
+    size = 0
+    bodies = []
+    for payload in payloads:
+        size += _thrift_list_size.unpack_from(payload, 1)[0]
+        bodies.append(payload[5:])
+    return encode_list_header(size) + b"".join(bodies)
+
+
+def _merge_json(payloads):
+    elements = []
+    for payload in payloads:
+        inner = payload.strip()[1:-1].strip()
+        if inner:
+            elements.append(inner)
+    return b"[" + b",".join(elements) + b"]"
+
+
+def _merge_proto(payloads):
+    # The concatenation of encoded ListOfSpans is still a valid ListOfSpans.
+    return b"".join(payloads)
+
+
+def _is_thrift_list(payload):
+    return payload[:1] == _THRIFT_LIST_OF_STRUCTS and len(payload) >= 5
+
+
+def _is_json_list(payload):
+    payload = payload.strip()
+    return payload[:1] == b"[" and payload[-1:] == b"]"
+
+
+def _is_proto_list(payload):
+    return len(payload) > 0
+
+
+_MERGERS = {
+    Encoding.V1_THRIFT: (_is_thrift_list, _merge_thrift),
+    Encoding.V1_JSON: (_is_json_list, _merge_json),
+    Encoding.V2_JSON: (_is_json_list, _merge_json),
+    Encoding.V2_PROTO3: (_is_proto_list, _merge_proto),
+}
+
+
+def merge_payloads(encoding, payloads):
+    """Merges encoded lists of spans into a single encoded list.
+
+    The spans are not decoded: thrift list headers are added up, JSON lists
+    are joined and protobuf lists are concatenated. The merged payload is
+    never bigger than the sum of the input payloads.
+
+    :param encoding: encoding of the payloads.
+    :type encoding: Encoding
+    :param payloads: encoded lists of spans.
+    :type payloads: list of bytes
+    :returns: encoded list with all the spans.
+    :rtype: bytes
+    """
+    return _MERGERS[encoding][1](payloads)
+
+
+class _AgentRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        agent = self.server.agent
+        while True:
+            header = self.rfile.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size:
+                return
+            (size,) = _FRAME_HEADER.unpack(header)
+            if size > _MAX_FRAME_BYTES:
+                log.warning("Closing connection sending a {} bytes frame".format(size))
+                return
+            payload = self.rfile.read(size)
+            if len(payload) < size:
+                return
+            agent.add_payload(payload)
+
+
+class _AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, agent):
+        self.agent = agent
+        socketserver.UnixStreamServer.__init__(
+            self, agent.socket_path, _AgentRequestHandler,
+        )
+
+
+class Agent(object):
+    """Accepts payloads on a Unix domain socket and forwards them upstream in
+    bigger batches.
+
+    Payloads are merged until the batch would exceed `max_payload_bytes` or
+    until `flush_interval` seconds have passed since the first payload of
+    the batch was received. Batches are sent by a single background thread,
+    so a slow collector never blocks the workers: if too many batches are
+    waiting to be sent, new ones are dropped and counted in
+    `batches_dropped`.
+
+    .. code-block:: python
+
+        agent = Agent(
+            '/var/run/zipkin.sock',
+            PooledHTTPTransport('zipkin', 9411),
+            Encoding.V2_JSON,
+        )
+        agent.serve_forever()
+    """
+
+    def __init__(
+        self,
+        socket_path,
+        transport_handler,
+        encoding,
+        flush_interval=1.0,
+        max_payload_bytes=None,
+        max_queued_batches=100,
+    ):
+        """Creates a new Agent.
+
+        :param socket_path: path of the Unix domain socket to listen on.
+        :type socket_path: str
+        :param transport_handler: transport used to send the merged batches.
+        :type transport_handler: BaseTransportHandler
+        :param encoding: encoding used by the workers.
+        :type encoding: Encoding
+        :param flush_interval: max number of seconds a payload can sit in the
+            agent before being sent.
+        :type flush_interval: float
+        :param max_payload_bytes: max size of the merged batches. Defaults to
+            the max payload size of `transport_handler`, or 1MB.
+        :type max_payload_bytes: int
+        :param max_queued_batches: max number of batches waiting to be sent.
+        :type max_queued_batches: int
+        """
+        if encoding not in _MERGERS:
+            raise ZipkinError("Unknown encoding: {}".format(encoding))
+        if max_payload_bytes is None and isinstance(
+            transport_handler, BaseTransportHandler,
+        ):
+            max_payload_bytes = transport_handler.get_max_payload_bytes()
+
+        self.socket_path = socket_path
+        self.transport_handler = transport_handler
+        self.encoding = encoding
+        self.flush_interval = flush_interval
+        self.max_payload_bytes = max_payload_bytes or _DEFAULT_MAX_PAYLOAD_BYTES
+
+        self.payloads_received = 0
+        self.payloads_dropped = 0
+        self.batches_sent = 0
+        self.batches_dropped = 0
+        self.send_errors = 0
+
+        self._is_valid, self._merge = _MERGERS[encoding]
+        self._lock = threading.Lock()
+        self._payloads = []
+        self._buffered_bytes = 0
+        self._batch_started = None
+        # Set by the sender when it waits for batches without a deadline.
+        self._sender_idle = False
+        self._batches = queue.Queue(maxsize=max_queued_batches)
+        self._server = None
+        self._threads = []
+
+    def add_payload(self, payload):
+        """Adds an encoded list of spans to the current batch.
+
+        :param payload: encoded list of spans.
+        :type payload: bytes
+        """
+        if not self._is_valid(payload):
+            with self._lock:
+                self.payloads_dropped += 1
+            log.warning("Dropping payload not encoded as {}".format(self.encoding))
+            return
+
+        batches = []
+        wake_sender = False
+        with self._lock:
+            self.payloads_received += 1
+            if (
+                self._payloads
+                and self._buffered_bytes + len(payload) > self.max_payload_bytes
+            ):
+                batches.append(self._take_batch())
+            if not self._payloads:
+                self._batch_started = time.time()
+                # The flush interval starts now, the sender has to know.
+                wake_sender, self._sender_idle = self._sender_idle, False
+            self._payloads.append(payload)
+            self._buffered_bytes += len(payload)
+            if self._buffered_bytes >= self.max_payload_bytes:
+                # A single payload can't be split without decoding it, so
+                # oversized ones are sent on their own.
+                batches.append(self._take_batch())
+        for batch in batches:
+            self._queue_batch(batch)
+        if wake_sender:
+            try:
+                self._batches.put_nowait(_WAKEUP)
+            except queue.Full:
+                # The sender has batches to send, it'll see the new deadline
+                # afterwards.
+                pass
+
+    def _take_batch(self):
+        """Merges the buffered payloads. Must be called with the lock held."""
+        if not self._payloads:
+            return None
+        batch = self._merge(self._payloads)
+        self._payloads = []
+        self._buffered_bytes = 0
+        self._batch_started = None
+        return batch
+
+    def _queue_batch(self, batch):
+        if batch is None:
+            return
+        try:
+            self._batches.put_nowait(batch)
+        except queue.Full:
+            with self._lock:
+                self.batches_dropped += 1
+
+    def flush(self):
+        """Queues the current batch to be sent, even if it's not full."""
+        with self._lock:
+            batch = self._take_batch()
+        self._queue_batch(batch)
+
+    def _send(self, batch):
+        try:
+            # All the batches have the agent's encoding, the upstream
+            # transport doesn't need to detect it.
+            _forward_payload(
+                self.transport_handler, Payload(batch, self.encoding, None),
+            )
+            self.batches_sent += 1
+        except Exception as e:
+            self.send_errors += 1
+            log.error("Error forwarding zipkin spans. {}".format(repr(e)))
+
+    def _run_sender(self):
+        while True:
+            # The only deadline is flush_interval after the first payload of
+            # the current batch. Without one, wait until add_payload starts
+            # a batch.
+            with self._lock:
+                started = self._batch_started
+                self._sender_idle = started is None
+            timeout = None
+            if started is not None:
+                timeout = max(started + self.flush_interval - time.time(), 0)
+
+            try:
+                batch = self._batches.get(timeout=timeout)
+            except queue.Empty:
+                with self._lock:
+                    if self._batch_started == started:
+                        batch = self._take_batch()
+                    else:
+                        # Flushed in the meantime, there's a new deadline.
+                        batch = None
+
+            if batch is _STOP:
+                with self._lock:
+                    self._sender_idle = False
+                    batch = self._take_batch()
+                # Don't lose what was queued before stopping.
+                while batch is not None:
+                    if batch is not _WAKEUP:
+                        self._send(batch)
+                    try:
+                        batch = self._batches.get_nowait()
+                    except queue.Empty:
+                        batch = None
+                return
+            if batch is not None and batch is not _WAKEUP:
+                self._send(batch)
+
+    def _bind(self):
+        if os.path.exists(self.socket_path):
+            # Only remove stale sockets, not the one of a running agent.
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+            except socket.error:
+                os.unlink(self.socket_path)
+            else:
+                raise ZipkinError(
+                    "An agent is already listening on {}".format(self.socket_path),
+                )
+            finally:
+                sock.close()
+        self._server = _AgentServer(self)
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def start(self):
+        """Starts listening and forwarding from background threads."""
+        self._bind()
+        self._start_thread(self._run_sender, "py_zipkin.Agent.sender")
+        self._start_thread(self._server.serve_forever, "py_zipkin.Agent.server")
+
+    def serve_forever(self):
+        """Listens in the current thread until interrupted, then sends what's
+        still buffered and stops."""
+        self._bind()
+        self._start_thread(self._run_sender, "py_zipkin.Agent.sender")
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self, timeout=None):
+        """Stops listening and sends what's still buffered.
+
+        :param timeout: max number of seconds to wait for the pending
+            batches to be sent.
+        :type timeout: float
+        """
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+
+        server.shutdown()
+        server.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        # This blocks if the queue is full, until the sender frees up a slot.
+        self._batches.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+def _parse_encoding(name):
+    try:
+        return Encoding[name.upper()]
+    except KeyError:
+        raise argparse.ArgumentTypeError("Unknown encoding: {}".format(name))
+
+
+def parse_args(argv):
+    encodings = ", ".join(e.name for e in Encoding)
+    parser = argparse.ArgumentParser(
+        prog="python -m py_zipkin.agent",
+        description="Merges spans sent by local processes and forwards them "
+        "to a zipkin collector.",
+    )
+    parser.add_argument(
+        "-s", "--socket", required=True, help="path of the Unix domain socket.",
+    )
+    parser.add_argument(
+        "-e",
+        "--encoding",
+        required=True,
+        type=_parse_encoding,
+        help="encoding used by the workers, one of: {}.".format(encodings),
+    )
+    parser.add_argument(
+        "--collector-host", default="localhost", help="zipkin collector host.",
+    )
+    parser.add_argument(
+        "--collector-port", type=int, default=9411, help="zipkin collector port.",
+    )
+    parser.add_argument(
+        "--compress", action="store_true", help="gzip the forwarded batches.",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=1.0,
+        help="max seconds a span is buffered before being sent (default: 1).",
+    )
+    parser.add_argument(
+        "--max-payload-bytes",
+        type=int,
+        default=_DEFAULT_MAX_PAYLOAD_BYTES,
+        help="max size of the forwarded batches (default: 1MB).",
+    )
+    return parser.parse_args(argv)
+
+
+def _exit_on_sigterm(signum, frame):
+    sys.exit(0)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    transport = PooledHTTPTransport(
+        args.collector_host, args.collector_port, compress=args.compress,
+    )
+    agent = Agent(
+        args.socket,
+        transport,
+        args.encoding,
+        flush_interval=args.flush_interval,
+        max_payload_bytes=args.max_payload_bytes,
+    )
+
+    # serve_forever sends what's still buffered when SystemExit is raised.
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        agent.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        transport.close()
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
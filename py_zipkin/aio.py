@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""asyncio transport and reporter.
+
+zipkin_span sends spans synchronously when the root span exits, so in an
+asyncio application any network I/O done by the transport blocks the event
+loop and delays every in-flight request. `AsyncioReporter` only queues the
+payloads and sends them from a background task instead.
+
+This module uses async/await, so it requires python 3.5+.
+
+.. code-block:: python
+
+    reporter = AsyncioReporter(AsyncioHTTPTransport('localhost', 9411))
+
+    async def handle(request):
+        with zipkin_span(
+            service_name='my_service',
+            span_name='handle',
+            transport_handler=reporter,
+            encoding=Encoding.V2_JSON,
+            sample_rate=0.05,
+        ):
+            return await do_stuff()
+
+    # On shutdown, to send the spans that are still queued.
+    await reporter.close()
+"""
+import asyncio
+import logging
+
+import six
+
+from py_zipkin.agent import _DEFAULT_MAX_PAYLOAD_BYTES
+from py_zipkin.agent import merge_payloads
+from py_zipkin.encoding import detect_span_version_and_encoding
+from py_zipkin.exception import ZipkinError
+from py_zipkin.transport import _forward_payload
+from py_zipkin.transport import BaseTransportHandler
+from py_zipkin.transport import Payload
+from py_zipkin.transport import SimpleHTTPTransport
+
+log = logging.getLogger("py_zipkin.aio")
+
+# Sentinel pushed in the queue to stop the sender task.
+_STOP = object()
+
+# Responses to these never have a body.
+_NO_BODY_STATUSES = (204, 304)
+
+
+def _detect_encoding(payload):
+    try:
+        return detect_span_version_and_encoding(payload)
+    except Exception:
+        return None
+
+
+class AsyncioHTTPTransport(SimpleHTTPTransport):
+    def __init__(
+        self,
+        address,
+        port,
+        connect_timeout=1.0,
+        read_timeout=5.0,
+        compress=False,
+        compression_level=6,
+        compression_min_bytes=1024,
+        max_compressed_payload_bytes=None,
+    ):
+        """HTTP transport built on asyncio streams.
+
+        It keeps a single keep-alive connection to the collector and sends
+        one payload at a time, so it's meant to be used through an
+        `AsyncioReporter` and not passed directly to zipkin_span.
+
+        :param address: zipkin server address.
+        :type address: str
+        :param port: zipkin server port.
+        :type port: int
+        :param connect_timeout: timeout in seconds to open a connection.
+        :type connect_timeout: float
+        :param read_timeout: timeout in seconds when waiting for the collector
+            to answer.
+        :type read_timeout: float
+
+        See :class:`SimpleHTTPTransport` for the compression arguments.
+        """
+        super(AsyncioHTTPTransport, self).__init__(
+            address,
+            port,
+            compress=compress,
+            compression_level=compression_level,
+            compression_min_bytes=compression_min_bytes,
+            max_compressed_payload_bytes=max_compressed_payload_bytes,
+        )
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self._reader = None
+        self._writer = None
+
+    def send(self, payload):
+        raise ZipkinError("AsyncioHTTPTransport must be used by an AsyncioReporter")
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.address, self.port), self.connect_timeout,
+        )
+
+    def _build_request(self, path, body, headers):
+        lines = [
+            "POST {} HTTP/1.1".format(path),
+            "Host: {}:{}".format(self.address, self.port),
+            "Content-Length: {}".format(len(body)),
+        ]
+        lines.extend("{}: {}".format(name, value) for name, value in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+    async def _read_chunked_body(self):
+        while True:
+            size = int((await self._reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # Skip the trailers.
+                while (await self._reader.readline()).strip():
+                    pass
+                return
+            await self._reader.readexactly(size + 2)
+
+    async def _read_response(self):
+        """Reads a whole response, so that the connection can be reused.
+
+        :returns: (status, reason, whether the connection must be closed)
+        :rtype: (int, str, bool)
+        """
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the collector")
+        parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        version, status = parts[0], int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ""
+
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if not line.strip():
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        will_close = connection == "close" or (
+            version == "HTTP/1.0" and connection != "keep-alive"
+        )
+
+        if status < 200 or status in _NO_BODY_STATUSES:
+            pass
+        elif "content-length" in headers:
+            await self._reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            await self._read_chunked_body()
+        else:
+            # The body ends when the collector closes the connection.
+            await self._reader.read()
+            will_close = True
+
+        return status, reason, will_close
+
+    async def _post(self, request):
+        self._writer.write(request)
+        await self._writer.drain()
+        return await self._read_response()
+
+    async def send_async(self, payload):
+        """Sends the encoded payload to the collector.
+
+        :param payload: encoded list of spans.
+        :type payload: bytes or Payload
+        """
+        encoding = None
+        if isinstance(payload, Payload):
+            payload, encoding = payload.data, payload.encoding
+        path, body, headers = self._prepare_request(payload, encoding)
+        request = self._build_request(path, body, headers)
+
+        is_new = self._writer is None
+        if is_new:
+            await self._connect()
+        try:
+            try:
+                status, reason, will_close = await asyncio.wait_for(
+                    self._post(request), self.read_timeout,
+                )
+            except asyncio.TimeoutError:
+                raise
+            except (OSError, asyncio.IncompleteReadError):
+                if is_new:
+                    raise
+                # The collector probably closed the idle connection.
+                self.close()
+                await self._connect()
+                status, reason, will_close = await asyncio.wait_for(
+                    self._post(request), self.read_timeout,
+                )
+        except BaseException:
+            # Timeouts and cancellations leave the connection in an unknown
+            # state, so it can't be reused.
+            self.close()
+            raise
+
+        if will_close:
+            self.close()
+
+        if not 200 <= status < 300:
+            raise ZipkinError(
+                "Zipkin collector returned {} {}".format(status, reason),
+            )
+
+    def close(self):
+        """Closes the connection to the collector."""
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+class AsyncioReporter(BaseTransportHandler):
+    """Sends payloads from a background asyncio task.
+
+    AsyncioReporter can be used anywhere a `transport_handler` is accepted.
+    When a root `zipkin_span` exits, the encoded payloads are put in a
+    bounded queue and the reporter task sends them through the wrapped
+    transport, merging the payloads that piled up in the meantime. When the
+    queue is full new payloads are dropped and counted in
+    `payloads_dropped`, so tracing never blocks the event loop.
+
+    The wrapped transport can either be an asyncio one, like
+    `AsyncioHTTPTransport`, or a regular blocking transport. Blocking
+    transports are run in the loop's default executor. Asyncio transports
+    get a `Payload` in `send_async`, so they know the encoding of the data.
+
+    `send` must be called from the event loop thread; use `AsyncReporter`
+    for threaded code.
+    """
+
+    def __init__(self, transport_handler, max_queue_size=1000, timeout=5.0):
+        """Creates a new AsyncioReporter.
+
+        :param transport_handler: transport used to send the payloads.
+        :type transport_handler: AsyncioHTTPTransport or BaseTransportHandler
+        :param max_queue_size: max number of payloads waiting to be sent. New
+            payloads are dropped when the queue is full.
+        :type max_queue_size: int
+        :param timeout: max number of seconds to send a payload.
+        :type timeout: float
+        """
+        super(AsyncioReporter, self).__init__()
+        self.transport_handler = transport_handler
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout
+
+        self.payloads_sent = 0
+        self.payloads_dropped = 0
+        self.send_errors = 0
+
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self._pending = None
+        self._closed = False
+
+    def get_max_payload_bytes(self):
+        """Payloads are forwarded to the wrapped transport, so they need to
+        respect its max payload size."""
+        if isinstance(self.transport_handler, BaseTransportHandler):
+            return self.transport_handler.get_max_payload_bytes()
+        return None
+
+    def send(self, payload):
+        """Queues an encoded payload. This never blocks."""
+        self.send_payload(Payload(payload, None, None))
+
+    def send_payload(self, payload):
+        """Queues a payload, keeping its encoding so that it doesn't need to
+        be detected again. This never blocks."""
+        if self._closed:
+            self.payloads_dropped += 1
+            return
+        if isinstance(payload.data, six.text_type):
+            payload = Payload(
+                payload.data.encode("utf-8"), payload.encoding, payload.span_count,
+            )
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.payloads_dropped += 1
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._loop = asyncio.get_event_loop()
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = self._loop.create_task(self._run())
+
+    def _next_batch(self, first):
+        """Merges the payloads that are already queued behind `first`.
+
+        A payload that doesn't fit in the batch is kept for the next one.
+
+        :returns: (merged Payload, number of merged payloads)
+        """
+        max_bytes = self.get_max_payload_bytes() or _DEFAULT_MAX_PAYLOAD_BYTES
+        encoding = first.encoding or _detect_encoding(first.data)
+        if encoding is None:
+            raise ZipkinError("Payload is not an encoded list of spans")
+        payloads = [first]
+        size = len(first.data)
+
+        while not self._queue.empty():
+            payload = self._queue.get_nowait()
+            if (
+                payload is _STOP
+                or size + len(payload.data) > max_bytes
+                or (payload.encoding or _detect_encoding(payload.data)) != encoding
+            ):
+                self._pending = payload
+                break
+            payloads.append(payload)
+            size += len(payload.data)
+
+        if len(payloads) == 1:
+            return Payload(first.data, encoding, first.span_count), 1
+        span_counts = [payload.span_count for payload in payloads]
+        return (
+            Payload(
+                merge_payloads(encoding, [payload.data for payload in payloads]),
+                encoding,
+                None if None in span_counts else sum(span_counts),
+            ),
+            len(payloads),
+        )
+
+    async def _run(self):
+        while True:
+            if self._pending is not None:
+                payload, self._pending = self._pending, None
+            else:
+                payload = await self._queue.get()
+
+            if payload is _STOP:
+                self._queue.task_done()
+                return
+
+            try:
+                batch, count = self._next_batch(payload)
+            except ZipkinError as e:
+                batch, count = None, 1
+                self._on_send_error(e)
+            if batch is not None:
+                await self._send(batch)
+            for _ in range(count):
+                self._queue.task_done()
+
+    async def _send(self, payload):
+        try:
+            if hasattr(self.transport_handler, "send_async"):
+                send = self.transport_handler.send_async(payload)
+            else:
+                send = self._loop.run_in_executor(
+                    None, _forward_payload, self.transport_handler, payload,
+                )
+            await asyncio.wait_for(send, self.timeout)
+            self.payloads_sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._on_send_error(e)
+
+    def _on_send_error(self, error):
+        self.send_errors += 1
+        log.error("Error emitting zipkin trace. {}".format(repr(error)))
+
+    async def flush(self):
+        """Waits until every payload queued so far has been sent."""
+        if self._task is not None:
+            await self._queue.join()
+
+    async def close(self):
+        """Sends everything that's still queued and stops the reporter task.
+
+        Payloads sent after `close` are dropped.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            await self._queue.put(_STOP)
+            await self._task
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Bulk converter for files of encoded spans.
+
+Each input file is expected to contain encoded lists of spans, like the
+payloads sent by the transport handlers. Files holding multiple lists back
+to back, i.e. spool files, are converted to a single list. Files are
+memory-mapped and converted one span at a time, so converting big files
+doesn't need much RAM, and multiple files are converted in parallel by a
+process pool.
+
+Usage::
+
+    python -m py_zipkin.convert --output-encoding V2_JSON \\
+        --output-dir converted/ spool/*.thrift
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import contextlib
+import mmap
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from py_zipkin.encoding import Encoding
+from py_zipkin.encoding import stream_convert_spans
+from py_zipkin.exception import ZipkinError
+
+
+def convert_file(input_path, output_path, output_encoding, input_encoding=None):
+    """Converts a file of encoded spans to a different encoding.
+
+    The output is written to a temporary file with a unique name first and
+    then renamed to `output_path`, so a failed conversion never leaves a
+    partial file behind.
+
+    :param input_path: path of the file to convert.
+    :type input_path: str
+    :param output_path: path of the converted file.
+    :type output_path: str
+    :param output_encoding: desired output encoding.
+    :type output_encoding: Encoding
+    :param input_encoding: optional input encoding. If this is not specified,
+        it's detected from the content of the file.
+    :type input_encoding: Encoding
+    :returns: number of converted spans, or None if the file was just copied
+        since it was already in the right encoding.
+    :rtype: int
+    """
+    if os.path.abspath(input_path) == os.path.abspath(output_path):
+        raise ZipkinError("Refusing to overwrite {}".format(input_path))
+
+    with open(input_path, "rb") as input_file:
+        if os.fstat(input_file.fileno()).st_size == 0:
+            raise ZipkinError("Empty file: {}".format(input_path))
+
+        with contextlib.closing(
+            mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ),
+        ) as spans:
+            tmp_fd, tmp_path = tempfile.mkstemp(
+                suffix=".tmp",
+                prefix=os.path.basename(output_path) + ".",
+                dir=os.path.dirname(os.path.abspath(output_path)),
+            )
+            try:
+                with os.fdopen(tmp_fd, "wb") as output_file:
+                    count = stream_convert_spans(
+                        spans,
+                        output_file,
+                        output_encoding,
+                        input_encoding=input_encoding,
+                    )
+            except Exception:
+                os.remove(tmp_path)
+                raise
+
+    # mkstemp creates files only readable by their owner, give the converted
+    # file the same permissions as open() would.
+    os.chmod(tmp_path, 0o666 & ~_get_umask())
+    os.rename(tmp_path, output_path)
+    return count
+
+
+def _get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def _convert_file_task(task):
+    """Process pool worker. It never raises, errors are returned instead."""
+    input_path = task[0]
+    try:
+        return input_path, convert_file(*task), None
+    except Exception as e:
+        return input_path, None, "{}: {}".format(type(e).__name__, e)
+
+
+def _parse_encoding(name):
+    try:
+        return Encoding[name.upper()]
+    except KeyError:
+        raise argparse.ArgumentTypeError("Unknown encoding: {}".format(name))
+
+
+def parse_args(argv):
+    encodings = ", ".join(e.name for e in Encoding)
+    parser = argparse.ArgumentParser(
+        prog="python -m py_zipkin.convert",
+        description="Converts files of encoded spans to a different encoding.",
+    )
+    parser.add_argument(
+        "files", nargs="+", metavar="FILE", help="files of encoded spans.",
+    )
+    parser.add_argument(
+        "-e",
+        "--output-encoding",
+        required=True,
+        type=_parse_encoding,
+        help="output encoding, one of: {}.".format(encodings),
+    )
+    parser.add_argument(
+        "-i",
+        "--input-encoding",
+        type=_parse_encoding,
+        help="input encoding. By default it's detected for each file.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        required=True,
+        help="directory where converted files are written, with the same name.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help="number of parallel processes (default: number of CPUs).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Output files have the same name as the input ones, so files with the
+    # same name in different directories would overwrite each other.
+    names = collections.Counter(os.path.basename(path) for path in args.files)
+    duplicates = sorted(name for name, count in names.items() if count > 1)
+    if duplicates:
+        print(
+            "Multiple input files are named {}, they can't be converted to the "
+            "same output directory".format(", ".join(duplicates)),
+            file=sys.stderr,
+        )
+        return 1
+
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    tasks = [
+        (
+            path,
+            os.path.join(args.output_dir, os.path.basename(path)),
+            args.output_encoding,
+            args.input_encoding,
+        )
+        for path in args.files
+    ]
+
+    jobs = max(1, min(args.jobs, len(tasks)))
+    if jobs == 1:
+        results = [_convert_file_task(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.map(_convert_file_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    failures = 0
+    for path, count, error in results:
+        if error:
+            failures += 1
+            print("{}: {}".format(path, error), file=sys.stderr)
+        elif count is None:
+            print("{}: copied".format(path))
+        else:
+            print("{}: {} spans".format(path, count))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
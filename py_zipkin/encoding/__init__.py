@@ -1,18 +1,27 @@
 # -*- coding: utf-8 -*-
-import json
+import mmap
 
 import six
 
+from py_zipkin import thrift
+from py_zipkin.encoding._decoders import _iter_json_list
+from py_zipkin.encoding._decoders import _to_bytes
 from py_zipkin.encoding._decoders import get_decoder
 from py_zipkin.encoding._encoders import get_encoder
+from py_zipkin.encoding._helpers import clear_endpoint_cache  # noqa: F401
+from py_zipkin.encoding._helpers import create_cached_endpoint  # noqa: F401
 from py_zipkin.encoding._helpers import create_endpoint  # noqa: F401
 from py_zipkin.encoding._helpers import Endpoint  # noqa: F401
 from py_zipkin.encoding._helpers import Span  # noqa: F401
+from py_zipkin.encoding._transcoders import get_transcoder
 from py_zipkin.encoding._types import Encoding
 from py_zipkin.exception import ZipkinError
 
 _V2_ATTRIBUTES = ["tags", "localEndpoint", "remoteEndpoint", "shared", "kind"]
 
+# Size of the chunks written by stream_convert_spans.
+_WRITE_CHUNK_SIZE = 64 * 1024
+
 
 def detect_span_version_and_encoding(message):
     """Returns the span type and encoding for the message provided.
@@ -21,7 +30,8 @@ def detect_span_version_and_encoding(message):
     https://github.com/openzipkin/zipkin/blob/master/zipkin/src/main/java/zipkin/internal/DetectingSpanDecoder.java
 
     :param message: span to perform operations on.
-    :type message: byte array
+    :type message: byte array or any object supporting the buffer protocol
+        (i.e. mmap)
     :returns: span encoding.
     :rtype: Encoding
     """
@@ -44,23 +54,23 @@ def detect_span_version_and_encoding(message):
             return Encoding.V2_PROTO3
         return Encoding.V1_THRIFT
 
-    str_msg = message.decode("utf-8")
-
-    # JSON case for list of spans
-    if str_msg[0] == "[":
-        span_list = json.loads(str_msg)
-        if len(span_list) > 0:
-            # Assumption: All spans in a list are the same version
-            # Logic: Search for identifying fields in all spans, if any span can
-            # be strictly identified to a version, return that version.
-            # Otherwise, if no spans could be strictly identified, default to V2.
-            for span in span_list:
-                if any(word in span for word in _V2_ATTRIBUTES):
-                    return Encoding.V2_JSON
-                elif "binaryAnnotations" in span or (
-                    "annotations" in span and "endpoint" in span["annotations"]
-                ):
-                    return Encoding.V1_JSON
+    # JSON case for list of spans. Spans are decoded lazily, so we usually
+    # only need to look at the first one.
+    if six.byte2int(message) == ord("["):
+        # Assumption: All spans in a list are the same version
+        # Logic: Search for identifying fields in all spans, if any span can
+        # be strictly identified to a version, return that version.
+        # Otherwise, if no spans could be strictly identified, default to V2.
+        is_empty = True
+        for span in _iter_json_list(message):
+            is_empty = False
+            if any(word in span for word in _V2_ATTRIBUTES):
+                return Encoding.V2_JSON
+            elif "binaryAnnotations" in span or (
+                "annotations" in span and "endpoint" in span["annotations"]
+            ):
+                return Encoding.V1_JSON
+        if not is_empty:
             return Encoding.V2_JSON
 
     raise ZipkinError("Unknown or unsupported span encoding")
@@ -85,8 +95,13 @@ def convert_spans(spans, output_encoding, input_encoding=None):
     if input_encoding == output_encoding:
         return spans
 
-    decoder = get_decoder(input_encoding)
     encoder = get_encoder(output_encoding)
+    transcoder = get_transcoder(input_encoding, output_encoding)
+    if transcoder is not None:
+        # Common conversions skip creating Span objects altogether.
+        return encoder.encode_queue(transcoder.transcode_spans(spans))
+
+    decoder = get_decoder(input_encoding)
     decoded_spans = decoder.decode_spans(spans)
     output_spans = []
 
@@ -96,3 +111,142 @@ def convert_spans(spans, output_encoding, input_encoding=None):
 
     # Outputs from encoder.encode_span() can be easily concatenated in a list
     return encoder.encode_queue(output_spans)
+
+
+def stream_convert_spans(
+    spans, output, output_encoding, input_encoding=None, chunk_size=_WRITE_CHUNK_SIZE,
+):
+    """Converts encoded spans to a different encoding, one span at a time.
+
+    Unlike `convert_spans`, this never holds the whole list of spans in
+    memory: spans are decoded incrementally from the input and the converted
+    ones are written to `output` in chunks of about `chunk_size` bytes.
+
+    NOTE: thrift lists start with the number of elements, so when converting
+    to V1_THRIFT the list header is fixed up at the end. That requires
+    `output` to be seekable, otherwise the converted spans are kept in memory
+    until the end.
+
+    :param spans: encoded input spans. Multiple lists back to back, i.e.
+        batches appended to a spool file, are converted to a single list.
+    :type spans: bytes, any object supporting the buffer protocol (i.e.
+        mmap) or a binary file-like object.
+    :param output: binary file-like object to write the converted spans to.
+    :type output: file
+    :param output_encoding: desired output encoding.
+    :type output_encoding: Encoding
+    :param input_encoding: input encoding. It can be detected automatically
+        unless `spans` is a file-like object.
+    :type input_encoding: Encoding
+    :param chunk_size: how many bytes to buffer before writing to `output`.
+    :type chunk_size: int
+    :returns: number of converted spans, or None if no conversion was needed.
+    :rtype: int
+    """
+    if not isinstance(input_encoding, Encoding):
+        if _is_file(spans):
+            raise ZipkinError("input_encoding is required to stream spans")
+        input_encoding = detect_span_version_and_encoding(message=spans)
+
+    if input_encoding == output_encoding:
+        _copy(spans, output, chunk_size)
+        return None
+
+    writer = _EncodedListWriter(output, output_encoding, chunk_size)
+    transcoder = get_transcoder(input_encoding, output_encoding)
+    if transcoder is not None:
+        for encoded_span in transcoder.iter_transcode_spans(spans):
+            writer.write_encoded(encoded_span)
+    else:
+        decoder = get_decoder(input_encoding)
+        for span in decoder.iter_decode_spans(spans):
+            writer.write(span)
+    return writer.close()
+
+
+def _is_file(spans):
+    # mmap objects have a read method too, but they're buffers.
+    return hasattr(spans, "read") and not isinstance(spans, mmap.mmap)
+
+
+def _copy(spans, output, chunk_size):
+    if isinstance(spans, six.text_type):
+        spans = spans.encode("utf-8")
+    if _is_file(spans):
+        for chunk in iter(lambda: spans.read(chunk_size), b""):
+            output.write(chunk)
+    else:
+        try:
+            view = memoryview(spans)
+        except TypeError:
+            # Python 2 mmaps don't support memoryview, but can be sliced.
+            view = spans
+        for start in range(0, len(view), chunk_size):
+            end = start + chunk_size
+            output.write(_to_bytes(view[start:end]))
+
+
+class _EncodedListWriter(object):
+    """Encodes spans and writes them to a file as a list."""
+
+    def __init__(self, output, encoding, chunk_size):
+        self.output = output
+        self.encoding = encoding
+        self.encoder = get_encoder(encoding)
+        self.chunk_size = chunk_size
+        self.count = 0
+
+        self._chunk = []
+        self._chunk_bytes = 0
+        self._header_pos = None
+        self._buffer_all = False
+
+        if encoding == Encoding.V1_THRIFT:
+            seekable = getattr(output, "seekable", lambda: True)
+            if seekable():
+                # Write a placeholder that we'll fix up in close()
+                self._header_pos = output.tell()
+                self._chunk.append(thrift.encode_list_header(0))
+            else:
+                self._buffer_all = True
+        elif encoding in (Encoding.V1_JSON, Encoding.V2_JSON):
+            self._chunk.append(b"[")
+
+    def write(self, span):
+        self.write_encoded(self.encoder.encode_span(span))
+
+    def write_encoded(self, encoded_span):
+        if isinstance(encoded_span, six.text_type):
+            encoded_span = encoded_span.encode("utf-8")
+        if self.count > 0 and self.encoding in (Encoding.V1_JSON, Encoding.V2_JSON):
+            self._chunk.append(b",")
+        self._chunk.append(encoded_span)
+        self._chunk_bytes += len(encoded_span)
+        self.count += 1
+
+        if self._chunk_bytes >= self.chunk_size and not self._buffer_all:
+            self._flush()
+
+    def _flush(self):
+        self.output.write(b"".join(self._chunk))
+        self._chunk = []
+        self._chunk_bytes = 0
+
+    def close(self):
+        """Writes the end of the list.
+
+        :returns: number of spans written.
+        :rtype: int
+        """
+        if self.encoding in (Encoding.V1_JSON, Encoding.V2_JSON):
+            self._chunk.append(b"]")
+        elif self._buffer_all:
+            self._chunk.insert(0, thrift.encode_list_header(self.count))
+        self._flush()
+
+        if self._header_pos is not None:
+            end = self.output.tell()
+            self.output.seek(self._header_pos)
+            self.output.write(thrift.encode_list_header(self.count))
+            self.output.seek(end)
+        return self.count
@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
+import binascii
+import codecs
+import json
 import logging
+import mmap
 import socket
 import struct
 
 import six
-from thriftpy2.protocol.binary import read_list_begin
-from thriftpy2.protocol.binary import TBinaryProtocol
 from thriftpy2.thrift import TType
-from thriftpy2.transport import TMemoryBuffer
 
+from py_zipkin.encoding.protobuf import _wire as protobuf_wire
 from py_zipkin.encoding._helpers import Endpoint
 from py_zipkin.encoding._helpers import Span
 from py_zipkin.encoding._types import Encoding
@@ -16,8 +18,91 @@ from py_zipkin.encoding._types import Kind
 from py_zipkin.exception import ZipkinError
 from py_zipkin.thrift import zipkin_core
 
-_HEX_DIGITS = "0123456789abcdef"
 _DROP_ANNOTATIONS = {"cs", "sr", "ss", "cr"}
+_NO_PARENT_ID = "0000000000000000"
+_KINDS = {kind.value: kind for kind in Kind}
+
+_unpack_i8 = struct.Struct("!b").unpack_from
+_unpack_i16 = struct.Struct("!h").unpack_from
+_unpack_u16 = struct.Struct("!H").unpack_from
+_unpack_i32 = struct.Struct("!i").unpack_from
+_unpack_u32 = struct.Struct("!I").unpack_from
+_pack_u32 = struct.Struct("!I").pack
+_unpack_i64 = struct.Struct("!q").unpack_from
+_unpack_list_header = struct.Struct("!bi").unpack_from
+_unpack_map_header = struct.Struct("!bbi").unpack_from
+# Field type and id.
+_FIELD_HEADER_SIZE = 3
+_LIST_HEADER_SIZE = 5
+_MAP_HEADER_SIZE = 6
+_FIXED_SIZES = {
+    TType.BOOL: 1,
+    TType.BYTE: 1,
+    TType.DOUBLE: 8,
+    TType.I16: 2,
+    TType.I32: 4,
+    TType.I64: 8,
+}
+
+# Decoded endpoints, most spans share the same ones. Thrift and JSON keys
+# never collide since the first thrift field is an int, and proto3 keys are
+# the encoded Endpoint messages.
+_ENDPOINT_CACHE = {}
+_ENDPOINT_CACHE_MAX_SIZE = 1024
+
+_PROTO_VARINT = 0
+_PROTO_FIXED64 = 1
+_PROTO_LENGTH_DELIMITED = 2
+_PROTO_FIXED32 = 5
+_unpack_proto_fixed64 = struct.Struct("<Q").unpack_from
+_unpack_proto_fixed32 = struct.Struct("<I").unpack_from
+# Field tag and length, a varint is at most 10 bytes.
+_MAX_PROTO_SPAN_HEADER_SIZE = 11
+
+
+def _proto_key(field_number, wire_type):
+    return (field_number << 3) | wire_type
+
+
+# ListOfSpans
+_PROTO_LIST_SPANS = _proto_key(1, _PROTO_LENGTH_DELIMITED)
+# Span
+_PROTO_SPAN_KIND = _proto_key(4, _PROTO_VARINT)
+_PROTO_SPAN_TIMESTAMP = _proto_key(6, _PROTO_FIXED64)
+_PROTO_SPAN_DURATION = _proto_key(7, _PROTO_VARINT)
+_PROTO_SPAN_DEBUG = _proto_key(12, _PROTO_VARINT)
+_PROTO_SPAN_SHARED = _proto_key(13, _PROTO_VARINT)
+# Ids, name, endpoints, annotations and tags.
+_PROTO_SPAN_LENGTH_DELIMITED = frozenset(
+    _proto_key(field_number, _PROTO_LENGTH_DELIMITED)
+    for field_number in (1, 2, 3, 5, 8, 9, 10, 11)
+)
+_PROTO_KINDS = {
+    1: Kind.CLIENT,
+    2: Kind.SERVER,
+    3: Kind.PRODUCER,
+    4: Kind.CONSUMER,
+}
+# Endpoint
+_PROTO_ENDPOINT_SERVICE_NAME = _proto_key(1, _PROTO_LENGTH_DELIMITED)
+_PROTO_ENDPOINT_IPV4 = _proto_key(2, _PROTO_LENGTH_DELIMITED)
+_PROTO_ENDPOINT_IPV6 = _proto_key(3, _PROTO_LENGTH_DELIMITED)
+_PROTO_ENDPOINT_PORT = _proto_key(4, _PROTO_VARINT)
+# Annotation
+_PROTO_ANNOTATION_TIMESTAMP = _proto_key(1, _PROTO_FIXED64)
+_PROTO_ANNOTATION_VALUE = _proto_key(2, _PROTO_LENGTH_DELIMITED)
+# Tags map entry
+_PROTO_TAG_KEY = _proto_key(1, _PROTO_LENGTH_DELIMITED)
+_PROTO_TAG_VALUE = _proto_key(2, _PROTO_LENGTH_DELIMITED)
+
+# Up to here (2038), rounding integer microsecond timestamps to 6 decimals
+# gives the same float as a single division, which is a lot faster.
+_EXACT_US = 2 ** 31 * 1000 * 1000
+
+# How many bytes we read at a time when decoding from a file-like object.
+_READ_CHUNK_SIZE = 64 * 1024
+_JSON_WHITESPACE = " \t\n\r"
+_json_decoder = json.JSONDecoder()
 
 log = logging.getLogger("py_zipkin.encoding")
 
@@ -33,9 +118,11 @@ def get_decoder(encoding):
     if encoding == Encoding.V1_THRIFT:
         return _V1ThriftDecoder()
     if encoding == Encoding.V1_JSON:
-        raise NotImplementedError("{} decoding not yet implemented".format(encoding))
+        return _V1JSONDecoder()
     if encoding == Encoding.V2_JSON:
-        raise NotImplementedError("{} decoding not yet implemented".format(encoding))
+        return _V2JSONDecoder()
+    if encoding == Encoding.V2_PROTO3:
+        return _V2ProtobufDecoder()
     raise ZipkinError("Unknown encoding: {}".format(encoding))
 
 
@@ -52,6 +139,92 @@ class IDecoder(object):
         """
         raise NotImplementedError()
 
+    def iter_decode_spans(self, spans):
+        """Decodes an encoded list of spans incrementally.
+
+        Spans are read and decoded one at a time, so memory usage doesn't
+        depend on the size of the input.
+
+        :param spans: encoded list of spans
+        :type spans: bytes, any object supporting the buffer protocol (i.e.
+            mmap) or a binary file-like object.
+        :return: generator of spans
+        :rtype: iterator of Span
+        """
+        raise NotImplementedError()
+
+
+def _to_bytes(data):
+    """Slices of mmaps are bytes, slices of memoryviews need to be copied."""
+    if isinstance(data, bytes):
+        return data
+    return data.tobytes()
+
+
+class _Reader(object):
+    """Reads exactly the requested number of bytes from a buffer or a file.
+
+    Buffers are read through a memoryview, so they're never copied as a whole.
+    """
+
+    def __init__(self, source):
+        if isinstance(source, six.text_type):
+            source = source.encode("utf-8")
+        try:
+            self._view = memoryview(source)
+            self._file = None
+        except TypeError:
+            if isinstance(source, mmap.mmap):
+                # Python 2 mmaps don't support memoryview. They're sliced
+                # instead, reading them would depend on their file position.
+                self._view = source
+                self._file = None
+            else:
+                self._view = None
+                self._file = source
+        self._pos = 0
+        self._pending = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _exc_traceback):
+        self.close()
+
+    def close(self):
+        """Drops the reference to the source buffer.
+
+        Until then the buffer can't be closed (i.e. mmap.close fails), and if
+        decoding fails tracebacks may keep this object alive for a while.
+        """
+        self._view = None
+        self._file = None
+
+    def _read(self, size):
+        if self._file is not None:
+            return self._file.read(size)
+        start = self._pos
+        end = min(start + size, len(self._view))
+        self._pos = end
+        return _to_bytes(self._view[start:end])
+
+    def unread(self, data):
+        """Puts data back, it will be returned by the next read."""
+        self._pending = data + self._pending
+
+    def read(self, size):
+        """Reads up to size bytes. Returns less only if the input ended."""
+        if self._pending:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        else:
+            data = b""
+        while len(data) < size:
+            chunk = self._read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
 
 class _V1ThriftDecoder(IDecoder):
     def decode_spans(self, spans):
@@ -62,232 +235,1046 @@ class _V1ThriftDecoder(IDecoder):
         :return: list of spans
         :rtype: list of Span
         """
-        decoded_spans = []
-        transport = TMemoryBuffer(spans)
+        return list(self.iter_decode_spans(spans))
 
-        if six.byte2int(spans) == TType.STRUCT:
-            _, size = read_list_begin(transport)
-        else:
-            size = 1
+    def iter_decode_spans(self, spans):
+        """Decodes an encoded list of spans incrementally.
 
-        for _ in range(size):
-            span = zipkin_core.Span()
-            span.read(TBinaryProtocol(transport))
-            decoded_spans.append(self._decode_thrift_span(span))
-        return decoded_spans
-
-    def _convert_from_thrift_endpoint(self, thrift_endpoint):
-        """Accepts a thrift decoded endpoint and converts it to an Endpoint.
-
-        :param thrift_endpoint: thrift encoded endpoint
-        :type thrift_endpoint: thrift endpoint
-        :returns: decoded endpoint
-        :rtype: Encoding
+        :param spans: encoded list of spans
+        :type spans: bytes, buffer or binary file-like object.
+        :return: generator of spans
+        :rtype: iterator of Span
         """
-        ipv4 = None
-        ipv6 = None
-        port = struct.unpack("H", struct.pack("h", thrift_endpoint.port))[0]
+        for span in _iter_thrift_spans(spans):
+            yield span
 
-        if thrift_endpoint.ipv4 != 0:
-            ipv4 = socket.inet_ntop(
-                socket.AF_INET, struct.pack("!i", thrift_endpoint.ipv4),
-            )
+    def seconds(self, us):
+        return _seconds(us)
+
+
+class _EndOfBuffer(Exception):
+    """The buffer ends in the middle of a thrift value."""
+
+
+def _iter_thrift_spans(spans, chunk_size=_READ_CHUNK_SIZE, read_span=None):
+    """Yields the spans of an encoded thrift list one by one.
+
+    The TBinaryProtocol encoding is read directly, without creating thriftpy2
+    objects. Buffers are read in place through a memoryview, while file-like
+    objects are read in chunks and only the span that's currently being
+    decoded is kept in memory. If the input holds multiple lists back to
+    back, i.e. batches appended to a spool file, the spans of all of them
+    are yielded.
+
+    :param spans: encoded list of spans, or a single encoded span.
+    :type spans: bytes, buffer or binary file-like object.
+    :param chunk_size: how many bytes to read at a time from files.
+    :type chunk_size: int
+    :param read_span: function reading a Span struct from (buffer, position)
+        and returning (result, position right after it). Defaults to
+        `_read_span`, which yields Span objects.
+    :type read_span: function
+    :return: generator of spans
+    :rtype: iterator of Span
+    """
+    if read_span is None:
+        read_span = _read_span
+    try:
+        buf = memoryview(spans)
+        reader = None
+    except TypeError:
+        buf = memoryview(b"")
+        reader = _Reader(spans)
+
+    pos = 0
+    count = None
+    try:
+        while True:
+            if count == 0:
+                if pos == len(buf):
+                    chunk = b""
+                    if reader is not None:
+                        chunk = reader.read(chunk_size)
+                    if not chunk:
+                        return
+                    buf = memoryview(chunk)
+                    pos = 0
+                # Another list follows this one.
+                count = None
+            try:
+                if count is None:
+                    count, pos = _read_span_count(buf, pos)
+                    continue
+                span, pos = read_span(buf, pos)
+            except (struct.error, _EndOfBuffer):
+                chunk = b""
+                if reader is not None:
+                    chunk = reader.read(max(chunk_size, len(buf) - pos))
+                if not chunk:
+                    raise ZipkinError("Invalid span format. Unexpected end of input.")
+                # Start over from the beginning of the truncated value.
+                buf = memoryview(buf[pos:].tobytes() + chunk)
+                pos = 0
+                continue
+            count -= 1
+            yield span
+    finally:
+        if reader is not None:
+            reader.close()
+
+
+def _read_span_count(buf, pos):
+    """Reads the header of the span list.
+
+    Years ago spans were thrift encoded and sent one by one, and the zipkin
+    kafka consumer still supports this. Those don't start with a list header.
+
+    :returns: (number of spans, position of the first span)
+    """
+    (ttype,) = _unpack_i8(buf, pos)
+    if ttype != TType.STRUCT:
+        return 1, pos
+    _, size = _unpack_list_header(buf, pos)
+    return size, pos + _LIST_HEADER_SIZE
+
+
+def _read_binary(buf, pos):
+    """Reads a thrift string or binary value.
+
+    :returns: (value, position right after it)
+    :rtype: (bytes, int)
+    """
+    (size,) = _unpack_i32(buf, pos)
+    if size < 0:
+        raise ZipkinError("Invalid span format. Negative length.")
+    start = pos + 4
+    end = start + size
+    if end > len(buf):
+        raise _EndOfBuffer()
+    return buf[start:end].tobytes(), end
+
+
+def _text(value):
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        # Same as thriftpy2, invalid strings are returned as bytes.
+        return value
 
-        if thrift_endpoint.ipv6:
-            ipv6 = socket.inet_ntop(socket.AF_INET6, thrift_endpoint.ipv6)
 
-        return Endpoint(
-            service_name=thrift_endpoint.service_name, ipv4=ipv4, ipv6=ipv6, port=port,
+def _read_hex_id(buf, pos):
+    """Reads an i64 id as a lower hex string."""
+    end = pos + 8
+    if end > len(buf):
+        raise _EndOfBuffer()
+    return binascii.hexlify(buf[pos:end]).decode("ascii")
+
+
+def _read_raw_id(buf, pos):
+    """Reads an i64 id as 8 big-endian bytes."""
+    end = pos + 8
+    if end > len(buf):
+        raise _EndOfBuffer()
+    return buf[pos:end].tobytes()
+
+
+def _skip(buf, pos, ttype):
+    """Skips a value of the given type.
+
+    :returns: position right after the value
+    :rtype: int
+    """
+    size = _FIXED_SIZES.get(ttype)
+    if size is not None:
+        end = pos + size
+        if end > len(buf):
+            raise _EndOfBuffer()
+        return end
+    if ttype == TType.STRING:
+        return _read_binary(buf, pos)[1]
+    if ttype == TType.STRUCT:
+        while True:
+            (field_type,) = _unpack_i8(buf, pos)
+            if field_type == TType.STOP:
+                return pos + 1
+            pos = _skip(buf, pos + _FIELD_HEADER_SIZE, field_type)
+    if ttype in (TType.LIST, TType.SET):
+        element_type, size = _unpack_list_header(buf, pos)
+        pos += _LIST_HEADER_SIZE
+        for _ in range(size):
+            pos = _skip(buf, pos, element_type)
+        return pos
+    if ttype == TType.MAP:
+        key_type, value_type, size = _unpack_map_header(buf, pos)
+        pos += _MAP_HEADER_SIZE
+        for _ in range(size):
+            pos = _skip(buf, pos, key_type)
+            pos = _skip(buf, pos, value_type)
+        return pos
+    raise ZipkinError("Invalid span format. Unknown type {}.".format(ttype))
+
+
+def _read_list(buf, pos, read_element):
+    """Reads a list of structs with the given element reader.
+
+    :returns: (list of elements, position right after the list)
+    """
+    element_type, size = _unpack_list_header(buf, pos)
+    if element_type != TType.STRUCT:
+        return [], _skip(buf, pos, TType.LIST)
+    pos += _LIST_HEADER_SIZE
+    elements = []
+    for _ in range(size):
+        element, pos = read_element(buf, pos)
+        elements.append(element)
+    return elements, pos
+
+
+def _cache_endpoint(key, endpoint):
+    if len(_ENDPOINT_CACHE) >= _ENDPOINT_CACHE_MAX_SIZE:
+        _ENDPOINT_CACHE.clear()
+    _ENDPOINT_CACHE[key] = endpoint
+    return endpoint
+
+
+def _read_endpoint(buf, pos):
+    """Reads an Endpoint struct.
+
+    :returns: (endpoint, position right after it)
+    :rtype: (Endpoint, int)
+    """
+    ipv4 = 0
+    port = 0
+    service_name = None
+    ipv6 = None
+    while True:
+        (ttype,) = _unpack_i8(buf, pos)
+        if ttype == TType.STOP:
+            break
+        (field_id,) = _unpack_i16(buf, pos + 1)
+        pos += _FIELD_HEADER_SIZE
+        if field_id == 1 and ttype == TType.I32:
+            (ipv4,) = _unpack_u32(buf, pos)
+            pos += 4
+        elif field_id == 2 and ttype == TType.I16:
+            # Ports above 32767 are sent as negative i16.
+            (port,) = _unpack_u16(buf, pos)
+            pos += 2
+        elif field_id == 3 and ttype == TType.STRING:
+            service_name, pos = _read_binary(buf, pos)
+        elif field_id == 4 and ttype == TType.STRING:
+            ipv6, pos = _read_binary(buf, pos)
+        else:
+            pos = _skip(buf, pos, ttype)
+
+    key = (ipv4, port, service_name, ipv6)
+    endpoint = _ENDPOINT_CACHE.get(key)
+    if endpoint is None:
+        endpoint = _cache_endpoint(
+            key,
+            Endpoint(
+                service_name=None if service_name is None else _text(service_name),
+                ipv4=(
+                    socket.inet_ntop(socket.AF_INET, _pack_u32(ipv4)) if ipv4 else None
+                ),
+                ipv6=socket.inet_ntop(socket.AF_INET6, ipv6) if ipv6 else None,
+                port=port,
+            ),
         )
+    return endpoint, pos + 1
 
-    def _decode_thrift_annotations(self, thrift_annotations):
-        """Accepts a thrift annotation and converts it to a v1 annotation.
 
-        :param thrift_annotations: list of thrift annotations.
-        :type thrift_annotations: list of zipkin_core.Span.Annotation
-        :returns: (annotations, local_endpoint, kind)
-        """
-        local_endpoint = None
-        kind = Kind.LOCAL
-        all_annotations = {}
-        timestamp = None
-        duration = None
+def _read_annotation(buf, pos):
+    """Reads an Annotation struct.
 
-        for thrift_annotation in thrift_annotations:
-            all_annotations[thrift_annotation.value] = thrift_annotation.timestamp
-            if thrift_annotation.host:
-                local_endpoint = self._convert_from_thrift_endpoint(
-                    thrift_annotation.host,
-                )
+    :returns: ((value, timestamp, host), position right after it)
+    """
+    value = None
+    timestamp = None
+    host = None
+    while True:
+        (ttype,) = _unpack_i8(buf, pos)
+        if ttype == TType.STOP:
+            return (value, timestamp, host), pos + 1
+        (field_id,) = _unpack_i16(buf, pos + 1)
+        pos += _FIELD_HEADER_SIZE
+        if field_id == 1 and ttype == TType.I64:
+            (timestamp,) = _unpack_i64(buf, pos)
+            pos += 8
+        elif field_id == 2 and ttype == TType.STRING:
+            value, pos = _read_binary(buf, pos)
+            value = _text(value)
+        elif field_id == 3 and ttype == TType.STRUCT:
+            host, pos = _read_endpoint(buf, pos)
+        else:
+            pos = _skip(buf, pos, ttype)
 
-        if "cs" in all_annotations and "sr" not in all_annotations:
-            kind = Kind.CLIENT
-            timestamp = all_annotations["cs"]
+
+def _read_binary_annotation(buf, pos):
+    """Reads a BinaryAnnotation struct.
+
+    :returns: ((key, value, annotation_type, host), position right after it)
+    """
+    key = None
+    value = None
+    annotation_type = None
+    host = None
+    while True:
+        (ttype,) = _unpack_i8(buf, pos)
+        if ttype == TType.STOP:
+            return (key, value, annotation_type, host), pos + 1
+        (field_id,) = _unpack_i16(buf, pos + 1)
+        pos += _FIELD_HEADER_SIZE
+        if field_id == 1 and ttype == TType.STRING:
+            key, pos = _read_binary(buf, pos)
+            key = _text(key)
+        elif field_id == 2 and ttype == TType.STRING:
+            value, pos = _read_binary(buf, pos)
+        elif field_id == 3 and ttype == TType.I32:
+            (annotation_type,) = _unpack_i32(buf, pos)
+            pos += 4
+        elif field_id == 4 and ttype == TType.STRUCT:
+            host, pos = _read_endpoint(buf, pos)
+        else:
+            pos = _skip(buf, pos, ttype)
+
+
+def _read_thrift_span(buf, pos, read_id):
+    """Reads a Span struct and folds it into the fields of a V2 span.
+
+    Core annotations (cs, sr, ss, cr) are folded into kind, timestamp and
+    duration, while sa/ca binary annotations become the remote endpoint.
+
+    :param read_id: function reading an i64 id from (buffer, position).
+    :type read_id: function
+    :returns: ((trace_id, name, parent_id, span_id, kind, timestamp, duration,
+        local_endpoint, remote_endpoint, shared, annotations, tags), position
+        right after the struct). Timestamps are in microseconds, the parent id
+        is returned even if it's 0.
+    :rtype: (tuple, int)
+    """
+    trace_id = None
+    trace_id_high = None
+    name = None
+    span_id = None
+    parent_id = None
+    thrift_annotations = ()
+    thrift_binary_annotations = ()
+    span_timestamp = None
+    span_duration = None
+    while True:
+        (ttype,) = _unpack_i8(buf, pos)
+        if ttype == TType.STOP:
+            pos += 1
+            break
+        (field_id,) = _unpack_i16(buf, pos + 1)
+        pos += _FIELD_HEADER_SIZE
+        if ttype == TType.I64 and field_id in (1, 4, 5, 12):
+            decoded_id = read_id(buf, pos)
+            pos += 8
+            if field_id == 1:
+                trace_id = decoded_id
+            elif field_id == 4:
+                span_id = decoded_id
+            elif field_id == 5:
+                parent_id = decoded_id
+            else:
+                trace_id_high = decoded_id
+        elif field_id == 3 and ttype == TType.STRING:
+            name, pos = _read_binary(buf, pos)
+            name = _text(name)
+        elif field_id == 6 and ttype == TType.LIST:
+            thrift_annotations, pos = _read_list(buf, pos, _read_annotation)
+        elif field_id == 8 and ttype == TType.LIST:
+            thrift_binary_annotations, pos = _read_list(
+                buf, pos, _read_binary_annotation,
+            )
+        elif field_id == 10 and ttype == TType.I64:
+            (span_timestamp,) = _unpack_i64(buf, pos)
+            pos += 8
+        elif field_id == 11 and ttype == TType.I64:
+            (span_duration,) = _unpack_i64(buf, pos)
+            pos += 8
+        else:
+            pos = _skip(buf, pos, ttype)
+
+    local_endpoint = None
+    remote_endpoint = None
+    kind = Kind.LOCAL
+    timestamp = None
+    duration = None
+
+    all_annotations = {}
+    for value, annotation_timestamp, host in thrift_annotations:
+        all_annotations[value] = annotation_timestamp
+        if host is not None:
+            local_endpoint = host
+
+    if "cs" in all_annotations and "sr" not in all_annotations:
+        kind = Kind.CLIENT
+        timestamp = all_annotations["cs"]
+        if "cr" in all_annotations:
             duration = all_annotations["cr"] - all_annotations["cs"]
-        elif "cs" not in all_annotations and "sr" in all_annotations:
-            kind = Kind.SERVER
-            timestamp = all_annotations["sr"]
+    elif "cs" not in all_annotations and "sr" in all_annotations:
+        kind = Kind.SERVER
+        timestamp = all_annotations["sr"]
+        if "ss" in all_annotations:
             duration = all_annotations["ss"] - all_annotations["sr"]
 
-        annotations = {
-            name: self.seconds(ts)
-            for name, ts in all_annotations.items()
-            if name not in _DROP_ANNOTATIONS
-        }
+    annotations = {
+        value: ts
+        for value, ts in all_annotations.items()
+        if value not in _DROP_ANNOTATIONS
+    }
+
+    tags = {}
+    for key, value, annotation_type, host in thrift_binary_annotations:
+        if (
+            key in ("sa", "ca")
+            and annotation_type == zipkin_core.AnnotationType.BOOL
+            and value == b"\x01"
+        ):
+            remote_endpoint = host
+            continue
+
+        if annotation_type == zipkin_core.AnnotationType.BOOL:
+            tags[key] = "true" if value == b"\x01" else "false"
+        elif annotation_type == zipkin_core.AnnotationType.STRING:
+            tags[key] = _text(value)
+        else:
+            log.warning(
+                "Only STRING and BOOL binary annotations are "
+                "supported right now and can be properly decoded."
+            )
+
+        if host is not None:
+            local_endpoint = host
+
+    if trace_id_high is not None:
+        trace_id = trace_id_high + trace_id
+
+    return (
+        (
+            trace_id,
+            name,
+            parent_id,
+            span_id,
+            kind,
+            timestamp or span_timestamp,
+            duration or span_duration,
+            local_endpoint,
+            remote_endpoint,
+            kind == Kind.SERVER and span_timestamp is None,
+            annotations,
+            tags,
+        ),
+        pos,
+    )
+
+
+def _read_span(buf, pos):
+    """Reads a Span struct and converts it to a V2 span.
+
+    :returns: (span, position right after it)
+    :rtype: (Span, int)
+    """
+    (
+        (
+            trace_id,
+            name,
+            parent_id,
+            span_id,
+            kind,
+            timestamp,
+            duration,
+            local_endpoint,
+            remote_endpoint,
+            shared,
+            annotations,
+            tags,
+        ),
+        pos,
+    ) = _read_thrift_span(buf, pos, _read_hex_id)
+    span = Span(
+        trace_id=trace_id,
+        name=name,
+        parent_id=None if parent_id == _NO_PARENT_ID else parent_id,
+        span_id=span_id,
+        kind=kind,
+        timestamp=_seconds(timestamp),
+        duration=_seconds(duration),
+        local_endpoint=local_endpoint,
+        remote_endpoint=remote_endpoint,
+        shared=shared,
+        annotations={value: _seconds(ts) for value, ts in annotations.items()},
+        tags=tags,
+    )
+    return span, pos
+
+
+def _iter_json_list(spans, chunk_size=_READ_CHUNK_SIZE):
+    """Yields the elements of an encoded JSON list one by one.
+
+    The input is read in chunks, and only the element that's currently
+    being decoded is kept in memory. If the input holds multiple lists back
+    to back, i.e. batches appended to a spool file, the elements of all of
+    them are yielded.
+
+    :param spans: encoded JSON list.
+    :type spans: str, bytes, buffer or file-like object.
+    :param chunk_size: how many bytes to read at a time.
+    :type chunk_size: int
+    :return: generator of decoded JSON elements.
+    """
+    with _Reader(spans) as reader:
+        for element in _iter_json_elements(reader, chunk_size):
+            yield element
+
+
+def _iter_json_elements(reader, chunk_size):
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    state = {"buf": u"", "eof": False}
 
-        return annotations, local_endpoint, kind, timestamp, duration
+    def fill(pos):
+        """Reads some more input, dropping what's before `pos`.
 
-    def _convert_from_thrift_binary_annotations(self, thrift_binary_annotations):
-        """Accepts a thrift decoded binary annotation and converts it
-        to a v1 binary annotation.
+        Like for thrift spans, reads are at least as big as what's left in
+        the buffer, so an element spanning many chunks is only parsed again
+        a logarithmic number of times.
+
+        :returns: the new position of `pos`, or None at the end of the input.
         """
-        tags = {}
-        local_endpoint = None
-        remote_endpoint = None
+        if state["eof"]:
+            return None
+        buf = state["buf"][pos:]
+        chunk = reader.read(max(chunk_size, len(buf)))
+        state["eof"] = not chunk
+        if isinstance(chunk, bytes):
+            chunk = utf8_decoder.decode(chunk, final=state["eof"])
+        state["buf"] = buf + chunk
+        return 0
 
-        for binary_annotation in thrift_binary_annotations:
-            if binary_annotation.key == "sa":
-                remote_endpoint = self._convert_from_thrift_endpoint(
-                    thrift_endpoint=binary_annotation.host,
-                )
-            else:
-                key = binary_annotation.key
+    def next_char(pos):
+        """Returns the position of the next non whitespace char."""
+        while True:
+            buf = state["buf"]
+            while pos < len(buf) and buf[pos] in _JSON_WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return pos
+            new_pos = fill(pos)
+            if new_pos is None:
+                return pos
+            pos = new_pos
 
-                annotation_type = binary_annotation.annotation_type
-                value = binary_annotation.value
+    def char_at(pos):
+        buf = state["buf"]
+        return buf[pos] if pos < len(buf) else ""
 
-                if annotation_type == zipkin_core.AnnotationType.BOOL:
-                    tags[key] = "true" if value == 1 else "false"
-                elif annotation_type == zipkin_core.AnnotationType.STRING:
-                    tags[key] = value
-                else:
-                    log.warning(
-                        "Only STRING and BOOL binary annotations are "
-                        "supported right now and can be properly decoded."
+    pos = next_char(0)
+    if char_at(pos) != "[":
+        raise ZipkinError("Invalid JSON span list. Expected '['.")
+
+    while char_at(pos) == "[":
+        pos = next_char(pos + 1)
+        first = True
+        while True:
+            char = char_at(pos)
+            if char == "]":
+                break
+            if not first:
+                if char != ",":
+                    raise ZipkinError(
+                        "Invalid JSON span list. Expected ',' or ']'.",
                     )
+                pos = next_char(pos + 1)
+            first = False
 
-                if binary_annotation.host:
-                    local_endpoint = self._convert_from_thrift_endpoint(
-                        thrift_endpoint=binary_annotation.host,
+            while True:
+                buf = state["buf"]
+                try:
+                    element, end = _json_decoder.raw_decode(buf, pos)
+                except ValueError:
+                    element, end = None, None
+                # If the element ends right at the end of the buffer it might
+                # have been truncated (i.e. a number), so read some more.
+                if end is not None and (end < len(buf) or state["eof"]):
+                    break
+                pos = fill(pos)
+                if pos is None:
+                    raise ZipkinError(
+                        "Invalid JSON span list. Unexpected end of input.",
                     )
 
-        return tags, local_endpoint, remote_endpoint
+            yield element
+            # The decoded elements are dropped from the buffer by the next fill.
+            pos = next_char(end)
+        pos = next_char(pos + 1)
 
-    def seconds(self, us):
-        if us is None:
-            return None
-        return round(float(us) / 1000 / 1000, 6)
+    if char_at(pos):
+        raise ZipkinError("Invalid JSON span list. Expected '[' or end of input.")
+
+
+def _decode_json_endpoint(json_endpoint):
+    """Converts a JSON endpoint dict to an Endpoint.
+
+    :param json_endpoint: JSON endpoint.
+    :type json_endpoint: dict
+    :returns: decoded endpoint
+    :rtype: Endpoint
+    """
+    if json_endpoint is None:
+        return None
+    key = (
+        # serviceName is mandatory in v1, so it's set to "" if missing.
+        json_endpoint.get("serviceName") or None,
+        json_endpoint.get("ipv4"),
+        json_endpoint.get("ipv6"),
+        json_endpoint.get("port", 0),
+    )
+    endpoint = _ENDPOINT_CACHE.get(key)
+    if endpoint is None:
+        endpoint = _cache_endpoint(key, Endpoint(*key))
+    return endpoint
+
+
+def _decode_json_kind(value):
+    # Much faster than Kind(value).
+    kind = _KINDS.get(value)
+    if kind is None:
+        return Kind(value)
+    return kind
+
+
+def _seconds(us):
+    if us is None:
+        return None
+    if isinstance(us, six.integer_types) and -_EXACT_US < us < _EXACT_US:
+        return us / 1000000.0
+    return round(float(us) / 1000 / 1000, 6)
+
+
+class _BaseJSONDecoder(IDecoder):
+    """V1 and V2 JSON decoders only differ in how each span is decoded."""
+
+    def decode_spans(self, spans):
+        """Decodes an encoded list of spans.
+
+        :param spans: encoded list of spans
+        :type spans: str or bytes
+        :return: list of spans
+        :rtype: list of Span
+        """
+        if isinstance(spans, bytes):
+            spans = spans.decode("utf-8")
+        return [self._decode_json_span(span) for span in json.loads(spans)]
+
+    def iter_decode_spans(self, spans):
+        """Decodes an encoded list of spans incrementally.
+
+        :param spans: encoded list of spans
+        :type spans: str, bytes, buffer or file-like object.
+        :return: generator of spans
+        :rtype: iterator of Span
+        """
+        for json_span in _iter_json_list(spans):
+            yield self._decode_json_span(json_span)
 
-    def _decode_thrift_span(self, thrift_span):
-        """Decodes a thrift span.
+    def _decode_json_span(self, json_span):  # pragma: no cover
+        raise NotImplementedError()
+
+
+class _V1JSONDecoder(_BaseJSONDecoder):
+    """JSON decoder for V1 spans."""
+
+    def _decode_json_span(self, json_span):
+        """Decodes a V1 JSON span.
 
-        :param thrift_span: thrift span
-        :type thrift_span: thrift Span object
-        :returns: span builder representing this span
+        Core annotations (cs, sr, ss, cr) are folded into kind, timestamp and
+        duration, while sa/ca binary annotations become the remote endpoint.
+
+        :param json_span: JSON span.
+        :type json_span: dict
+        :returns: decoded span
         :rtype: Span
         """
-        parent_id = None
-        local_endpoint = None
-        annotations = {}
-        tags = {}
-        kind = Kind.LOCAL
+        # Only the last endpoint is used, so it's decoded once at the end.
+        json_local_endpoint = None
         remote_endpoint = None
+        kind = Kind.LOCAL
         timestamp = None
         duration = None
 
-        if thrift_span.parent_id:
-            parent_id = self._convert_unsigned_long_to_lower_hex(thrift_span.parent_id)
-
-        if thrift_span.annotations:
-            (
-                annotations,
-                local_endpoint,
-                kind,
-                timestamp,
-                duration,
-            ) = self._decode_thrift_annotations(thrift_span.annotations)
-
-        if thrift_span.binary_annotations:
-            (
-                tags,
-                local_endpoint,
-                remote_endpoint,
-            ) = self._convert_from_thrift_binary_annotations(
-                thrift_span.binary_annotations,
-            )
+        all_annotations = {}
+        for annotation in json_span.get("annotations", ()):
+            all_annotations[annotation["value"]] = annotation["timestamp"]
+            json_local_endpoint = annotation.get("endpoint") or json_local_endpoint
 
-        trace_id = self._convert_trace_id_to_string(
-            thrift_span.trace_id, thrift_span.trace_id_high,
-        )
+        if "cs" in all_annotations and "sr" not in all_annotations:
+            kind = Kind.CLIENT
+            timestamp = all_annotations["cs"]
+            if "cr" in all_annotations:
+                duration = all_annotations["cr"] - all_annotations["cs"]
+        elif "cs" not in all_annotations and "sr" in all_annotations:
+            kind = Kind.SERVER
+            timestamp = all_annotations["sr"]
+            if "ss" in all_annotations:
+                duration = all_annotations["ss"] - all_annotations["sr"]
+
+        annotations = {
+            name: _seconds(ts)
+            for name, ts in all_annotations.items()
+            if name not in _DROP_ANNOTATIONS
+        }
+
+        tags = {}
+        for binary_annotation in json_span.get("binaryAnnotations", ()):
+            key = binary_annotation["key"]
+            value = binary_annotation["value"]
+            if key in ("sa", "ca") and value is True:
+                remote_endpoint = _decode_json_endpoint(
+                    binary_annotation.get("endpoint"),
+                )
+                continue
+
+            if value is True or value is False:
+                tags[key] = "true" if value else "false"
+            elif isinstance(value, six.string_types):
+                tags[key] = value
+            else:
+                tags[key] = str(value)
+
+            json_local_endpoint = (
+                binary_annotation.get("endpoint") or json_local_endpoint
+            )
 
         return Span(
-            trace_id=trace_id,
-            name=thrift_span.name,
-            parent_id=parent_id,
-            span_id=self._convert_unsigned_long_to_lower_hex(thrift_span.id),
+            trace_id=json_span["traceId"],
+            name=json_span.get("name") or None,
+            parent_id=json_span.get("parentId"),
+            span_id=json_span["id"],
             kind=kind,
-            timestamp=self.seconds(timestamp or thrift_span.timestamp),
-            duration=self.seconds(duration or thrift_span.duration),
-            local_endpoint=local_endpoint,
+            timestamp=_seconds(timestamp or json_span.get("timestamp")),
+            duration=_seconds(duration or json_span.get("duration")),
+            local_endpoint=_decode_json_endpoint(json_local_endpoint),
             remote_endpoint=remote_endpoint,
-            shared=(kind == Kind.SERVER and thrift_span.timestamp is None),
+            debug=json_span.get("debug", False),
+            shared=(kind == Kind.SERVER and json_span.get("timestamp") is None),
             annotations=annotations,
             tags=tags,
         )
 
-    def _convert_trace_id_to_string(self, trace_id, trace_id_high=None):
-        """
-        Converts the provided traceId hex value with optional high bits
-        to a string.
-
-        :param trace_id: the value of the trace ID
-        :type trace_id: int
-        :param trace_id_high: the high bits of the trace ID
-        :type trace_id: int
-        :returns: trace_id_high + trace_id as a string
-        """
-        if trace_id_high is not None:
-            result = bytearray(32)
-            self._write_hex_long(result, 0, trace_id_high)
-            self._write_hex_long(result, 16, trace_id)
-            return result.decode("utf8")
 
-        result = bytearray(16)
-        self._write_hex_long(result, 0, trace_id)
-        return result.decode("utf8")
+class _V2JSONDecoder(_BaseJSONDecoder):
+    """JSON decoder for V2 spans."""
 
-    def _convert_unsigned_long_to_lower_hex(self, value):
-        """
-        Converts the provided unsigned long value to a hex string.
+    def _decode_json_span(self, json_span):
+        """Decodes a V2 JSON span.
 
-        :param value: the value to convert
-        :type value: unsigned long
-        :returns: value as a hex string
+        :param json_span: JSON span.
+        :type json_span: dict
+        :returns: decoded span
+        :rtype: Span
         """
-        result = bytearray(16)
-        self._write_hex_long(result, 0, value)
-        return result.decode("utf8")
+        return Span(
+            trace_id=json_span["traceId"],
+            name=json_span.get("name"),
+            parent_id=json_span.get("parentId"),
+            span_id=json_span["id"],
+            kind=_decode_json_kind(json_span.get("kind")),
+            timestamp=_seconds(json_span.get("timestamp")),
+            duration=_seconds(json_span.get("duration")),
+            local_endpoint=_decode_json_endpoint(json_span.get("localEndpoint")),
+            remote_endpoint=_decode_json_endpoint(json_span.get("remoteEndpoint")),
+            debug=json_span.get("debug", False),
+            shared=json_span.get("shared", False),
+            annotations={
+                annotation["value"]: _seconds(annotation["timestamp"])
+                for annotation in json_span.get("annotations", ())
+            },
+            tags=json_span.get("tags"),
+        )
+
+
+class _V2ProtobufDecoder(IDecoder):
+    """Decoder for V2 proto3 spans.
+
+    The ListOfSpans message is read directly from the wire format, so this
+    doesn't need the protobuf package.
+    """
+
+    def decode_spans(self, spans):
+        """Decodes an encoded list of spans.
 
-    def _write_hex_long(self, data, pos, value):
+        :param spans: encoded ListOfSpans message
+        :type spans: bytes
+        :return: list of spans
+        :rtype: list of Span
         """
-        Writes an unsigned long value across a byte array.
-
-        :param data: the buffer to write the value to
-        :type data: bytearray
-        :param pos: the starting position
-        :type pos: int
-        :param value: the value to write
-        :type value: unsigned long
+        return list(self.iter_decode_spans(spans))
+
+    def iter_decode_spans(self, spans):
+        """Decodes an encoded list of spans incrementally.
+
+        :param spans: encoded ListOfSpans message
+        :type spans: bytes, buffer or binary file-like object.
+        :return: generator of spans
+        :rtype: iterator of Span
         """
-        self._write_hex_byte(data, pos + 0, (value >> 56) & 0xFF)
-        self._write_hex_byte(data, pos + 2, (value >> 48) & 0xFF)
-        self._write_hex_byte(data, pos + 4, (value >> 40) & 0xFF)
-        self._write_hex_byte(data, pos + 6, (value >> 32) & 0xFF)
-        self._write_hex_byte(data, pos + 8, (value >> 24) & 0xFF)
-        self._write_hex_byte(data, pos + 10, (value >> 16) & 0xFF)
-        self._write_hex_byte(data, pos + 12, (value >> 8) & 0xFF)
-        self._write_hex_byte(data, pos + 14, (value & 0xFF))
-
-    def _write_hex_byte(self, data, pos, byte):
-        data[pos + 0] = ord(_HEX_DIGITS[int((byte >> 4) & 0xF)])
-        data[pos + 1] = ord(_HEX_DIGITS[int(byte & 0xF)])
+        try:
+            view = memoryview(spans)
+        except TypeError:
+            view = None
+
+        if view is None:
+            for span in _iter_proto_spans_from_file(spans):
+                yield span
+            return
+
+        pos = 0
+        while pos < len(view):
+            try:
+                size, pos = _read_proto_span_header(view, pos)
+            except IndexError:
+                raise ZipkinError("Invalid span format. Unexpected end of input.")
+            end = pos + size
+            if end > len(view):
+                raise ZipkinError("Invalid span format. Unexpected end of input.")
+            yield _read_proto_span(view, pos, end)
+            pos = end
+
+
+def _iter_proto_spans_from_file(spans):
+    """Yields the spans of a ListOfSpans message read from a file.
+
+    Only the span that's currently being decoded is kept in memory.
+    """
+    with _Reader(spans) as reader:
+        while True:
+            header = reader.read(_MAX_PROTO_SPAN_HEADER_SIZE)
+            if not header:
+                return
+            try:
+                size, start = _read_proto_span_header(memoryview(header), 0)
+            except IndexError:
+                raise ZipkinError("Invalid span format. Unexpected end of input.")
+
+            data = header[start:]
+            if len(data) > size:
+                reader.unread(data[size:])
+                data = data[:size]
+            else:
+                data += reader.read(size - len(data))
+                if len(data) < size:
+                    raise ZipkinError("Invalid span format. Unexpected end of input.")
+            yield _read_proto_span(memoryview(data), 0, size)
+
+
+def _read_proto_span_header(buf, pos):
+    """Reads the tag and length of the next span of a ListOfSpans.
+
+    :returns: (length of the span, position of the span)
+    :raises IndexError: if the buffer ends in the middle of the header.
+    """
+    key, pos = protobuf_wire.decode_varint(buf, pos)
+    if key != _PROTO_LIST_SPANS:
+        raise ZipkinError("Invalid span format. Expected a ListOfSpans message.")
+    return protobuf_wire.decode_varint(buf, pos)
+
+
+def _read_proto_length(buf, pos, end):
+    """Reads the length of a length-delimited field.
+
+    :returns: (position of the value, position right after it)
+    """
+    size, pos = protobuf_wire.decode_varint(buf, pos)
+    value_end = pos + size
+    if value_end > end:
+        raise ZipkinError("Invalid span format. Field longer than its message.")
+    return pos, value_end
+
+
+def _skip_proto_field(buf, pos, end, key):
+    """Skips the value of an unknown field.
+
+    :returns: position right after the value
+    :rtype: int
+    """
+    wire_type = key & 0x7
+    if wire_type == _PROTO_VARINT:
+        return protobuf_wire.decode_varint(buf, pos)[1]
+    if wire_type == _PROTO_LENGTH_DELIMITED:
+        return _read_proto_length(buf, pos, end)[1]
+    if wire_type == _PROTO_FIXED64:
+        return pos + 8
+    if wire_type == _PROTO_FIXED32:
+        return pos + 4
+    raise ZipkinError("Invalid span format. Unknown wire type {}.".format(wire_type))
+
+
+def _check_proto_end(pos, end):
+    if pos != end:
+        raise ZipkinError("Invalid span format. Field longer than its message.")
+
+
+def _read_proto_endpoint(buf, pos, end):
+    """Reads an Endpoint message.
+
+    :returns: decoded endpoint
+    :rtype: Endpoint
+    """
+    # The encoded message is the cache key, so cached endpoints aren't parsed.
+    key = buf[pos:end].tobytes()
+    endpoint = _ENDPOINT_CACHE.get(key)
+    if endpoint is not None:
+        return endpoint
+
+    service_name = None
+    ipv4 = None
+    ipv6 = None
+    port = 0
+    while pos < end:
+        field_key, pos = protobuf_wire.decode_varint(buf, pos)
+        if field_key == _PROTO_ENDPOINT_PORT:
+            port, pos = protobuf_wire.decode_varint(buf, pos)
+        elif field_key & 0x7 == _PROTO_LENGTH_DELIMITED:
+            start, pos = _read_proto_length(buf, pos, end)
+            value = buf[start:pos].tobytes()
+            if field_key == _PROTO_ENDPOINT_SERVICE_NAME:
+                service_name = _text(value)
+            elif field_key == _PROTO_ENDPOINT_IPV4:
+                ipv4 = socket.inet_ntop(socket.AF_INET, value)
+            elif field_key == _PROTO_ENDPOINT_IPV6:
+                ipv6 = socket.inet_ntop(socket.AF_INET6, value)
+        else:
+            pos = _skip_proto_field(buf, pos, end, field_key)
+    _check_proto_end(pos, end)
+
+    return _cache_endpoint(
+        key, Endpoint(service_name=service_name, ipv4=ipv4, ipv6=ipv6, port=port),
+    )
+
+
+def _read_proto_strings(buf, pos, end, first_key, second_key):
+    """Reads a message made of two strings, i.e. a tags map entry.
+
+    :returns: (first string, second string). Missing ones are empty.
+    """
+    first = u""
+    second = u""
+    while pos < end:
+        key, pos = protobuf_wire.decode_varint(buf, pos)
+        if key == first_key or key == second_key:
+            start, pos = _read_proto_length(buf, pos, end)
+            value = _text(buf[start:pos].tobytes())
+            if key == first_key:
+                first = value
+            else:
+                second = value
+        else:
+            pos = _skip_proto_field(buf, pos, end, key)
+    _check_proto_end(pos, end)
+    return first, second
+
+
+def _read_proto_annotation(buf, pos, end):
+    """Reads an Annotation message.
+
+    :returns: (value, timestamp in microseconds)
+    """
+    value = u""
+    timestamp = 0
+    while pos < end:
+        key, pos = protobuf_wire.decode_varint(buf, pos)
+        if key == _PROTO_ANNOTATION_TIMESTAMP:
+            (timestamp,) = _unpack_proto_fixed64(buf, pos)
+            pos += 8
+        elif key == _PROTO_ANNOTATION_VALUE:
+            start, pos = _read_proto_length(buf, pos, end)
+            value = _text(buf[start:pos].tobytes())
+        else:
+            pos = _skip_proto_field(buf, pos, end, key)
+    _check_proto_end(pos, end)
+    return value, timestamp
+
+
+def _read_proto_span(buf, pos, end):
+    """Reads a Span message.
+
+    :returns: decoded span
+    :rtype: Span
+    """
+    trace_id = None
+    parent_id = None
+    span_id = None
+    kind = Kind.LOCAL
+    name = None
+    timestamp = None
+    duration = None
+    local_endpoint = None
+    remote_endpoint = None
+    annotations = {}
+    tags = {}
+    debug = False
+    shared = False
+    try:
+        while pos < end:
+            key, pos = protobuf_wire.decode_varint(buf, pos)
+            if key in _PROTO_SPAN_LENGTH_DELIMITED:
+                start, pos = _read_proto_length(buf, pos, end)
+                field_number = key >> 3
+                if field_number == 1:
+                    trace_id = binascii.hexlify(buf[start:pos]).decode("ascii")
+                elif field_number == 2:
+                    parent_id = binascii.hexlify(buf[start:pos]).decode("ascii")
+                elif field_number == 3:
+                    span_id = binascii.hexlify(buf[start:pos]).decode("ascii")
+                elif field_number == 5:
+                    name = _text(buf[start:pos].tobytes())
+                elif field_number == 8:
+                    local_endpoint = _read_proto_endpoint(buf, start, pos)
+                elif field_number == 9:
+                    remote_endpoint = _read_proto_endpoint(buf, start, pos)
+                elif field_number == 10:
+                    value, ts = _read_proto_annotation(buf, start, pos)
+                    annotations[value] = _seconds(ts)
+                else:
+                    tag_key, tag_value = _read_proto_strings(
+                        buf, start, pos, _PROTO_TAG_KEY, _PROTO_TAG_VALUE,
+                    )
+                    tags[tag_key] = tag_value
+            elif key == _PROTO_SPAN_TIMESTAMP:
+                (timestamp,) = _unpack_proto_fixed64(buf, pos)
+                pos += 8
+            elif key == _PROTO_SPAN_DURATION:
+                duration, pos = protobuf_wire.decode_varint(buf, pos)
+            elif key == _PROTO_SPAN_KIND:
+                value, pos = protobuf_wire.decode_varint(buf, pos)
+                kind = _PROTO_KINDS.get(value, Kind.LOCAL)
+            elif key == _PROTO_SPAN_DEBUG:
+                value, pos = protobuf_wire.decode_varint(buf, pos)
+                debug = value != 0
+            elif key == _PROTO_SPAN_SHARED:
+                value, pos = protobuf_wire.decode_varint(buf, pos)
+                shared = value != 0
+            else:
+                pos = _skip_proto_field(buf, pos, end, key)
+    except (IndexError, struct.error):
+        raise ZipkinError("Invalid span format. Field longer than its message.")
+    _check_proto_end(pos, end)
+
+    return Span(
+        trace_id=trace_id,
+        name=name,
+        parent_id=parent_id,
+        span_id=span_id,
+        kind=kind,
+        timestamp=_seconds(timestamp),
+        duration=_seconds(duration),
+        local_endpoint=local_endpoint,
+        remote_endpoint=remote_endpoint,
+        debug=debug,
+        shared=shared,
+        annotations=annotations,
+        tags=tags,
+    )
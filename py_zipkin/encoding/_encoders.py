@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
 import json
+from json.encoder import encode_basestring_ascii
 
 import six
 
 from py_zipkin import thrift
-from py_zipkin.encoding import protobuf
+from py_zipkin.encoding.protobuf import _wire as protobuf_wire
 from py_zipkin.encoding._types import Encoding
 from py_zipkin.encoding._types import Kind
 from py_zipkin.exception import ZipkinError
+from py_zipkin.thrift import _wire as thrift_wire
+
+# JSON fragments of the endpoints encoded by _V2FastJSONEncoder.
+_JSON_ENDPOINT_CACHE = {}
+_JSON_ENDPOINT_CACHE_MAX_SIZE = 1024
 
 
 def get_encoder(encoding):
@@ -23,7 +29,7 @@ def get_encoder(encoding):
     if encoding == Encoding.V1_JSON:
         return _V1JSONEncoder()
     if encoding == Encoding.V2_JSON:
-        return _V2JSONEncoder()
+        return _V2FastJSONEncoder()
     if encoding == Encoding.V2_PROTO3:
         return _V2ProtobufEncoder()
     raise ZipkinError("Unknown encoding: {}".format(encoding))
@@ -32,6 +38,9 @@ def get_encoder(encoding):
 class IEncoder(object):
     """Encoder interface."""
 
+    # Encoding of the payloads returned by encode_queue.
+    encoding = None
+
     def fits(self, current_count, current_size, max_size, new_span):
         """Returns whether the new span will fit in the list.
 
@@ -72,6 +81,8 @@ class IEncoder(object):
 class _V1ThriftEncoder(IEncoder):
     """Thrift encoder for V1 spans."""
 
+    encoding = Encoding.V1_THRIFT
+
     def fits(self, current_count, current_size, max_size, new_span):
         """Checks if the new span fits in the max payload size.
 
@@ -80,65 +91,13 @@ class _V1ThriftEncoder(IEncoder):
         """
         return thrift.LIST_HEADER_SIZE + current_size + len(new_span) <= max_size
 
-    def encode_remote_endpoint(self, remote_endpoint, kind, binary_annotations):
-        thrift_remote_endpoint = thrift.create_endpoint(
-            remote_endpoint.port,
-            remote_endpoint.service_name,
-            remote_endpoint.ipv4,
-            remote_endpoint.ipv6,
-        )
-        if kind == Kind.CLIENT:
-            key = thrift.zipkin_core.SERVER_ADDR
-        elif kind == Kind.SERVER:
-            key = thrift.zipkin_core.CLIENT_ADDR
-
-        binary_annotations.append(
-            thrift.create_binary_annotation(
-                key=key,
-                value=thrift.SERVER_ADDR_VAL,
-                annotation_type=thrift.zipkin_core.AnnotationType.BOOL,
-                host=thrift_remote_endpoint,
-            )
-        )
-
     def encode_span(self, v2_span):
-        """Encodes the current span to thrift."""
-        span = v2_span.build_v1_span()
-
-        thrift_endpoint = thrift.create_endpoint(
-            span.endpoint.port,
-            span.endpoint.service_name,
-            span.endpoint.ipv4,
-            span.endpoint.ipv6,
-        )
+        """Encodes the current span to thrift.
 
-        thrift_annotations = thrift.annotation_list_builder(
-            span.annotations, thrift_endpoint,
-        )
-
-        thrift_binary_annotations = thrift.binary_annotation_list_builder(
-            span.binary_annotations, thrift_endpoint,
-        )
-
-        # Add sa/ca binary annotations
-        if v2_span.remote_endpoint:
-            self.encode_remote_endpoint(
-                v2_span.remote_endpoint, v2_span.kind, thrift_binary_annotations,
-            )
-
-        thrift_span = thrift.create_span(
-            span.id,
-            span.parent_id,
-            span.trace_id,
-            span.name,
-            thrift_annotations,
-            thrift_binary_annotations,
-            span.timestamp,
-            span.duration,
-        )
-
-        encoded_span = thrift.span_to_bytes(thrift_span)
-        return encoded_span
+        The span is written directly in the TBinaryProtocol format, without
+        building thriftpy2 objects first.
+        """
+        return thrift_wire.encode_span(v2_span)
 
     def encode_queue(self, queue):
         """Converts the queue to a thrift list"""
@@ -192,6 +151,8 @@ class _BaseJSONEncoder(IEncoder):
 class _V1JSONEncoder(_BaseJSONEncoder):
     """JSON encoder for V1 spans."""
 
+    encoding = Encoding.V1_JSON
+
     def encode_remote_endpoint(self, remote_endpoint, kind, binary_annotations):
         json_remote_endpoint = self._create_json_endpoint(remote_endpoint, True)
         if kind == Kind.CLIENT:
@@ -252,6 +213,8 @@ class _V1JSONEncoder(_BaseJSONEncoder):
 class _V2JSONEncoder(_BaseJSONEncoder):
     """JSON encoder for V2 spans."""
 
+    encoding = Encoding.V2_JSON
+
     def encode_span(self, span):
         """Encodes a single span to JSON."""
 
@@ -297,23 +260,168 @@ class _V2JSONEncoder(_BaseJSONEncoder):
         return encoded_span
 
 
+def _json_string(value):
+    """Encodes a value the same way json.dumps would.
+
+    Strings are by far the most common case, so we call the json module's
+    string escaping function directly and skip all the type dispatching.
+    """
+    if isinstance(value, six.string_types):
+        return encode_basestring_ascii(value)
+    return json.dumps(value)
+
+
+class _V2FastJSONEncoder(_V2JSONEncoder):
+    """JSON encoder for V2 spans that writes the JSON text directly.
+
+    The output is the same as _V2JSONEncoder's, but it skips building a dict
+    for every span and running it through json.dumps. Where dicts aren't
+    ordered (py27, py35) keys may be in a different order.
+    Endpoints are usually the same for all the spans of a process, so their
+    encoded JSON is cached.
+    """
+
+    def _json_endpoint(self, endpoint):
+        encoded = _JSON_ENDPOINT_CACHE.get(endpoint)
+        if encoded is None:
+            encoded = json.dumps(self._create_json_endpoint(endpoint, False))
+            if len(_JSON_ENDPOINT_CACHE) >= _JSON_ENDPOINT_CACHE_MAX_SIZE:
+                _JSON_ENDPOINT_CACHE.clear()
+            _JSON_ENDPOINT_CACHE[endpoint] = encoded
+        return encoded
+
+    def encode_span(self, span):
+        """Encodes a single span to JSON."""
+        tags = None
+        if span.tags and len(span.tags) > 0:
+            # Ensure that tags are all strings. Build the dict first so that
+            # keys that are equal once converted to string get deduplicated
+            # the same way as in _V2JSONEncoder.
+            tags = {str(key): str(value) for key, value in six.iteritems(span.tags)}
+        return self.encode_span_fields(
+            span.trace_id,
+            span.span_id,
+            span.name,
+            span.parent_id,
+            int(span.timestamp * 1000000) if span.timestamp else None,
+            int(span.duration * 1000000) if span.duration else None,
+            span.shared is True,
+            span.kind.value if span.kind else None,
+            span.local_endpoint,
+            span.remote_endpoint,
+            tags,
+            [
+                (key, int(timestamp * 1000000))
+                for key, timestamp in span.annotations.items()
+            ],
+        )
+
+    def encode_span_fields(
+        self,
+        trace_id,
+        span_id,
+        name,
+        parent_id,
+        timestamp,
+        duration,
+        shared,
+        kind,
+        local_endpoint,
+        remote_endpoint,
+        tags,
+        annotations,
+    ):
+        """Encodes a span from its already converted fields.
+
+        This lets the transcoders write spans without creating Span objects.
+
+        :param timestamp: start timestamp in microseconds, or None.
+        :type timestamp: int
+        :param duration: duration in microseconds, or None.
+        :type duration: int
+        :param kind: JSON kind, or None for local spans.
+        :type kind: str
+        :param tags: tags, with both keys and values converted to strings.
+        :type tags: dict
+        :param annotations: (value, timestamp in microseconds) pairs.
+        :type annotations: list of tuple
+        :return: encoded span.
+        :rtype: str
+        """
+        parts = [
+            '{"traceId": ',
+            _json_string(trace_id),
+            ', "id": ',
+            _json_string(span_id),
+        ]
+
+        if name:
+            parts.append(', "name": ')
+            parts.append(_json_string(name))
+        if parent_id:
+            parts.append(', "parentId": ')
+            parts.append(_json_string(parent_id))
+        if timestamp is not None:
+            parts.append(', "timestamp": ')
+            parts.append(str(timestamp))
+        if duration is not None:
+            parts.append(', "duration": ')
+            parts.append(str(duration))
+        if shared:
+            parts.append(', "shared": true')
+        if kind is not None:
+            parts.append(', "kind": ')
+            parts.append(_json_string(kind))
+        if local_endpoint:
+            parts.append(', "localEndpoint": ')
+            parts.append(self._json_endpoint(local_endpoint))
+        if remote_endpoint:
+            parts.append(', "remoteEndpoint": ')
+            parts.append(self._json_endpoint(remote_endpoint))
+        if tags:
+            parts.append(', "tags": {')
+            parts.append(
+                ", ".join(
+                    encode_basestring_ascii(key) + ": " + encode_basestring_ascii(value)
+                    for key, value in six.iteritems(tags)
+                )
+            )
+            parts.append("}")
+
+        if annotations:
+            parts.append(', "annotations": [')
+            parts.append(
+                ", ".join(
+                    '{"timestamp": '
+                    + str(timestamp)
+                    + ', "value": '
+                    + _json_string(key)
+                    + "}"
+                    for key, timestamp in annotations
+                )
+            )
+            parts.append("]")
+
+        parts.append("}")
+        return "".join(parts)
+
+
 class _V2ProtobufEncoder(IEncoder):
     """Protobuf encoder for V2 spans."""
 
+    encoding = Encoding.V2_PROTO3
+
     def fits(self, current_count, current_size, max_size, new_span):
         """Checks if the new span fits in the max payload size."""
         return current_size + len(new_span) <= max_size
 
     def encode_span(self, span):
-        """Encodes a single span to protobuf."""
-        if not protobuf.installed():
-            raise ZipkinError(
-                "protobuf encoding requires installing the protobuf's extra "
-                "requirements. Use py-zipkin[protobuf] in your requirements.txt."
-            )
+        """Encodes a single span to protobuf.
 
-        pb_span = protobuf.create_protobuf_span(span)
-        return protobuf.encode_pb_list([pb_span])
+        The span is written directly in the protobuf wire format, so this
+        doesn't need the protobuf package to be installed.
+        """
+        return protobuf_wire.encode_list_of_spans([span])
 
     def encode_queue(self, queue):
         """Concatenates the list to a protobuf list and encodes it to bytes"""
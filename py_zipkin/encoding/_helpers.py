@@ -27,6 +27,25 @@ _V1Span = namedtuple(
 )
 
 
+# Cache of resolved local endpoints, see create_cached_endpoint.
+_ENDPOINT_CACHE = {}
+_ENDPOINT_CACHE_MAX_SIZE = 1024
+
+# Span attributes, except the lazily allocated annotations and tags.
+_SPAN_ATTRIBUTES = (
+    "trace_id",
+    "name",
+    "parent_id",
+    "span_id",
+    "kind",
+    "timestamp",
+    "duration",
+    "local_endpoint",
+    "remote_endpoint",
+    "debug",
+    "shared",
+)
+
 _DROP_ANNOTATIONS_BY_KIND = {
     Kind.CLIENT: {"ss", "sr"},
     Kind.SERVER: {"cs", "cr"},
@@ -34,7 +53,14 @@ _DROP_ANNOTATIONS_BY_KIND = {
 
 
 class Span(object):
-    """Internal V2 Span representation."""
+    """Internal V2 Span representation.
+
+    Spans are buffered in SpanStorage until the root span exits, so they use
+    __slots__ instead of a per-instance __dict__. Annotations and tags are
+    allocated only when they're first accessed, since most spans have none.
+    """
+
+    __slots__ = _SPAN_ATTRIBUTES + ("_annotations", "_tags")
 
     def __init__(
         self,
@@ -94,8 +120,8 @@ class Span(object):
         self.remote_endpoint = remote_endpoint
         self.debug = debug
         self.shared = shared
-        self.annotations = annotations or {}
-        self.tags = tags or {}
+        self._annotations = annotations or None
+        self._tags = tags or None
 
         if not isinstance(kind, Kind):
             raise ZipkinError(
@@ -110,17 +136,60 @@ class Span(object):
                 "Invalid remote_endpoint value. Must be of type Endpoint."
             )
 
-    def __eq__(self, other):  # pragma: no cover
-        """Compare function to help assert span1 == span2 in py3"""
-        return self.__dict__ == other.__dict__
+    @property
+    def annotations(self):
+        if self._annotations is None:
+            self._annotations = {}
+        return self._annotations
+
+    @annotations.setter
+    def annotations(self, annotations):
+        self._annotations = annotations
+
+    @property
+    def tags(self):
+        if self._tags is None:
+            self._tags = {}
+        return self._tags
 
-    def __cmp__(self, other):  # pragma: no cover
-        """Compare function to help assert span1 == span2 in py2"""
-        return self.__dict__ == other.__dict__
+    @tags.setter
+    def tags(self, tags):
+        self._tags = tags
 
-    def __str__(self):  # pragma: no cover
-        """Compare function to nicely print Span rather than just the pointer"""
-        return str(self.__dict__)
+    def _asdict(self):
+        """Returns the span attributes, without allocating annotations or tags.
+
+        :rtype: dict
+        """
+        attrs = {name: getattr(self, name) for name in _SPAN_ATTRIBUTES}
+        attrs["annotations"] = self._annotations or {}
+        attrs["tags"] = self._tags or {}
+        return attrs
+
+    def __eq__(self, other):
+        """Compare function to help assert span1 == span2"""
+        if not isinstance(other, Span):
+            return NotImplemented
+        return self._asdict() == other._asdict()
+
+    def __ne__(self, other):
+        """Needed for span1 != span2 in py2"""
+        if not isinstance(other, Span):
+            return NotImplemented
+        return not self == other
+
+    # Spans are mutable so they can't be hashed. py3 does this implicitly
+    # when __eq__ is defined, py2 doesn't.
+    __hash__ = None
+
+    def __repr__(self):
+        """Nicely print Span rather than just the pointer"""
+        return "Span({})".format(
+            ", ".join(
+                "{}={!r}".format(name, value)
+                for name, value in sorted(self._asdict().items())
+            )
+        )
 
     def build_v1_span(self):
         """Builds and returns a V1 Span.
@@ -208,6 +277,40 @@ def create_endpoint(port=None, service_name=None, host=None, use_defaults=True):
     return Endpoint(ipv4=ipv4, ipv6=ipv6, port=port, service_name=service_name)
 
 
+def create_cached_endpoint(port=None, service_name=None, host=None):
+    """Same as create_endpoint, but caches the resulting Endpoint.
+
+    Resolving the local host ip and validating the address are expensive
+    compared to the rest of the work done for a span, so we do them only
+    once for every (port, service_name, host) combination.
+    Call `clear_endpoint_cache` if the host address changes.
+
+    :param port: TCP/UDP port. Defaults to 0.
+    :type port: int
+    :param service_name: service name as a str. Defaults to 'unknown'.
+    :type service_name: str
+    :param host: ipv4 or ipv6 address of the host. Defaults to the
+    current host ip.
+    :type host: str
+    :returns: zipkin Endpoint object
+    """
+    key = (port, service_name, host)
+    endpoint = _ENDPOINT_CACHE.get(key)
+    if endpoint is None:
+        endpoint = create_endpoint(port, service_name, host)
+        # Keep the cache bounded in case service names are generated
+        # dynamically.
+        if len(_ENDPOINT_CACHE) >= _ENDPOINT_CACHE_MAX_SIZE:
+            _ENDPOINT_CACHE.clear()
+        _ENDPOINT_CACHE[key] = endpoint
+    return endpoint
+
+
+def clear_endpoint_cache():
+    """Clears the endpoints cached by create_cached_endpoint."""
+    _ENDPOINT_CACHE.clear()
+
+
 def copy_endpoint_with_new_service_name(endpoint, new_service_name):
     """Creates a copy of a given endpoint with a new service name.
 
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""Direct conversions between span encodings.
+
+`convert_spans` usually decodes the input to Span objects and encodes them
+again. For the most common conversions the transcoders here go straight
+from the input fields to the output encoding instead, without creating Span
+objects or converting ids to hex and back.
+
+The output is identical to the generic path: timestamps go through the same
+conversion to seconds and back, and the spans are written by the same
+functions the encoders use.
+"""
+import json
+
+from py_zipkin.encoding.protobuf import _wire as protobuf_wire
+from py_zipkin.encoding._decoders import _decode_json_endpoint
+from py_zipkin.encoding._decoders import _decode_json_kind
+from py_zipkin.encoding._decoders import _iter_json_list
+from py_zipkin.encoding._decoders import _iter_thrift_spans
+from py_zipkin.encoding._decoders import _NO_PARENT_ID
+from py_zipkin.encoding._decoders import _read_hex_id
+from py_zipkin.encoding._decoders import _read_raw_id
+from py_zipkin.encoding._decoders import _read_thrift_span
+from py_zipkin.encoding._decoders import _seconds
+from py_zipkin.encoding._encoders import get_encoder
+from py_zipkin.encoding._types import Encoding
+
+_NO_RAW_PARENT_ID = b"\x00" * 8
+
+
+def get_transcoder(input_encoding, output_encoding):
+    """Creates a transcoder converting spans directly between the encodings.
+
+    :param input_encoding: encoding of the input spans.
+    :type input_encoding: Encoding
+    :param output_encoding: desired output encoding.
+    :type output_encoding: Encoding
+    :return: corresponding ITranscoder object, or None if spans need to be
+        decoded and encoded again.
+    :rtype: ITranscoder
+    """
+    if input_encoding == Encoding.V1_THRIFT:
+        if output_encoding == Encoding.V2_JSON:
+            return _V1ThriftToV2JSONTranscoder()
+        if output_encoding == Encoding.V2_PROTO3:
+            return _V1ThriftToV2ProtobufTranscoder()
+    elif input_encoding == Encoding.V2_JSON:
+        if output_encoding == Encoding.V2_PROTO3:
+            return _V2JSONToV2ProtobufTranscoder()
+    return None
+
+
+class ITranscoder(object):
+    """Transcoder interface.
+
+    Transcoded spans are the same as the output of the output encoder's
+    encode_span, so they can be joined with its encode_queue.
+    """
+
+    def transcode_spans(self, spans):
+        """Converts an encoded list of spans.
+
+        :param spans: encoded list of spans
+        :type spans: bytes
+        :return: list of spans in the output encoding
+        :rtype: list of str or bytes
+        """
+        raise NotImplementedError()
+
+    def iter_transcode_spans(self, spans):
+        """Converts an encoded list of spans incrementally.
+
+        :param spans: encoded list of spans
+        :type spans: bytes, any object supporting the buffer protocol (i.e.
+            mmap) or a binary file-like object.
+        :return: generator of spans in the output encoding
+        :rtype: iterator of str or bytes
+        """
+        raise NotImplementedError()
+
+
+def _json_us(us):
+    """Converts a timestamp the same way as decoding it to a Span and encoding
+    it to JSON."""
+    seconds = _seconds(us)
+    if seconds:
+        return int(seconds * 1000000)
+    return None
+
+
+def _proto_us(us):
+    """Converts a timestamp the same way as decoding it to a Span and encoding
+    it to proto3."""
+    seconds = _seconds(us)
+    if seconds:
+        return int(seconds * 1000 * 1000)
+    return None
+
+
+class _BaseV1ThriftTranscoder(ITranscoder):
+    """The thrift spans are read like in the V1_THRIFT decoder, but each span
+    is written out as soon as it's been read."""
+
+    def transcode_spans(self, spans):
+        return list(self.iter_transcode_spans(spans))
+
+    def iter_transcode_spans(self, spans):
+        for encoded_span in _iter_thrift_spans(spans, read_span=self._read_span):
+            yield encoded_span
+
+    def _read_span(self, buf, pos):  # pragma: no cover
+        raise NotImplementedError()
+
+
+class _V1ThriftToV2JSONTranscoder(_BaseV1ThriftTranscoder):
+    def __init__(self):
+        self._encoder = get_encoder(Encoding.V2_JSON)
+
+    def _read_span(self, buf, pos):
+        (
+            (
+                trace_id,
+                name,
+                parent_id,
+                span_id,
+                kind,
+                timestamp,
+                duration,
+                local_endpoint,
+                remote_endpoint,
+                shared,
+                annotations,
+                tags,
+            ),
+            pos,
+        ) = _read_thrift_span(buf, pos, _read_hex_id)
+        encoded_span = self._encoder.encode_span_fields(
+            trace_id,
+            span_id,
+            name,
+            None if parent_id == _NO_PARENT_ID else parent_id,
+            _json_us(timestamp),
+            _json_us(duration),
+            shared,
+            kind.value,
+            local_endpoint,
+            remote_endpoint,
+            {str(key): str(value) for key, value in tags.items()},
+            [
+                (value, int(_seconds(ts) * 1000000))
+                for value, ts in annotations.items()
+            ],
+        )
+        return encoded_span, pos
+
+
+class _V1ThriftToV2ProtobufTranscoder(_BaseV1ThriftTranscoder):
+    """Ids are copied as they are, since both encodings store them as
+    big-endian binary."""
+
+    def _read_span(self, buf, pos):
+        (
+            (
+                trace_id,
+                name,
+                parent_id,
+                span_id,
+                kind,
+                timestamp,
+                duration,
+                local_endpoint,
+                remote_endpoint,
+                shared,
+                annotations,
+                tags,
+            ),
+            pos,
+        ) = _read_thrift_span(buf, pos, _read_raw_id)
+        encoded_span = protobuf_wire.encode_span_fields(
+            trace_id,
+            None if parent_id == _NO_RAW_PARENT_ID else parent_id,
+            span_id,
+            kind,
+            name,
+            _proto_us(timestamp),
+            _proto_us(duration),
+            local_endpoint,
+            remote_endpoint,
+            [
+                (value, int(_seconds(ts) * 1000 * 1000))
+                for value, ts in annotations.items()
+            ],
+            tags.items(),
+            False,
+            shared,
+        )
+        return protobuf_wire.encode_list_element(encoded_span), pos
+
+
+class _V2JSONToV2ProtobufTranscoder(ITranscoder):
+    def transcode_spans(self, spans):
+        if isinstance(spans, bytes):
+            spans = spans.decode("utf-8")
+        return [self._transcode_json_span(span) for span in json.loads(spans)]
+
+    def iter_transcode_spans(self, spans):
+        for json_span in _iter_json_list(spans):
+            yield self._transcode_json_span(json_span)
+
+    def _transcode_json_span(self, json_span):
+        """Converts a V2 JSON span to a ListOfSpans message with just that span.
+
+        :param json_span: JSON span.
+        :type json_span: dict
+        :returns: encoded span
+        :rtype: bytes
+        """
+        parent_id = json_span.get("parentId")
+        # Annotations with the same value override each other, like in the
+        # V2_JSON decoder.
+        annotations = {
+            annotation["value"]: annotation["timestamp"]
+            for annotation in json_span.get("annotations", ())
+        }
+        tags = json_span.get("tags")
+        encoded_span = protobuf_wire.encode_span_fields(
+            protobuf_wire.hex_to_bytes(json_span["traceId"]),
+            protobuf_wire.hex_to_bytes(parent_id) if parent_id else None,
+            protobuf_wire.hex_to_bytes(json_span["id"]),
+            _decode_json_kind(json_span.get("kind")),
+            json_span.get("name"),
+            _proto_us(json_span.get("timestamp")),
+            _proto_us(json_span.get("duration")),
+            _decode_json_endpoint(json_span.get("localEndpoint")),
+            _decode_json_endpoint(json_span.get("remoteEndpoint")),
+            [
+                (value, int(_seconds(ts) * 1000 * 1000))
+                for value, ts in annotations.items()
+            ],
+            tags.items() if tags else (),
+            json_span.get("debug", False),
+            json_span.get("shared", False),
+        )
+        return protobuf_wire.encode_list_element(encoded_span)
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""Pure-python writer for the zipkin proto3 wire format.
+
+This writes the messages defined in zipkin.proto directly, without going
+through zipkin_pb2 objects, so it doesn't need the protobuf package to be
+installed. The output is the same as zipkin_pb2's SerializeToString.
+
+The V2_PROTO3 decoder reads them back with decode_varint.
+"""
+import socket
+import struct
+from binascii import unhexlify
+
+import six
+
+from py_zipkin.encoding._types import Kind
+from py_zipkin.exception import ZipkinError
+
+# Wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+
+_KIND_VALUES = {
+    Kind.CLIENT: 1,
+    Kind.SERVER: 2,
+    Kind.PRODUCER: 3,
+    Kind.CONSUMER: 4,
+}
+
+# Encoded endpoint messages. Most spans share the same endpoints.
+_ENDPOINT_CACHE = {}
+_ENDPOINT_CACHE_MAX_SIZE = 1024
+
+_fixed64 = struct.Struct("<Q").pack
+_SMALL_VARINTS = [six.int2byte(i) for i in range(0x80)]
+_indexbytes = six.indexbytes
+
+
+def _tag(field_number, wire_type):
+    return six.int2byte((field_number << 3) | wire_type)
+
+
+# ListOfSpans
+_LIST_SPANS = _tag(1, _LENGTH_DELIMITED)
+
+# Span
+_SPAN_TRACE_ID = _tag(1, _LENGTH_DELIMITED)
+_SPAN_PARENT_ID = _tag(2, _LENGTH_DELIMITED)
+_SPAN_ID = _tag(3, _LENGTH_DELIMITED)
+_SPAN_KIND = _tag(4, _VARINT)
+_SPAN_NAME = _tag(5, _LENGTH_DELIMITED)
+_SPAN_TIMESTAMP = _tag(6, _FIXED64)
+_SPAN_DURATION = _tag(7, _VARINT)
+_SPAN_LOCAL_ENDPOINT = _tag(8, _LENGTH_DELIMITED)
+_SPAN_REMOTE_ENDPOINT = _tag(9, _LENGTH_DELIMITED)
+_SPAN_ANNOTATIONS = _tag(10, _LENGTH_DELIMITED)
+_SPAN_TAGS = _tag(11, _LENGTH_DELIMITED)
+_SPAN_DEBUG_TRUE = _tag(12, _VARINT) + b"\x01"
+_SPAN_SHARED_TRUE = _tag(13, _VARINT) + b"\x01"
+
+# Endpoint
+_ENDPOINT_SERVICE_NAME = _tag(1, _LENGTH_DELIMITED)
+_ENDPOINT_IPV4 = _tag(2, _LENGTH_DELIMITED)
+_ENDPOINT_IPV6 = _tag(3, _LENGTH_DELIMITED)
+_ENDPOINT_PORT = _tag(4, _VARINT)
+
+# Annotation
+_ANNOTATION_TIMESTAMP = _tag(1, _FIXED64)
+_ANNOTATION_VALUE = _tag(2, _LENGTH_DELIMITED)
+
+# Tags map entry
+_TAG_KEY = _tag(1, _LENGTH_DELIMITED)
+_TAG_VALUE = _tag(2, _LENGTH_DELIMITED)
+
+
+def encode_varint(value):
+    """Encodes an unsigned int as a protobuf varint.
+
+    Negative values are encoded as 64 bit two's complement, like protobuf
+    does for int32 and int64 fields.
+
+    :param value: value to encode.
+    :type value: int
+    :return: encoded varint.
+    :rtype: bytes
+    """
+    if 0 <= value < 0x80:
+        return _SMALL_VARINTS[value]
+    value &= 0xFFFFFFFFFFFFFFFF
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_varint(buf, pos):
+    """Decodes a protobuf varint.
+
+    :param buf: buffer to read from.
+    :type buf: bytes or memoryview
+    :param pos: position of the varint in the buffer.
+    :type pos: int
+    :return: (decoded value, position right after the varint)
+    :rtype: (int, int)
+    :raises IndexError: if the buffer ends in the middle of the varint.
+    """
+    byte = _indexbytes(buf, pos)
+    if byte < 0x80:
+        return byte, pos + 1
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        pos += 1
+        byte = _indexbytes(buf, pos)
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value & 0xFFFFFFFFFFFFFFFF, pos + 1
+        shift += 7
+        if shift >= 70:
+            raise ZipkinError("Invalid varint, more than 10 bytes long.")
+
+
+def _length_delimited(tag, value):
+    return tag + encode_varint(len(value)) + value
+
+
+def _utf8(value):
+    if isinstance(value, six.text_type):
+        return value.encode("utf-8")
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+def hex_to_bytes(hex_id):
+    """Encodes an hexadecimal id to big-endian binary.
+
+    Ids up to 16 chars are encoded on 8 bytes, longer ones on 16 bytes.
+
+    :param hex_id: hexadecimal id to encode.
+    :type hex_id: str
+    :return: binary representation.
+    :type: bytes
+    """
+    if len(hex_id) <= 16:
+        return unhexlify(hex_id.zfill(16))
+    return unhexlify(hex_id.zfill(32))
+
+
+def encode_endpoint(endpoint):
+    """Encodes an Endpoint message.
+
+    :param endpoint: endpoint to encode.
+    :type endpoint: py_zipkin.encoding.Endpoint
+    :return: encoded message, without tag and length.
+    :rtype: bytes
+    """
+    encoded = _ENDPOINT_CACHE.get(endpoint)
+    if encoded is not None:
+        return encoded
+
+    parts = []
+    if endpoint.service_name:
+        parts.append(
+            _length_delimited(_ENDPOINT_SERVICE_NAME, _utf8(endpoint.service_name))
+        )
+    if endpoint.ipv4:
+        parts.append(
+            _length_delimited(
+                _ENDPOINT_IPV4, socket.inet_pton(socket.AF_INET, endpoint.ipv4),
+            )
+        )
+    if endpoint.ipv6:
+        parts.append(
+            _length_delimited(
+                _ENDPOINT_IPV6, socket.inet_pton(socket.AF_INET6, endpoint.ipv6),
+            )
+        )
+    if endpoint.port and endpoint.port != 0:
+        parts.append(_ENDPOINT_PORT + encode_varint(endpoint.port))
+    encoded = b"".join(parts)
+
+    if len(_ENDPOINT_CACHE) >= _ENDPOINT_CACHE_MAX_SIZE:
+        _ENDPOINT_CACHE.clear()
+    _ENDPOINT_CACHE[endpoint] = encoded
+    return encoded
+
+
+def encode_span(span):
+    """Encodes a Span message.
+
+    :param span: py_zipkin Span to encode.
+    :type span: py_zipkin.encoding.Span
+    :return: encoded message, without tag and length.
+    :rtype: bytes
+    """
+    timestamp = None
+    if span.timestamp:
+        timestamp = int(span.timestamp * 1000 * 1000)
+    duration = None
+    if span.duration:
+        duration = int(span.duration * 1000 * 1000)
+    return encode_span_fields(
+        hex_to_bytes(span.trace_id),
+        hex_to_bytes(span.parent_id) if span.parent_id else None,
+        hex_to_bytes(span.span_id),
+        span.kind,
+        span.name,
+        timestamp,
+        duration,
+        span.local_endpoint,
+        span.remote_endpoint,
+        [(value, int(ts * 1000 * 1000)) for value, ts in span.annotations.items()],
+        span.tags.items(),
+        span.debug,
+        span.shared,
+    )
+
+
+def encode_span_fields(
+    trace_id,
+    parent_id,
+    span_id,
+    kind,
+    name,
+    timestamp,
+    duration,
+    local_endpoint,
+    remote_endpoint,
+    annotations,
+    tags,
+    debug,
+    shared,
+):
+    """Encodes a Span message from its already converted fields.
+
+    This lets the transcoders write spans without creating Span objects.
+
+    :param trace_id: binary trace id.
+    :type trace_id: bytes
+    :param parent_id: binary parent span id, or None.
+    :type parent_id: bytes
+    :param span_id: binary span id.
+    :type span_id: bytes
+    :param timestamp: start timestamp in microseconds, or None.
+    :type timestamp: int
+    :param duration: duration in microseconds, or None.
+    :type duration: int
+    :param annotations: (value, timestamp in microseconds) pairs.
+    :type annotations: list of tuple
+    :param tags: (key, value) pairs.
+    :type tags: iterable of tuple
+    :return: encoded message, without tag and length.
+    :rtype: bytes
+    """
+    parts = [_length_delimited(_SPAN_TRACE_ID, trace_id)]
+
+    if parent_id:
+        parts.append(_length_delimited(_SPAN_PARENT_ID, parent_id))
+
+    parts.append(_length_delimited(_SPAN_ID, span_id))
+
+    kind = _KIND_VALUES.get(kind)
+    if kind:
+        parts.append(_SPAN_KIND + _SMALL_VARINTS[kind])
+
+    if name:
+        parts.append(_length_delimited(_SPAN_NAME, _utf8(name)))
+
+    if timestamp:
+        parts.append(_SPAN_TIMESTAMP + _fixed64(timestamp))
+    if duration:
+        parts.append(_SPAN_DURATION + encode_varint(duration))
+
+    if local_endpoint:
+        parts.append(
+            _length_delimited(_SPAN_LOCAL_ENDPOINT, encode_endpoint(local_endpoint)),
+        )
+    if remote_endpoint:
+        parts.append(
+            _length_delimited(
+                _SPAN_REMOTE_ENDPOINT, encode_endpoint(remote_endpoint),
+            )
+        )
+
+    for value, timestamp in annotations:
+        annotation = []
+        if timestamp:
+            annotation.append(_ANNOTATION_TIMESTAMP + _fixed64(timestamp))
+        value = _utf8(value)
+        if value:
+            annotation.append(_length_delimited(_ANNOTATION_VALUE, value))
+        parts.append(_length_delimited(_SPAN_ANNOTATIONS, b"".join(annotation)))
+
+    for key, value in tags:
+        # protobuf always writes both key and value of map entries, even
+        # when they're empty.
+        entry = _length_delimited(_TAG_KEY, _utf8(key)) + _length_delimited(
+            _TAG_VALUE, _utf8(value),
+        )
+        parts.append(_length_delimited(_SPAN_TAGS, entry))
+
+    if debug:
+        parts.append(_SPAN_DEBUG_TRUE)
+    if shared:
+        parts.append(_SPAN_SHARED_TRUE)
+
+    return b"".join(parts)
+
+
+def encode_list_element(encoded_span):
+    """Wraps an encoded Span message in a ListOfSpans message.
+
+    :param encoded_span: Span message returned by `encode_span`.
+    :type encoded_span: bytes
+    :return: encoded list with just that span.
+    :rtype: bytes
+    """
+    return _length_delimited(_LIST_SPANS, encoded_span)
+
+
+def encode_list_of_spans(spans):
+    """Encodes a ListOfSpans message.
+
+    Since ListOfSpans only has one repeated field, the concatenation of
+    multiple encoded lists is still a valid encoded list.
+
+    :param spans: py_zipkin Spans to encode.
+    :type spans: list of py_zipkin.encoding.Span
+    :return: encoded list.
+    :rtype: bytes
+    """
+    return b"".join(encode_list_element(encode_span(s)) for s in spans)
@@ -3,3 +3,8 @@
 
 class ZipkinError(Exception):
     """Custom error to be raised on Zipkin exceptions."""
+
+
+class CircuitOpenError(ZipkinError):
+    """Raised instead of sending a payload while the circuit breaker of the
+    transport is open."""
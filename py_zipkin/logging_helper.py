@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import logging
 import os
 import time
 
@@ -7,11 +8,15 @@ from py_zipkin.encoding._encoders import get_encoder
 from py_zipkin.encoding._helpers import copy_endpoint_with_new_service_name
 from py_zipkin.encoding._helpers import Span
 from py_zipkin.exception import ZipkinError
+from py_zipkin.reporter import AsyncReporter
 from py_zipkin.transport import BaseTransportHandler
+from py_zipkin.transport import Payload
 
 
 LOGGING_END_KEY = "py_zipkin.logging_end"
 
+log = logging.getLogger(__name__)
+
 
 class ZipkinLoggingContext(object):
     """A logging context specific to a Zipkin trace. If the trace is sampled,
@@ -38,6 +43,8 @@ class ZipkinLoggingContext(object):
         firehose_handler=None,
         encoding=None,
         annotations=None,
+        max_buffered_spans=None,
+        max_buffer_seconds=None,
     ):
         self.zipkin_attrs = zipkin_attrs
         self.endpoint = endpoint
@@ -53,6 +60,8 @@ class ZipkinLoggingContext(object):
         self.max_span_batch_size = max_span_batch_size
         self.firehose_handler = firehose_handler
         self.annotations = annotations or {}
+        self.max_buffered_spans = max_buffered_spans
+        self.max_buffer_seconds = max_buffer_seconds
 
         self.remote_endpoint = None
         self.encoder = get_encoder(encoding)
@@ -62,8 +71,53 @@ class ZipkinLoggingContext(object):
 
         # Record the start timestamp.
         self.start_timestamp = time.time()
+        self.last_flush_timestamp = self.start_timestamp
         return self
 
+    def maybe_flush_spans(self):
+        """Flushes the finished child spans if there are too many of them or
+        if they've been buffered for too long.
+
+        This is meant to be called every time a span is added to the tracer,
+        so that long-running root spans don't keep all their children in
+        memory until they end.
+        """
+        if (
+            self.max_buffered_spans is not None
+            and len(self._get_tracer()._span_storage) >= self.max_buffered_spans
+        ) or (
+            self.max_buffer_seconds is not None
+            and time.time() - self.last_flush_timestamp >= self.max_buffer_seconds
+        ):
+            try:
+                self.flush_spans()
+            except Exception as ex:
+                log.error("Error flushing zipkin spans. {}".format(repr(ex)))
+
+    def flush_spans(self):
+        """Sends the child spans finished until now, without waiting for the
+        root span to end.
+        """
+        if self.max_buffer_seconds is not None:
+            self.last_flush_timestamp = time.time()
+
+        span_storage = self._get_tracer()._span_storage
+        spans = []
+        # popleft is atomic, so spans added concurrently by other threads are
+        # either sent now or left for the next flush.
+        while True:
+            try:
+                spans.append(span_storage.popleft())
+            except IndexError:
+                break
+        if not spans:
+            return
+
+        span_senders = self._get_span_senders()
+        if span_senders:
+            with ZipkinFanOutSender(span_senders, self.encoder) as span_sender:
+                self._add_child_spans(span_sender, spans)
+
     def stop(self):
         """Actions to be taken post request handling.
         """
@@ -76,38 +130,40 @@ class ZipkinLoggingContext(object):
         a success. It also logs the service (`ss` and `sr`) or the client
         ('cs' and 'cr') annotations.
         """
+        span_senders = self._get_span_senders()
+        if span_senders:
+            self._emit_spans_with_span_sender(
+                ZipkinFanOutSender(span_senders, self.encoder),
+            )
+        self._get_tracer().clear()
+
+    def _get_span_senders(self):
+        """Returns a batch sender for the firehose handler, if there's one,
+        and one for the transport handler if the trace is sampled.
 
-        # FIXME: Should have a single aggregate handler
+        Each handler is batched according to its own max payload size.
+        """
+        span_senders = []
         if self.firehose_handler:
-            # FIXME: We need to allow different batching settings per handler
-            self._emit_spans_with_span_sender(
+            span_senders.append(
                 ZipkinBatchSender(
                     self.firehose_handler, self.max_span_batch_size, self.encoder
                 )
             )
-
-        if not self.zipkin_attrs.is_sampled:
-            self._get_tracer().clear()
-            return
-
-        span_sender = ZipkinBatchSender(
-            self.transport_handler, self.max_span_batch_size, self.encoder
-        )
-
-        self._emit_spans_with_span_sender(span_sender)
-        self._get_tracer().clear()
+        if self.zipkin_attrs.is_sampled:
+            span_senders.append(
+                ZipkinBatchSender(
+                    self.transport_handler, self.max_span_batch_size, self.encoder
+                )
+            )
+        return span_senders
 
     def _emit_spans_with_span_sender(self, span_sender):
         with span_sender:
             end_timestamp = time.time()
 
             # Collect, annotate, and log client spans from the logging handler
-            for span in self._get_tracer()._span_storage:
-                span.local_endpoint = copy_endpoint_with_new_service_name(
-                    self.endpoint, span.local_endpoint.service_name,
-                )
-
-                span_sender.add_span(span)
+            self._add_child_spans(span_sender, self._get_tracer()._span_storage)
 
             if self.add_logging_annotation:
                 self.annotations[LOGGING_END_KEY] = time.time()
@@ -129,6 +185,22 @@ class ZipkinLoggingContext(object):
                 )
             )
 
+    def _add_child_spans(self, span_sender, spans):
+        for span in spans:
+            span.local_endpoint = copy_endpoint_with_new_service_name(
+                self.endpoint, span.local_endpoint.service_name,
+            )
+
+            span_sender.add_span(span)
+
+
+def _make_error(exc_type, exc_value, exc_traceback):
+    filename = os.path.split(exc_traceback.tb_frame.f_code.co_filename)[1]
+    error = "({0}:{1}) {2}: {3}".format(
+        filename, exc_traceback.tb_lineno, exc_type.__name__, exc_value,
+    )
+    return ZipkinError(error)
+
 
 class ZipkinBatchSender(object):
 
@@ -138,6 +210,8 @@ class ZipkinBatchSender(object):
         self.transport_handler = transport_handler
         self.max_portion_size = max_portion_size or self.MAX_PORTION_SIZE
         self.encoder = encoder
+        # Reporters take care of encoding and batching spans by themselves.
+        self.is_reporter = isinstance(self.transport_handler, AsyncReporter)
 
         if isinstance(self.transport_handler, BaseTransportHandler):
             self.max_payload_bytes = self.transport_handler.get_max_payload_bytes()
@@ -150,11 +224,7 @@ class ZipkinBatchSender(object):
 
     def __exit__(self, _exc_type, _exc_value, _exc_traceback):
         if any((_exc_type, _exc_value, _exc_traceback)):
-            filename = os.path.split(_exc_traceback.tb_frame.f_code.co_filename)[1]
-            error = "({0}:{1}) {2}: {3}".format(
-                filename, _exc_traceback.tb_lineno, _exc_type.__name__, _exc_value,
-            )
-            raise ZipkinError(error)
+            raise _make_error(_exc_type, _exc_value, _exc_traceback)
         else:
             self.flush()
 
@@ -162,8 +232,20 @@ class ZipkinBatchSender(object):
         self.queue = []
         self.current_size = 0
 
-    def add_span(self, internal_span):
-        encoded_span = self.encoder.encode_span(internal_span)
+    def add_span(self, internal_span, encoded_span=None):
+        """Adds a span to the current batch.
+
+        :param internal_span: span to send.
+        :type internal_span: Span
+        :param encoded_span: the same span already encoded with this sender's
+            encoder, so that it doesn't need to be encoded again.
+        """
+        if self.is_reporter:
+            self.transport_handler.report(internal_span)
+            return
+
+        if encoded_span is None:
+            encoded_span = self.encoder.encode_span(internal_span)
 
         # If we've already reached the max batch size or the new span doesn't
         # fit in max_payload_bytes, send what we've collected until now and
@@ -188,5 +270,42 @@ class ZipkinBatchSender(object):
         if self.transport_handler and len(self.queue) > 0:
 
             message = self.encoder.encode_queue(self.queue)
+            if isinstance(self.transport_handler, BaseTransportHandler):
+                message = Payload(message, self.encoder.encoding, len(self.queue))
             self.transport_handler(message)
         self._reset_queue()
+
+
+class ZipkinFanOutSender(object):
+    """Sends the same spans to multiple ZipkinBatchSenders, i.e. to the
+    firehose and to the transport handler, encoding each span only once.
+
+    All the senders must use the same encoder.
+    """
+
+    def __init__(self, span_senders, encoder):
+        self.span_senders = span_senders
+        self.encoder = encoder
+        self._needs_encoding = any(not s.is_reporter for s in span_senders)
+
+    def __enter__(self):
+        for span_sender in self.span_senders:
+            span_sender._reset_queue()
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _exc_traceback):
+        if any((_exc_type, _exc_value, _exc_traceback)):
+            raise _make_error(_exc_type, _exc_value, _exc_traceback)
+        else:
+            self.flush()
+
+    def add_span(self, internal_span):
+        encoded_span = None
+        if self._needs_encoding:
+            encoded_span = self.encoder.encode_span(internal_span)
+        for span_sender in self.span_senders:
+            span_sender.add_span(internal_span, encoded_span)
+
+    def flush(self):
+        for span_sender in self.span_senders:
+            span_sender.flush()
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+import atexit
+import logging
+import threading
+import time
+
+from six.moves import queue
+
+from py_zipkin.encoding._encoders import get_encoder
+from py_zipkin.encoding._helpers import Span
+from py_zipkin.encoding._types import Encoding
+from py_zipkin.transport import _forward_payload
+from py_zipkin.transport import BaseTransportHandler
+
+log = logging.getLogger("py_zipkin.reporter")
+
+# Sentinel pushed in the queue to wake up the worker when flushing or closing.
+_WAKEUP = object()
+
+
+class AsyncReporter(BaseTransportHandler):
+    """Reports spans from a background thread.
+
+    AsyncReporter wraps another transport and can be used anywhere a
+    `transport_handler` is accepted. When a root `zipkin_span` exits, the
+    finished spans are put in a bounded in-memory queue instead of being
+    encoded and sent synchronously. A worker thread then takes care of
+    encoding, batching and sending them through the wrapped transport.
+
+    When the queue is full new spans are dropped and counted in
+    `spans_dropped`, so tracing never blocks the request thread.
+
+    .. code-block:: python
+
+        reporter = AsyncReporter(
+            SimpleHTTPTransport('localhost', 9411),
+            encoding=Encoding.V2_JSON,
+        )
+        with zipkin_span(
+            service_name='my_service',
+            span_name='home',
+            sample_rate=100,
+            transport_handler=reporter,
+        ):
+            pass
+
+    NOTE: the reporter always encodes spans using its own `encoding` and
+    ignores the one set in `zipkin_span`.
+    """
+
+    def __init__(
+        self,
+        transport_handler,
+        encoding=Encoding.V1_THRIFT,
+        flush_interval=1.0,
+        max_queue_size=10000,
+        max_span_batch_size=None,
+    ):
+        """Creates a new AsyncReporter.
+
+        :param transport_handler: transport used to send the encoded spans.
+        :type transport_handler: BaseTransportHandler
+        :param encoding: output encoding, defaults to V1 thrift spans.
+        :type encoding: Encoding
+        :param flush_interval: max number of seconds a span can sit in the
+            reporter before being sent.
+        :type flush_interval: float
+        :param max_queue_size: max number of spans waiting to be sent. New
+            spans are dropped when the queue is full.
+        :type max_queue_size: int
+        :param max_span_batch_size: max number of spans sent in one payload.
+        :type max_span_batch_size: int
+        """
+        super(AsyncReporter, self).__init__()
+        self.transport_handler = transport_handler
+        self.encoder = get_encoder(encoding)
+        self.flush_interval = flush_interval
+        self.max_span_batch_size = max_span_batch_size
+
+        self.spans_reported = 0
+        self.spans_dropped = 0
+        self.payloads_dropped = 0
+        self.send_errors = 0
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._flush_requests = 0
+        self._flushes_done = 0
+        self._closed = False
+        self._thread = None
+
+    def get_max_payload_bytes(self):
+        """Pre-encoded payloads are forwarded as they are to the wrapped
+        transport, so they need to respect its max payload size."""
+        if isinstance(self.transport_handler, BaseTransportHandler):
+            return self.transport_handler.get_max_payload_bytes()
+        return None
+
+    def report(self, span):
+        """Queues a finished span to be encoded and sent by the worker thread.
+
+        This never blocks: if the queue is full the span is dropped.
+
+        :param span: finished span.
+        :type span: Span
+        :returns: True if the span was queued, False if it was dropped.
+        :rtype: bool
+        """
+        self._ensure_started()
+        with self._lock:
+            if not self._put(span):
+                self.spans_dropped += 1
+                return False
+            self.spans_reported += 1
+            return True
+
+    def send(self, payload):
+        """Queues an already encoded payload.
+
+        This is what gets called when the reporter is used by code that
+        encodes spans by itself. The payload is forwarded as it is.
+        """
+        self._ensure_started()
+        with self._lock:
+            if not self._put(payload):
+                self.payloads_dropped += 1
+
+    def send_payload(self, payload):
+        """Queues a `Payload`. It's forwarded with its metadata, so the
+        wrapped transport doesn't need to detect its encoding."""
+        self.send(payload)
+
+    def _put(self, item):
+        """Queues an item. This must be called while holding the lock.
+
+        close() sets _closed under the same lock, so nothing can be queued
+        after the worker has been told to stop. The stats are updated under
+        it too since they're shared by all the request threads.
+        """
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return False
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None or self._closed:
+            return
+        with self._lock:
+            if self._thread is None and not self._closed:
+                thread = threading.Thread(
+                    target=self._run, name="py_zipkin.AsyncReporter",
+                )
+                thread.daemon = True
+                thread.start()
+                atexit.register(self.close)
+                self._thread = thread
+
+    def flush(self, timeout=None):
+        """Blocks until every span reported so far has been sent.
+
+        :param timeout: max number of seconds to wait.
+        :type timeout: float
+        :returns: True if the flush completed, False if it timed out.
+        :rtype: bool
+        """
+        if self._thread is None:
+            return True
+
+        with self._lock:
+            if self._closed:
+                # The worker is stopping or gone, so nobody would answer a
+                # new flush request, i.e. in atexit hooks running after
+                # close().
+                return self._flushes_done >= self._flush_requests
+            self._flush_requests += 1
+            target = self._flush_requests
+        # This can block if the queue is full, but the worker is going to
+        # free up some space soon.
+        self._queue.put(_WAKEUP)
+
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self._flushes_done < target:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Sends everything that's still queued and stops the worker thread.
+
+        Spans reported after `close` are dropped.
+
+        :param timeout: max number of seconds to wait.
+        :type timeout: float
+        """
+        if self._closed:
+            return
+        self.flush(timeout)
+        with self._lock:
+            self._closed = True
+        if self._thread is not None:
+            self._queue.put(_WAKEUP)
+            self._thread.join(timeout)
+
+    def _run(self):
+        # Imported here to avoid a circular dependency, since logging_helper
+        # needs to know about AsyncReporter.
+        from py_zipkin.logging_helper import ZipkinBatchSender
+
+        sender = ZipkinBatchSender(
+            self.transport_handler, self.max_span_batch_size, self.encoder,
+        )
+        sender._reset_queue()
+        deadline = None
+
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - time.time(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is not None and item is not _WAKEUP:
+                if isinstance(item, Span):
+                    try:
+                        sender.add_span(item)
+                    except Exception as e:
+                        # Drop the current batch, otherwise we'd keep retrying
+                        # to send it forever.
+                        sender._reset_queue()
+                        self._on_send_error(e)
+                    if deadline is None:
+                        deadline = time.time() + self.flush_interval
+                else:
+                    try:
+                        _forward_payload(self.transport_handler, item)
+                    except Exception as e:
+                        self._on_send_error(e)
+                # Under sustained load the queue is never empty, so the flush
+                # interval has to be checked after every item too.
+                if deadline is None or time.time() < deadline:
+                    continue
+
+            # We get here when the flush interval expired or when someone
+            # called flush or close.
+            try:
+                sender.flush()
+            except Exception as e:
+                sender._reset_queue()
+                self._on_send_error(e)
+            deadline = None
+
+            if item is _WAKEUP:
+                with self._lock:
+                    self._flushes_done = self._flush_requests
+                    self._flushed.notify_all()
+                if self._closed:
+                    return
+
+    def _on_send_error(self, error):
+        self.send_errors += 1
+        log.error("Error emitting zipkin trace. {}".format(repr(error)))
@@ -3,6 +3,7 @@ import logging
 
 from py_zipkin.storage import get_default_tracer
 from py_zipkin.util import _should_sample
+from py_zipkin.util import _should_sample_trace_id
 from py_zipkin.util import create_attrs_for_span
 from py_zipkin.util import generate_random_64bit_string
 from py_zipkin.util import ZipkinAttrs
@@ -97,7 +98,12 @@ def _parse_multi_header(headers):
 
 
 def extract_zipkin_attrs_from_headers(
-    headers, sample_rate=100.0, use_128bit_trace_id=False
+    headers,
+    sample_rate=100.0,
+    use_128bit_trace_id=False,
+    sampler=None,
+    span_name=None,
+    sample_by_trace_id=False,
 ):
     """
     Implements extraction of B3 headers per:
@@ -106,6 +112,12 @@ def extract_zipkin_attrs_from_headers(
     The input headers can be any dict-like container that supports "in"
     membership test and a .get() method that accepts a default value.
 
+    If the sampling decision was deferred, it's made with `sampler` if set,
+    otherwise with `sample_rate`. If `sample_by_trace_id` is true, the
+    decision is derived from the trace id rather than from a random number,
+    so all the services with the same sample_rate agree on it without
+    propagating it.
+
     Returns a ZipkinAttrs instance or None
     """
     try:
@@ -141,7 +153,12 @@ def extract_zipkin_attrs_from_headers(
     else:
         # sample flag missing; means "Defer" and we're responsible for
         # rolling fresh dice
-        is_sampled = _should_sample(sample_rate)
+        if sampler is not None:
+            is_sampled = sampler.should_sample(parsed["trace_id"], span_name)
+        elif sample_by_trace_id:
+            is_sampled = _should_sample_trace_id(parsed["trace_id"], sample_rate)
+        else:
+            is_sampled = _should_sample(sample_rate)
 
     return ZipkinAttrs(
         parsed["trace_id"],
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Samplers decide whether a new trace should be recorded.
+
+Pass a sampler to `zipkin_span`, `create_attrs_for_span` or
+`extract_zipkin_attrs_from_headers` instead of a fixed sample_rate. They're
+only consulted when a new sampling decision is needed, i.e. not when the
+decision has been propagated by an upstream service.
+"""
+import threading
+import time
+
+from py_zipkin.exception import ZipkinError
+from py_zipkin.util import _should_sample
+from py_zipkin.util import _should_sample_trace_id
+
+# Rate limiting shouldn't be affected by changes to the system clock.
+_clock = getattr(time, "monotonic", time.time)
+
+
+def _validate_sample_rate(sample_rate):
+    if not (0.0 <= sample_rate <= 100.0):
+        raise ZipkinError("Sample rate must be between 0.0 and 100.0")
+
+
+class Sampler(object):
+    """Sampler interface."""
+
+    def should_sample(self, trace_id, span_name=None):
+        """Decides whether a new trace should be sampled.
+
+        :param trace_id: id of the trace.
+        :type trace_id: str
+        :param span_name: name of the span that's starting the trace, if known.
+        :type span_name: str
+        :returns: True if the trace should be sampled.
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+
+class ProbabilisticSampler(Sampler):
+    """Samples a fixed percentage of traces. This is the same as passing
+    sample_rate to zipkin_span.
+    """
+
+    def __init__(self, sample_rate):
+        """
+        :param sample_rate: percentage of traces to sample, 0.0 - 100.0.
+        :type sample_rate: float
+        """
+        _validate_sample_rate(sample_rate)
+        self.sample_rate = sample_rate
+
+    def should_sample(self, trace_id, span_name=None):
+        return _should_sample(self.sample_rate)
+
+
+class TraceIdSampler(Sampler):
+    """Samples a fixed percentage of traces, deciding from the trace id.
+
+    The decision doesn't involve any random number, so all the services
+    using a TraceIdSampler with the same sample_rate make the same decision
+    for the same trace, even if they don't propagate it. Trace ids that
+    aren't valid hex, i.e. from malformed headers, are sampled at random
+    instead.
+    """
+
+    def __init__(self, sample_rate):
+        """
+        :param sample_rate: percentage of traces to sample, 0.0 - 100.0.
+        :type sample_rate: float
+        """
+        _validate_sample_rate(sample_rate)
+        self.sample_rate = sample_rate
+
+    def should_sample(self, trace_id, span_name=None):
+        return _should_sample_trace_id(trace_id, self.sample_rate)
+
+
+class RateLimitingSampler(Sampler):
+    """Samples at most `traces_per_second` traces per second.
+
+    This is a token bucket: it can sample up to `max_burst` traces at once
+    and then refills at `traces_per_second`. The limit is per sampler
+    instance, so usually per process.
+    """
+
+    def __init__(self, traces_per_second, max_burst=None):
+        """
+        :param traces_per_second: how many traces per second to sample.
+        :type traces_per_second: float
+        :param max_burst: how many traces can be sampled at once after a
+            quiet period. Defaults to traces_per_second, or 1 if that's lower.
+        :type max_burst: float
+        """
+        if traces_per_second < 0:
+            raise ZipkinError("traces_per_second must be >= 0")
+        if max_burst is None:
+            max_burst = max(traces_per_second, 1.0) if traces_per_second else 0.0
+
+        self.traces_per_second = float(traces_per_second)
+        self.max_burst = float(max_burst)
+
+        self._tokens = self.max_burst
+        self._last_refill = _clock()
+        self._lock = threading.Lock()
+
+    def should_sample(self, trace_id, span_name=None):
+        with self._lock:
+            now = _clock()
+            self._tokens = min(
+                self.max_burst,
+                self._tokens + (now - self._last_refill) * self.traces_per_second,
+            )
+            self._last_refill = now
+
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class SpanNameSampler(Sampler):
+    """Uses a different sampler depending on the name of the root span.
+
+    i.e. to sample health checks less than the rest of the endpoints.
+    """
+
+    def __init__(self, samplers, default=0.0):
+        """
+        :param samplers: span name -> Sampler or sample rate (0.0 - 100.0).
+        :type samplers: dict
+        :param default: Sampler or sample rate for the other span names.
+        :type default: Sampler or float
+        """
+        self.samplers = {
+            name: self._to_sampler(sampler) for name, sampler in samplers.items()
+        }
+        self.default = self._to_sampler(default)
+
+    @staticmethod
+    def _to_sampler(sampler):
+        if isinstance(sampler, Sampler):
+            return sampler
+        return ProbabilisticSampler(sampler)
+
+    def should_sample(self, trace_id, span_name=None):
+        sampler = self.samplers.get(span_name, self.default)
+        return sampler.should_sample(trace_id, span_name)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""Disk-backed spill queue for payloads that couldn't be sent.
+
+`SpillingTransport` wraps another transport. When the wrapped transport
+fails, the payload is appended to a memory-mapped ring buffer on local disk
+instead of being lost, and a background thread replays the spilled payloads
+once the collector is reachable again. The ring buffer has a fixed size:
+when it's full the oldest payloads are evicted, so a long outage never
+fills up the disk.
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+
+import six
+
+from py_zipkin.encoding import Encoding
+from py_zipkin.transport import _forward_payload
+from py_zipkin.transport import BaseTransportHandler
+from py_zipkin.transport import Payload
+
+log = logging.getLogger("py_zipkin.spill")
+
+_MAGIC = b"PZSQ"
+# Version 2 prefixes the payloads spilled by SpillingTransport with their
+# encoding.
+_VERSION = 2
+# magic, version, head offset, tail offset, number of records
+_HEADER = struct.Struct("!4sIQQQ")
+_RECORD_HEADER = struct.Struct("!I")
+# Written in place of a record header when the next record didn't fit
+# before the end of the file and was written at the beginning.
+_WRAP = 0xFFFFFFFF
+# Encodings of the spilled payloads, indexed by their prefix byte.
+_SPILLED_ENCODINGS = [
+    None,
+    Encoding.V1_THRIFT,
+    Encoding.V1_JSON,
+    Encoding.V2_JSON,
+    Encoding.V2_PROTO3,
+]
+
+
+class SpillQueue(object):
+    """Bounded FIFO of payloads stored in a memory-mapped ring buffer.
+
+    The queue is persisted in the file, so payloads spilled before a restart
+    are replayed by the next process opening it. A file must only be used
+    by one process at a time.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        """
+        :param path: path of the spill file. It's created if needed.
+        :type path: str
+        :param max_bytes: size of the spill file.
+        :type max_bytes: int
+        """
+        self.path = path
+        self.capacity = max_bytes - _HEADER.size
+        self.evicted = 0
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != max_bytes:
+                os.ftruncate(fd, max_bytes)
+            self._mmap = mmap.mmap(fd, max_bytes)
+        finally:
+            os.close(fd)
+
+        magic, version, head, tail, count = _HEADER.unpack_from(self._mmap, 0)
+        if (
+            magic == _MAGIC
+            and version == _VERSION
+            and head <= self.capacity
+            and tail <= self.capacity
+        ):
+            self._head, self._tail, self._count = head, tail, count
+        else:
+            # New file, or one written with different settings.
+            self._head = self._tail = self._count = 0
+            self._write_header()
+
+    def __len__(self):
+        return self._count
+
+    def _write_header(self):
+        _HEADER.pack_into(
+            self._mmap, 0, _MAGIC, _VERSION, self._head, self._tail, self._count,
+        )
+
+    def _write_record(self, payload):
+        offset = _HEADER.size + self._tail
+        _RECORD_HEADER.pack_into(self._mmap, offset, len(payload))
+        offset += _RECORD_HEADER.size
+        end = offset + len(payload)
+        self._mmap[offset:end] = payload
+        self._tail += _RECORD_HEADER.size + len(payload)
+        self._count += 1
+        self._write_header()
+
+    def _head_record(self):
+        """Returns the offset and size of the oldest payload."""
+        if self.capacity - self._head < _RECORD_HEADER.size or (
+            _RECORD_HEADER.unpack_from(self._mmap, _HEADER.size + self._head)[0]
+            == _WRAP
+        ):
+            self._head = 0
+        offset = _HEADER.size + self._head
+        (size,) = _RECORD_HEADER.unpack_from(self._mmap, offset)
+        return offset + _RECORD_HEADER.size, size
+
+    def _remove_head(self):
+        offset, size = self._head_record()
+        self._head = offset + size - _HEADER.size
+        self._count -= 1
+        if self._count == 0:
+            self._head = self._tail = 0
+        self._write_header()
+
+    def append(self, payload):
+        """Adds a payload, evicting the oldest ones if there's not enough room.
+
+        :param payload: encoded payload.
+        :type payload: bytes
+        :returns: False if the payload is too big to ever fit in the queue.
+        :rtype: bool
+        """
+        size = _RECORD_HEADER.size + len(payload)
+        with self._lock:
+            if size > self.capacity:
+                self.dropped += 1
+                return False
+
+            while True:
+                if self._count == 0 or self._tail > self._head:
+                    if size <= self.capacity - self._tail:
+                        self._write_record(payload)
+                        return True
+                    if size <= self._head:
+                        if self.capacity - self._tail >= _RECORD_HEADER.size:
+                            _RECORD_HEADER.pack_into(
+                                self._mmap, _HEADER.size + self._tail, _WRAP,
+                            )
+                        self._tail = 0
+                        self._write_record(payload)
+                        return True
+                elif size <= self._head - self._tail:
+                    self._write_record(payload)
+                    return True
+
+                self._remove_head()
+                self.evicted += 1
+
+    def peek(self):
+        """Returns the oldest payload, without removing it.
+
+        :returns: the oldest payload, or None if the queue is empty.
+        :rtype: bytes
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            offset, size = self._head_record()
+            end = offset + size
+            return self._mmap[offset:end]
+
+    def pop(self):
+        """Removes the oldest payload."""
+        with self._lock:
+            if self._count:
+                self._remove_head()
+
+    def close(self):
+        with self._lock:
+            self._mmap.flush()
+            self._mmap.close()
+
+
+class SpillingTransport(BaseTransportHandler):
+    """Spills payloads to disk when the wrapped transport fails.
+
+    As long as there are spilled payloads new ones are spilled too, without
+    trying the wrapped transport, so requests don't pay a connection timeout
+    each while the collector is down. A background thread retries the oldest
+    spilled payload every `replay_interval` seconds and, once it succeeds,
+    sends the rest of the backlog in order.
+
+    .. code-block:: python
+
+        transport = SpillingTransport(
+            SimpleHTTPTransport('localhost', 9411),
+            '/var/spool/zipkin/{}.spill'.format(os.getpid()),
+        )
+    """
+
+    def __init__(
+        self,
+        transport_handler,
+        spill_path,
+        max_spill_bytes=64 * 1024 * 1024,
+        replay_interval=5.0,
+    ):
+        """
+        :param transport_handler: transport used to send the payloads.
+        :type transport_handler: BaseTransportHandler
+        :param spill_path: path of the spill file. Every process needs its
+            own spill file.
+        :type spill_path: str
+        :param max_spill_bytes: size of the spill file. The oldest payloads
+            are evicted when it's full.
+        :type max_spill_bytes: int
+        :param replay_interval: seconds between attempts to replay the
+            spilled payloads while the collector is unavailable.
+        :type replay_interval: float
+        """
+        super(SpillingTransport, self).__init__()
+        self.transport_handler = transport_handler
+        self.replay_interval = replay_interval
+        self.spill_queue = SpillQueue(spill_path, max_spill_bytes)
+
+        self.payloads_spilled = 0
+        self.payloads_replayed = 0
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if len(self.spill_queue):
+            # Payloads spilled by a previous process.
+            self._ensure_replaying()
+
+    def get_max_payload_bytes(self):
+        if isinstance(self.transport_handler, BaseTransportHandler):
+            return self.transport_handler.get_max_payload_bytes()
+        return None
+
+    def send(self, payload):
+        self._send(payload)
+
+    def send_payload(self, payload):
+        self._send(payload)
+
+    def _send(self, payload):
+        if self._stopped.is_set():
+            # The spill file has been closed.
+            _forward_payload(self.transport_handler, payload)
+            return
+
+        if not len(self.spill_queue):
+            try:
+                _forward_payload(self.transport_handler, payload)
+                return
+            except Exception as e:
+                log.warning(
+                    "Error emitting zipkin trace, spilling it to {}. {}".format(
+                        self.spill_queue.path, repr(e),
+                    )
+                )
+
+        if self.spill_queue.append(_encode_record(payload)):
+            with self._lock:
+                self.payloads_spilled += 1
+        self._ensure_replaying()
+
+    def _ensure_replaying(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stopped.is_set():
+                thread = threading.Thread(
+                    target=self._replay, name="py_zipkin.SpillingTransport",
+                )
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+
+    def _replay(self):
+        while not self._stopped.wait(self.replay_interval):
+            while not self._stopped.is_set():
+                record = self.spill_queue.peek()
+                if record is None:
+                    break
+                try:
+                    _forward_payload(self.transport_handler, _decode_record(record))
+                except Exception as e:
+                    log.debug("Collector still unavailable. {}".format(repr(e)))
+                    break
+                self.spill_queue.pop()
+                with self._lock:
+                    self.payloads_replayed += 1
+
+    def close(self, timeout=None):
+        """Stops replaying and closes the spill file. Payloads that haven't
+        been replayed yet are kept in the file for the next process."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.spill_queue.close()
+
+
+def _encode_record(payload):
+    """Prefixes the encoded spans with their encoding, if known."""
+    encoding = None
+    if isinstance(payload, Payload):
+        payload, encoding = payload.data, payload.encoding
+    if not isinstance(payload, bytes):
+        payload = payload.encode("utf-8")
+    return six.int2byte(_SPILLED_ENCODINGS.index(encoding)) + payload
+
+
+def _decode_record(record):
+    """Returns the spilled payload, as a `Payload` if its encoding is known."""
+    index = six.indexbytes(record, 0)
+    data = record[1:]
+    if index < len(_SPILLED_ENCODINGS) and _SPILLED_ENCODINGS[index] is not None:
+        return Payload(data, _SPILLED_ENCODINGS[index], None)
+    return data
@@ -67,6 +67,7 @@ class Tracer(object):
         self._is_transport_configured = False
         self._span_storage = SpanStorage()
         self._context_stack = Stack()
+        self._span_added_callback = None
 
     def get_zipkin_attrs(self):
         return self._context_stack.get()
@@ -79,6 +80,21 @@ class Tracer(object):
 
     def add_span(self, span):
         self._span_storage.append(span)
+        if self._span_added_callback is not None:
+            self._span_added_callback()
+
+    def set_span_added_callback(self, callback):
+        """Sets a function to be called every time a span is added.
+
+        This is used by root spans to flush the span storage before they end.
+
+        :param callback: function without arguments, or None to unset it.
+        :type callback: callable
+        """
+        self._span_added_callback = callback
+
+    def get_span_added_callback(self):
+        return self._span_added_callback
 
     def get_spans(self):
         return self._span_storage
@@ -107,6 +123,7 @@ class Tracer(object):
         the_copy._is_transport_configured = self._is_transport_configured
         the_copy._span_storage = self._span_storage
         the_copy._context_stack = self._context_stack.copy()
+        the_copy._span_added_callback = self._span_added_callback
         return the_copy
 
 
@@ -14,6 +14,8 @@ from py_zipkin.util import unsigned_hex_to_signed_int
 
 thrift_filepath = os.path.join(os.path.dirname(__file__), "zipkinCore.thrift")
 zipkin_core = thriftpy2.load(thrift_filepath, module_name="zipkinCore_thrift")
+scribe_filepath = os.path.join(os.path.dirname(__file__), "scribe.thrift")
+scribe = thriftpy2.load(scribe_filepath, module_name="scribe_thrift")
 
 SERVER_ADDR_VAL = "\x01"
 LIST_HEADER_SIZE = 5  # size in bytes of the encoded list header
@@ -180,6 +182,18 @@ def span_to_bytes(thrift_span):
     return bytes(transport.getvalue())
 
 
+def encode_list_header(size):
+    """
+    Returns the TBinaryProtocol header of a list of Thrift objects.
+
+    :param size: number of objects in the list.
+    :returns: binary object representing the list header.
+    """
+    transport = TMemoryBuffer()
+    write_list_begin(transport, TType.STRUCT, size)
+    return bytes(transport.getvalue())
+
+
 def encode_bytes_list(binary_thrift_obj_list):  # pragma: no cover
     """
     Returns a TBinaryProtocol encoded list of Thrift objects.
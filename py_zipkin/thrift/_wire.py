@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""Pure-python writer for zipkinCore thrift spans.
+
+This writes the TBinaryProtocol encoding of the structs defined in
+zipkinCore.thrift directly, without building thriftpy2 objects first. The
+output is the same as `span_to_bytes(create_span(...))`.
+"""
+import socket
+import struct
+from collections import OrderedDict
+
+import six
+
+from py_zipkin.encoding._types import Kind
+
+# TType values
+_BOOL = 2
+_I16 = 6
+_I32 = 8
+_I64 = 10
+_STRING = 11
+_STRUCT = 12
+_LIST = 15
+
+# AnnotationType values
+_ANNOTATION_TYPE_BOOL = 0
+_ANNOTATION_TYPE_STRING = 6
+
+_STOP = b"\x00"
+
+_field_header = struct.Struct("!bh").pack
+_i32 = struct.Struct("!i").pack
+_i64 = struct.Struct("!q").pack
+_u16 = struct.Struct("!H").pack
+_u64 = struct.Struct("!Q").pack
+_list_header = struct.Struct("!bi").pack
+
+# Encoded Endpoint structs. Most spans share the same endpoints.
+_ENDPOINT_CACHE = {}
+_ENDPOINT_CACHE_MAX_SIZE = 1024
+# Encoded annotation values and tag keys, which are mostly the same across
+# spans.
+_FRAGMENT_CACHE = {}
+_FRAGMENT_CACHE_MAX_SIZE = 4096
+
+# Endpoint
+_ENDPOINT_IPV4 = _field_header(_I32, 1)
+_ENDPOINT_PORT = _field_header(_I16, 2)
+_ENDPOINT_SERVICE_NAME = _field_header(_STRING, 3)
+_ENDPOINT_IPV6 = _field_header(_STRING, 4)
+_NO_IPV4 = _i32(0)
+
+# Annotation
+_ANNOTATION_TIMESTAMP = _field_header(_I64, 1)
+_ANNOTATION_VALUE = _field_header(_STRING, 2)
+_ANNOTATION_HOST = _field_header(_STRUCT, 3)
+
+# BinaryAnnotation
+_BINARY_ANNOTATION_KEY = _field_header(_STRING, 1)
+_BINARY_ANNOTATION_VALUE = _field_header(_STRING, 2)
+_BINARY_ANNOTATION_TYPE = _field_header(_I32, 3)
+_BINARY_ANNOTATION_HOST = _field_header(_STRUCT, 4)
+_STRING_TYPE = _BINARY_ANNOTATION_TYPE + _i32(_ANNOTATION_TYPE_STRING)
+_BOOL_TYPE = _BINARY_ANNOTATION_TYPE + _i32(_ANNOTATION_TYPE_BOOL)
+
+# Span
+_SPAN_TRACE_ID = _field_header(_I64, 1)
+_SPAN_NAME = _field_header(_STRING, 3)
+_SPAN_ID = _field_header(_I64, 4)
+_SPAN_PARENT_ID = _field_header(_I64, 5)
+_SPAN_ANNOTATIONS = _field_header(_LIST, 6)
+_SPAN_BINARY_ANNOTATIONS = _field_header(_LIST, 8)
+# debug is optional but has a default value, so it's always written.
+_SPAN_DEBUG_FALSE = _field_header(_BOOL, 9) + b"\x00"
+_SPAN_TIMESTAMP = _field_header(_I64, 10)
+_SPAN_DURATION = _field_header(_I64, 11)
+_SPAN_TRACE_ID_HIGH = _field_header(_I64, 12)
+
+
+def _string(value):
+    """Encodes a thrift string or binary value, with its length prefix."""
+    if isinstance(value, six.text_type):
+        value = value.encode("utf-8")
+    return _i32(len(value)) + value
+
+
+def _remote_endpoint_annotation(key):
+    """Returns the BinaryAnnotation recording the remote endpoint, up to its
+    host."""
+    return (
+        _BINARY_ANNOTATION_KEY
+        + _string(key)
+        + _BINARY_ANNOTATION_VALUE
+        + _string(b"\x01")
+        + _BOOL_TYPE
+        + _BINARY_ANNOTATION_HOST
+    )
+
+
+_REMOTE_ENDPOINT_ANNOTATIONS = {
+    Kind.CLIENT: _remote_endpoint_annotation(b"sa"),
+    Kind.SERVER: _remote_endpoint_annotation(b"ca"),
+}
+
+
+def _cache_fragment(key, fragment):
+    if len(_FRAGMENT_CACHE) >= _FRAGMENT_CACHE_MAX_SIZE:
+        _FRAGMENT_CACHE.clear()
+    _FRAGMENT_CACHE[key] = fragment
+
+
+def encode_endpoint(endpoint):
+    """Encodes an Endpoint struct.
+
+    :param endpoint: endpoint to encode.
+    :type endpoint: py_zipkin.encoding.Endpoint
+    :return: encoded struct.
+    :rtype: bytes
+    """
+    encoded = _ENDPOINT_CACHE.get(endpoint)
+    if encoded is not None:
+        return encoded
+
+    encoded = bytearray(_ENDPOINT_IPV4)
+    if endpoint.ipv4:
+        encoded += socket.inet_pton(socket.AF_INET, endpoint.ipv4)
+    else:
+        encoded += _NO_IPV4
+    # Thrift has no unsigned types, ports above 32767 are sent as negative
+    # i16 which have the same binary representation.
+    encoded += _ENDPOINT_PORT + _u16(endpoint.port)
+    if endpoint.service_name is not None:
+        encoded += _ENDPOINT_SERVICE_NAME + _string(endpoint.service_name)
+    if endpoint.ipv6:
+        encoded += _ENDPOINT_IPV6 + _string(
+            socket.inet_pton(socket.AF_INET6, endpoint.ipv6),
+        )
+    encoded += _STOP
+    encoded = bytes(encoded)
+
+    if len(_ENDPOINT_CACHE) >= _ENDPOINT_CACHE_MAX_SIZE:
+        _ENDPOINT_CACHE.clear()
+    _ENDPOINT_CACHE[endpoint] = encoded
+    return encoded
+
+
+def _v1_annotations(v2_span):
+    """Returns the V1 annotations of the span, in the same order as
+    `Span.build_v1_span`."""
+    start = v2_span.timestamp
+    end = start + v2_span.duration
+    kind = v2_span.kind
+    if kind == Kind.CLIENT:
+        annotations = [("cs", start), ("cr", end)]
+    elif kind == Kind.SERVER:
+        annotations = [("sr", start), ("ss", end)]
+    elif kind == Kind.LOCAL:
+        annotations = [("cs", start), ("sr", start), ("ss", end), ("cr", end)]
+    else:
+        raise KeyError(kind)
+
+    if v2_span.annotations:
+        # User annotations override the generated ones.
+        annotations = OrderedDict(annotations)
+        annotations.update(v2_span.annotations)
+        return list(annotations.items())
+    return annotations
+
+
+def encode_span(v2_span):
+    """Encodes a V2 span as a V1 thrift Span struct.
+
+    :param v2_span: span to encode.
+    :type v2_span: py_zipkin.encoding.Span
+    :return: encoded struct.
+    :rtype: bytes
+    """
+    host = encode_endpoint(v2_span.local_endpoint)
+
+    trace_id = v2_span.trace_id
+    trace_id_high = None
+    if len(trace_id) > 16:
+        trace_id, trace_id_high = trace_id[16:], trace_id[:16]
+
+    out = bytearray(_SPAN_TRACE_ID)
+    out += _u64(int(trace_id, 16))
+    if v2_span.name is not None:
+        out += _SPAN_NAME + _string(v2_span.name)
+    out += _SPAN_ID + _u64(int(v2_span.span_id, 16))
+    if v2_span.parent_id:
+        out += _SPAN_PARENT_ID + _u64(int(v2_span.parent_id, 16))
+
+    annotations = _v1_annotations(v2_span)
+    out += _SPAN_ANNOTATIONS + _list_header(_STRUCT, len(annotations))
+    for value, timestamp in annotations:
+        out += _ANNOTATION_TIMESTAMP + _i64(int(timestamp * 1000000))
+        fragment = _FRAGMENT_CACHE.get((value, host))
+        if fragment is None:
+            fragment = _ANNOTATION_VALUE + _string(value) + _ANNOTATION_HOST + host
+            _cache_fragment((value, host), fragment)
+        out += fragment + _STOP
+
+    tags = v2_span.tags
+    remote_endpoint_annotation = None
+    if v2_span.remote_endpoint:
+        remote_endpoint_annotation = _REMOTE_ENDPOINT_ANNOTATIONS.get(v2_span.kind)
+    count = len(tags) + (remote_endpoint_annotation is not None)
+    out += _SPAN_BINARY_ANNOTATIONS + _list_header(_STRUCT, count)
+    if tags:
+        tag_host = _STRING_TYPE + _BINARY_ANNOTATION_HOST + host + _STOP
+        for key, value in tags.items():
+            fragment = _FRAGMENT_CACHE.get(key)
+            if fragment is None:
+                fragment = _BINARY_ANNOTATION_KEY + _string(key)
+                fragment += _BINARY_ANNOTATION_VALUE
+                _cache_fragment(key, fragment)
+            out += fragment + _string(str(value)) + tag_host
+    if remote_endpoint_annotation is not None:
+        out += remote_endpoint_annotation
+        out += encode_endpoint(v2_span.remote_endpoint) + _STOP
+
+    out += _SPAN_DEBUG_FALSE
+    if not v2_span.shared:
+        if v2_span.timestamp:
+            out += _SPAN_TIMESTAMP + _i64(int(v2_span.timestamp * 1000000))
+        if v2_span.duration:
+            out += _SPAN_DURATION + _i64(int(v2_span.duration * 1000000))
+    if trace_id_high:
+        out += _SPAN_TRACE_ID_HIGH + _u64(int(trace_id_high, 16))
+    out += _STOP
+    return bytes(out)
@@ -0,0 +1,16 @@
+# Scribe service definition, as accepted by the zipkin scribe collector.
+# Each LogEntry message is a base64 encoded thrift span or list of spans.
+
+enum ResultCode {
+  OK,
+  TRY_LATER
+}
+
+struct LogEntry {
+  1: string category,
+  2: string message
+}
+
+service scribe {
+  ResultCode Log(1: list<LogEntry> messages);
+}
@@ -1,12 +1,205 @@
 # -*- coding: utf-8 -*-
+import base64
+import collections
+import errno
+import logging
+import os
+import random
+import select
+import socket
+import struct
+import threading
+import time
+import zlib
+
+import six
+from six.moves import http_client
+from six.moves import queue
 from six.moves.urllib.request import Request
 from six.moves.urllib.request import urlopen
+from thriftpy2.protocol import TBinaryProtocol
+from thriftpy2.thrift import TApplicationException
+from thriftpy2.thrift import TMessageType
+from thriftpy2.transport import TMemoryBuffer
 
 from py_zipkin.encoding import detect_span_version_and_encoding
 from py_zipkin.encoding import Encoding
+from py_zipkin.exception import CircuitOpenError
+from py_zipkin.exception import ZipkinError
+from py_zipkin.thrift import scribe
+
+log = logging.getLogger(__name__)
+
+# Errors meaning that the collector closed an idle connection.
+_STALE_CONNECTION_ERRNOS = (errno.ECONNRESET, errno.EPIPE)
+
+# Backoffs and breaker timeouts shouldn't be affected by changes to the
+# system clock.
+_clock = getattr(time, "monotonic", time.time)
+
+# zlib wbits value to write gzip headers.
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+# Payloads sent to the local agent and Scribe messages are prefixed by their
+# length.
+_FRAME_HEADER = struct.Struct("!I")
+# Max number of bytes read at once from a socket.
+_RECV_BYTES = 65536
+
+# Payloads don't all compress equally well, so we leave some headroom when
+# estimating how many uncompressed bytes fit in the compressed budget.
+_COMPRESSION_RATIO_MARGIN = 0.8
+
+
+class RetryPolicy(object):
+    """Retries failed sends with exponential backoff.
+
+    The delay before the n-th retry is a random value between 0 and
+    `initial_backoff * 2 ** n`, capped at `max_backoff`, so that many
+    processes retrying at the same time don't all hit the collector at once.
+
+    Retries sleep in the thread calling the transport, so they're best used
+    together with `AsyncReporter`.
+    """
+
+    def __init__(self, max_retries=2, initial_backoff=0.05, max_backoff=1.0):
+        """
+        :param max_retries: max number of retries after the first attempt.
+        :type max_retries: int
+        :param initial_backoff: max delay in seconds before the first retry.
+        :type initial_backoff: float
+        :param max_backoff: max delay in seconds before any retry.
+        :type max_backoff: float
+        """
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    def get_backoff(self, retry):
+        """Returns how long to wait before a retry.
+
+        :param retry: number of the retry, starting from 0.
+        :type retry: int
+        :returns: delay in seconds.
+        :rtype: float
+        """
+        return random.uniform(
+            0, min(self.max_backoff, self.initial_backoff * 2 ** retry),
+        )
+
+
+class CircuitBreaker(object):
+    """Stops sending to a collector that keeps failing.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    sends fail immediately with `CircuitOpenError`, without waiting for a
+    connection timeout. After `reset_timeout` seconds a single probe is let
+    through: if it succeeds the breaker closes, otherwise it opens again.
+
+    A breaker can be shared by multiple transports sending to the same
+    collector.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        :param failure_threshold: number of consecutive failures that open
+            the breaker.
+        :type failure_threshold: int
+        :param reset_timeout: seconds to wait before probing the collector
+            once the breaker is open.
+        :type reset_timeout: float
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Returns whether a payload can be sent now.
+
+        When the reset timeout has expired, this lets a single caller
+        through to probe the collector.
+
+        :rtype: bool
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (
+                self.state == self.OPEN
+                and _clock() - self._opened_at >= self.reset_timeout
+            ):
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (
+                self.state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self._opened_at = _clock()
+
+
+class Payload(object):
+    """An encoded list of spans, along with what's known about it.
+
+    `ZipkinBatchSender` passes these to transports that subclass
+    `BaseTransportHandler`, so that they don't need to decode the payload to
+    find out its encoding.
+    """
+
+    __slots__ = ("data", "encoding", "span_count", "_size")
+
+    def __init__(self, data, encoding, span_count):
+        """
+        :param data: encoded list of spans.
+        :type data: bytes or str
+        :param encoding: encoding of `data`, or None if unknown.
+        :type encoding: Encoding
+        :param span_count: number of spans in the list, or None if unknown.
+        :type span_count: int
+        """
+        self.data = data
+        self.encoding = encoding
+        self.span_count = span_count
+        self._size = None
+
+    @property
+    def size(self):
+        """Size of the payload in bytes, once encoded as utf-8 if needed.
+
+        :rtype: int
+        """
+        if self._size is None:
+            if isinstance(self.data, six.text_type):
+                self._size = len(self.data.encode("utf-8"))
+            else:
+                self._size = len(self.data)
+        return self._size
 
 
 class BaseTransportHandler(object):
+
+    # Optional RetryPolicy and CircuitBreaker. These are class attributes so
+    # that they're also defined for subclasses that don't call __init__.
+    retry_policy = None
+    circuit_breaker = None
+
     def get_max_payload_bytes(self):  # pragma: no cover
         """Returns the maximum payload size for this transport.
 
@@ -29,6 +222,33 @@ class BaseTransportHandler(object):
         """
         raise NotImplementedError("send is not implemented")
 
+    def send_payload(self, payload):
+        """Sends a `Payload` over the transport.
+
+        By default this calls `send` with the encoded spans. Override it to
+        use the payload metadata, like its encoding, instead of detecting it.
+
+        :argument payload: encoded list of spans and its metadata.
+        :type payload: Payload
+        """
+        self.send(payload.data)
+
+    def set_retry_policy(self, retry_policy):
+        """Retries failed sends according to `retry_policy`.
+
+        :param retry_policy: retry policy, or None to disable retries.
+        :type retry_policy: RetryPolicy
+        """
+        self.retry_policy = retry_policy
+
+    def set_circuit_breaker(self, circuit_breaker):
+        """Stops sending while `circuit_breaker` is open.
+
+        :param circuit_breaker: circuit breaker, or None to disable it.
+        :type circuit_breaker: CircuitBreaker
+        """
+        self.circuit_breaker = circuit_breaker
+
     def __call__(self, payload):
         """Internal wrapper around `send`. Do not override.
 
@@ -37,12 +257,66 @@ class BaseTransportHandler(object):
         override and what's internally called by py_zipkin will allow us to add
         extra logic here in the future without having the users update their
         code every time.
+
+        This is where the optional retry policy and circuit breaker are
+        applied.
+
+        :argument payload: encoded list of spans, or a `Payload`.
         """
-        self.send(payload)
+        send = self.send_payload if isinstance(payload, Payload) else self.send
+
+        breaker = self.circuit_breaker
+        if breaker is not None and not breaker.allow_request():
+            raise CircuitOpenError("Circuit breaker is open, payload not sent")
+
+        retry = 0
+        while True:
+            try:
+                send(payload)
+            except Exception:
+                if breaker is not None:
+                    breaker.record_failure()
+                if (
+                    self.retry_policy is None
+                    or retry >= self.retry_policy.max_retries
+                    or (breaker is not None and not breaker.allow_request())
+                ):
+                    raise
+                time.sleep(self.retry_policy.get_backoff(retry))
+                retry += 1
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return
+
+
+def _forward_payload(transport_handler, payload):
+    """Sends a payload through a wrapped transport.
+
+    Wrapping transports use this so that the `Payload` metadata reaches the
+    wrapped transport. Plain function transports get the encoded data.
+
+    :param transport_handler: wrapped transport.
+    :type transport_handler: BaseTransportHandler or function
+    :param payload: encoded list of spans, or a `Payload`.
+    """
+    if isinstance(payload, Payload) and not isinstance(
+        transport_handler, BaseTransportHandler,
+    ):
+        payload = payload.data
+    transport_handler(payload)
 
 
 class SimpleHTTPTransport(BaseTransportHandler):
-    def __init__(self, address, port):
+    def __init__(
+        self,
+        address,
+        port,
+        compress=False,
+        compression_level=6,
+        compression_min_bytes=1024,
+        max_compressed_payload_bytes=None,
+    ):
         """A simple HTTP transport for zipkin.
 
         This is not production ready (not async, no retries) but
@@ -63,23 +337,93 @@ class SimpleHTTPTransport(BaseTransportHandler):
         :type address: str
         :param port: zipkin server port.
         :type port: int
+        :param compress: whether to gzip payloads.
+        :type compress: bool
+        :param compression_level: gzip compression level, 1 - 9.
+        :type compression_level: int
+        :param compression_min_bytes: payloads smaller than this are sent
+            uncompressed, since compressing them isn't worth it.
+        :type compression_min_bytes: int
+        :param max_compressed_payload_bytes: optional max size of the payloads
+            sent over the network. When compress is set, the max size of the
+            uncompressed batches is estimated from the compression ratio of
+            the previous payloads.
+        :type max_compressed_payload_bytes: int
         """
         super(SimpleHTTPTransport, self).__init__()
         self.address = address
         self.port = port
+        self.compress = compress
+        self.compression_level = compression_level
+        self.compression_min_bytes = compression_min_bytes
+        self.max_compressed_payload_bytes = max_compressed_payload_bytes
+
+        self._uncompressed_bytes = 0
+        self._compressed_bytes = 0
+
+    @property
+    def compression_ratio(self):
+        """Average uncompressed / compressed size of the payloads sent so far.
+
+        :rtype: float
+        """
+        if not self._compressed_bytes:
+            return 1.0
+        return float(self._uncompressed_bytes) / self._compressed_bytes
 
     def get_max_payload_bytes(self):
-        return None
+        if self.max_compressed_payload_bytes is None:
+            return None
+        if not self.compress or not self._compressed_bytes:
+            return self.max_compressed_payload_bytes
+        return int(
+            self.max_compressed_payload_bytes
+            * self.compression_ratio
+            * _COMPRESSION_RATIO_MARGIN
+        )
+
+    def _gzip(self, payload):
+        compressor = zlib.compressobj(
+            self.compression_level, zlib.DEFLATED, _GZIP_WBITS,
+        )
+        return compressor.compress(payload) + compressor.flush()
+
+    def _prepare_request(self, payload, encoding=None):
+        """Returns the api path, body and headers to send the payload.
+
+        :param payload: encoded list of spans.
+        :param encoding: encoding of the payload. Detected if None.
+        :type encoding: Encoding
+        :returns: (path, body, headers)
+        :rtype: (str, bytes, dict)
+        """
+        path, content_type = self._get_path_content_type(payload, encoding)
+        headers = {"Content-Type": content_type}
+
+        if isinstance(payload, six.text_type):
+            # JSON encoders return text, but we need to send bytes.
+            payload = payload.encode("utf-8")
+
+        if self.compress and len(payload) >= self.compression_min_bytes:
+            compressed = self._gzip(payload)
+            self._uncompressed_bytes += len(payload)
+            self._compressed_bytes += len(compressed)
+            payload = compressed
+            headers["Content-Encoding"] = "gzip"
 
-    def _get_path_content_type(self, payload):
+        return path, payload, headers
+
+    def _get_path_content_type(self, payload, encoding=None):
         """Choose the right api path and content type depending on the encoding.
 
         This is not something you'd need to do generally when writing your own
         transport since in that case you'd know which encoding you're using.
         Since this is a generic transport, we need to make it compatible with
-        any encoding instead.
+        any encoding instead. The encoding is only detected from the payload
+        when the caller doesn't know it.
         """
-        encoding = detect_span_version_and_encoding(payload)
+        if encoding is None:
+            encoding = detect_span_version_and_encoding(payload)
 
         if encoding == Encoding.V1_JSON:
             return "/api/v1/spans", "application/json"
@@ -91,10 +435,528 @@ class SimpleHTTPTransport(BaseTransportHandler):
             return "/api/v2/spans", "application/x-protobuf"
 
     def send(self, payload):
-        path, content_type = self._get_path_content_type(payload)
+        self._send(payload, None)
+
+    def send_payload(self, payload):
+        self._send(payload.data, payload.encoding)
+
+    def _send(self, payload, encoding):
+        path, body, headers = self._prepare_request(payload, encoding)
         url = "http://{}:{}{}".format(self.address, self.port, path)
 
-        req = Request(url, payload, {"Content-Type": content_type})
+        req = Request(url, body, headers)
         response = urlopen(req)
 
         assert response.getcode() == 202
+
+
+class PooledHTTPTransport(SimpleHTTPTransport):
+    def __init__(
+        self,
+        address,
+        port,
+        pool_size=4,
+        connect_timeout=1.0,
+        read_timeout=5.0,
+        compress=False,
+        compression_level=6,
+        compression_min_bytes=1024,
+        max_compressed_payload_bytes=None,
+    ):
+        """HTTP transport that reuses keep-alive connections to the collector.
+
+        Connections are kept in a pool shared by all the threads using this
+        transport, so there's no TCP handshake for every payload. If a pooled
+        connection has been closed by the collector, the payload is sent again
+        on a new connection. Timeouts aren't retried since the collector may
+        have received the payload already.
+
+        .. code-block:: python
+
+            transport = PooledHTTPTransport('localhost', 9411)
+
+            with zipkin_span(
+                service_name='my_service',
+                span_name='home',
+                sample_rate=100,
+                transport_handler=transport,
+                encoding=Encoding.V2_JSON,
+            ):
+                pass
+
+        :param address: zipkin server address.
+        :type address: str
+        :param port: zipkin server port.
+        :type port: int
+        :param pool_size: max number of idle connections to keep open.
+        :type pool_size: int
+        :param connect_timeout: timeout in seconds to open a connection.
+        :type connect_timeout: float
+        :param read_timeout: timeout in seconds when waiting for the collector
+            to answer.
+        :type read_timeout: float
+
+        See :class:`SimpleHTTPTransport` for the compression arguments.
+        """
+        super(PooledHTTPTransport, self).__init__(
+            address,
+            port,
+            compress=compress,
+            compression_level=compression_level,
+            compression_min_bytes=compression_min_bytes,
+            max_compressed_payload_bytes=max_compressed_payload_bytes,
+        )
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # LIFO so that the most recently used connections, which are the
+        # least likely to have been closed by the server, are used first.
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self):
+        connection = http_client.HTTPConnection(
+            self.address, self.port, timeout=self.connect_timeout,
+        )
+        connection.connect()
+        connection.sock.settimeout(self.read_timeout)
+        return connection
+
+    def _get_connection(self):
+        """Returns an idle connection from the pool, or a new one.
+
+        :returns: (connection, True if it comes from the pool)
+        """
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def _release_connection(self, connection):
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _post(self, connection, path, body, headers):
+        connection.request("POST", path, body=body, headers=headers)
+        return connection.getresponse()
+
+    def _send(self, payload, encoding):
+        path, body, headers = self._prepare_request(payload, encoding)
+
+        connection, is_pooled = self._get_connection()
+        try:
+            try:
+                response = self._post(connection, path, body, headers)
+            except (http_client.HTTPException, socket.error) as e:
+                # Only retry if the collector closed the idle connection
+                # before answering. After a timeout it may have received the
+                # spans already.
+                if not is_pooled or not _is_stale_connection_error(e):
+                    raise
+                connection.close()
+                connection = self._new_connection()
+                response = self._post(connection, path, body, headers)
+            # The response has to be read completely before reusing the
+            # connection.
+            response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release_connection(connection)
+
+        if not 200 <= response.status < 300:
+            raise ZipkinError(
+                "Zipkin collector returned {} {}".format(
+                    response.status, response.reason,
+                )
+            )
+
+    def close(self):
+        """Closes all the idle connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _is_stale_connection_error(error):
+    """Tells whether a request failed because the connection had been
+    closed by the other end before it answered.
+
+    :param error: error raised while sending the request.
+    :type error: Exception
+    :rtype: bool
+    """
+    # RemoteDisconnected is a subclass of BadStatusLine.
+    if isinstance(error, http_client.BadStatusLine):
+        return True
+    return (
+        isinstance(error, socket.error)
+        and getattr(error, "errno", None) in _STALE_CONNECTION_ERRNOS
+    )
+
+
+class UDPTransport(BaseTransportHandler):
+
+    # Max payload of an IPv4 UDP datagram.
+    MAX_PAYLOAD_BYTES = 65507
+
+    def __init__(self, address, port, max_payload_bytes=MAX_PAYLOAD_BYTES):
+        """Fire-and-forget UDP transport, i.e. to send spans to a local agent.
+
+        Each payload is sent as a single datagram. ZipkinBatchSender splits
+        batches so that they fit in max_payload_bytes; a single span that's
+        too big on its own is dropped and counted in `payloads_dropped`.
+        Sending never blocks: if the socket buffer is full the payload is
+        dropped and counted in `send_errors`.
+
+        :param address: agent address.
+        :type address: str
+        :param port: agent port.
+        :type port: int
+        :param max_payload_bytes: max size of a datagram.
+        :type max_payload_bytes: int
+        """
+        super(UDPTransport, self).__init__()
+        self.max_payload_bytes = max_payload_bytes
+        self.payloads_dropped = 0
+        self.send_errors = 0
+
+        family, sock_type, proto, _, self._address = socket.getaddrinfo(
+            address, port, 0, socket.SOCK_DGRAM,
+        )[0]
+        self._socket = socket.socket(family, sock_type, proto)
+        self._socket.setblocking(False)
+
+    def get_max_payload_bytes(self):
+        return self.max_payload_bytes
+
+    def send(self, payload):
+        if isinstance(payload, six.text_type):
+            payload = payload.encode("utf-8")
+
+        if len(payload) > self.max_payload_bytes:
+            self.payloads_dropped += 1
+            log.warning(
+                "Dropping zipkin payload of {} bytes, it doesn't fit in a UDP "
+                "datagram of {} bytes.".format(len(payload), self.max_payload_bytes)
+            )
+            return
+
+        try:
+            self._socket.sendto(payload, self._address)
+        except socket.error as e:
+            self.send_errors += 1
+            log.debug("Error sending zipkin payload over UDP: {}".format(e))
+
+    def close(self):
+        self._socket.close()
+
+
+class UnixSocketTransport(BaseTransportHandler):
+    def __init__(self, path, max_payload_bytes=None, timeout=1.0):
+        """Sends payloads to a local agent (see py_zipkin.agent) over a Unix
+        domain socket.
+
+        This is meant for prefork servers: every worker sends its spans to
+        the agent on the same host, which merges them and forwards them to
+        the collector over a single connection.
+
+        The connection is opened lazily and reopened after a fork, so it's
+        safe to create the transport before the workers are forked.
+
+        :param path: path of the agent socket.
+        :type path: str
+        :param max_payload_bytes: optional max payload size.
+        :type max_payload_bytes: int
+        :param timeout: timeout in seconds to connect and send a payload.
+        :type timeout: float
+        """
+        super(UnixSocketTransport, self).__init__()
+        self.path = path
+        self.max_payload_bytes = max_payload_bytes
+        self.timeout = timeout
+
+        self._socket = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get_max_payload_bytes(self):
+        return self.max_payload_bytes
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except Exception:
+            sock.close()
+            raise
+        self._socket = sock
+        self._pid = os.getpid()
+
+    def send(self, payload):
+        if isinstance(payload, six.text_type):
+            payload = payload.encode("utf-8")
+        frame = _FRAME_HEADER.pack(len(payload)) + payload
+
+        with self._lock:
+            if self._socket is not None and self._pid != os.getpid():
+                # We've been forked, don't share the parent's connection.
+                self._socket = None
+
+            is_new = self._socket is None
+            if is_new:
+                self._connect()
+            try:
+                self._socket.sendall(frame)
+            except socket.error:
+                self._close()
+                if is_new:
+                    raise
+                # The agent may have been restarted, try a new connection.
+                self._connect()
+                self._socket.sendall(frame)
+
+    def _close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+class ScribeTransport(BaseTransportHandler):
+    def __init__(
+        self,
+        address,
+        port,
+        category="zipkin",
+        max_pending=64,
+        timeout=5.0,
+        max_payload_bytes=None,
+    ):
+        """Sends V1_THRIFT payloads to a Scribe collector over framed Thrift.
+
+        Every payload is sent as a Scribe `Log` call on a single persistent
+        TCP connection. Calls are pipelined: `send` doesn't wait for the
+        collector to answer, it only reads the responses that already
+        arrived, unless `max_pending` calls are still waiting for one.
+        Errors reported by the collector are raised by the `send` or `flush`
+        call that reads them, so they may be about an earlier payload.
+
+        If the connection breaks, the payloads that haven't been
+        acknowledged are sent again once on a new connection, so the
+        collector may get some of them twice. The connection is reopened
+        after a fork.
+
+        .. code-block:: python
+
+            transport = ScribeTransport('localhost', 9410)
+
+            with zipkin_span(
+                service_name='my_service',
+                span_name='home',
+                sample_rate=100,
+                transport_handler=transport,
+                encoding=Encoding.V1_THRIFT,
+            ):
+                pass
+
+            # On shutdown, to wait for the pending responses.
+            transport.close()
+
+        :param address: Scribe collector address.
+        :type address: str
+        :param port: Scribe collector port.
+        :type port: int
+        :param category: Scribe category of the messages.
+        :type category: str
+        :param max_pending: max number of calls waiting for a response. 1
+            waits for every response before sending the next payload.
+        :type max_pending: int
+        :param timeout: timeout in seconds to connect and for socket
+            operations.
+        :type timeout: float
+        :param max_payload_bytes: optional max payload size.
+        :type max_payload_bytes: int
+        """
+        super(ScribeTransport, self).__init__()
+        self.address = address
+        self.port = port
+        self.category = category
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_payload_bytes = max_payload_bytes
+        self.payloads_rejected = 0
+
+        self._socket = None
+        self._pid = None
+        self._seqid = 0
+        # (seqid, frame) of the calls waiting for a response, in order.
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+
+    def get_max_payload_bytes(self):
+        return self.max_payload_bytes
+
+    def _connect(self):
+        self._socket = socket.create_connection(
+            (self.address, self.port), self.timeout,
+        )
+        self._pid = os.getpid()
+
+    def _close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self._buffer = bytearray()
+
+    def _reset(self):
+        """Closes the connection and forgets the pending calls."""
+        self._close()
+        self._pending.clear()
+
+    def _encode_call(self, payload):
+        """Returns the seqid and framed `Log` call to send the payload."""
+        self._seqid = (self._seqid + 1) & 0x7FFFFFFF
+        entry = scribe.LogEntry(
+            category=self.category, message=base64.b64encode(payload),
+        )
+        buffer = TMemoryBuffer()
+        protocol = TBinaryProtocol(buffer)
+        protocol.write_message_begin("Log", TMessageType.CALL, self._seqid)
+        scribe.scribe.Log_args(messages=[entry]).write(protocol)
+        protocol.write_message_end()
+        message = buffer.getvalue()
+        return self._seqid, _FRAME_HEADER.pack(len(message)) + message
+
+    def _next_response(self):
+        """Returns the next complete response in the read buffer, or None."""
+        if len(self._buffer) < _FRAME_HEADER.size:
+            return None
+        start = _FRAME_HEADER.size
+        (size,) = _FRAME_HEADER.unpack_from(self._buffer)
+        end = start + size
+        if len(self._buffer) < end:
+            return None
+        response = bytes(self._buffer[start:end])
+        del self._buffer[:end]
+        return response
+
+    def _handle_response(self, response):
+        protocol = TBinaryProtocol(TMemoryBuffer(response))
+        _, message_type, seqid = protocol.read_message_begin()
+        expected_seqid, _ = self._pending.popleft()
+        if seqid != expected_seqid:
+            # We can't tell which calls have been acknowledged anymore.
+            self._reset()
+            raise ZipkinError(
+                "Unexpected Scribe response {}, expected {}".format(
+                    seqid, expected_seqid,
+                )
+            )
+
+        if message_type == TMessageType.EXCEPTION:
+            error = TApplicationException()
+            error.read(protocol)
+            raise ZipkinError("Scribe collector error: {}".format(error.message))
+
+        result = scribe.scribe.Log_result()
+        result.read(protocol)
+        if result.success != scribe.ResultCode.OK:
+            self.payloads_rejected += 1
+            raise ZipkinError("Scribe collector is busy, payload dropped")
+
+    def _is_readable(self):
+        return bool(select.select([self._socket], [], [], 0)[0])
+
+    def _receive(self, max_pending):
+        """Handles the responses that already arrived, and waits for more
+        until at most `max_pending` calls are still waiting for one."""
+        while self._pending:
+            response = self._next_response()
+            if response is not None:
+                self._handle_response(response)
+            elif len(self._pending) > max_pending or self._is_readable():
+                data = self._socket.recv(_RECV_BYTES)
+                if not data:
+                    raise socket.error("Connection closed by the collector")
+                self._buffer += data
+            else:
+                return
+
+    def send(self, payload):
+        if isinstance(payload, six.text_type):
+            raise ZipkinError("ScribeTransport only supports V1_THRIFT payloads")
+
+        with self._lock:
+            if self._socket is not None and self._pid != os.getpid():
+                # We've been forked, the pending calls are the parent's.
+                self._reset()
+
+            seqid, frame = self._encode_call(payload)
+            self._pending.append((seqid, frame))
+            is_new = self._socket is None
+            try:
+                if is_new:
+                    self._connect()
+                self._socket.sendall(frame)
+                self._receive(self.max_pending - 1)
+            except socket.timeout:
+                # The collector may still process the pending calls, don't
+                # send them again.
+                self._reset()
+                raise
+            except socket.error:
+                if is_new:
+                    self._reset()
+                    raise
+                # The collector probably closed the idle connection, send
+                # what hasn't been acknowledged again on a new one.
+                self._close()
+                try:
+                    self._connect()
+                    self._socket.sendall(b"".join(f for _, f in self._pending))
+                    self._receive(self.max_pending - 1)
+                except socket.error:
+                    self._reset()
+                    raise
+
+    def send_payload(self, payload):
+        if payload.encoding not in (None, Encoding.V1_THRIFT):
+            raise ZipkinError(
+                "ScribeTransport doesn't support {} payloads".format(
+                    payload.encoding.name,
+                )
+            )
+        self.send(payload.data)
+
+    def flush(self):
+        """Waits for the responses to all the payloads sent so far."""
+        with self._lock:
+            if self._socket is None:
+                return
+            try:
+                self._receive(0)
+            except socket.error:
+                self._reset()
+                raise
+
+    def close(self):
+        """Waits for the pending responses and closes the connection."""
+        try:
+            self.flush()
+        except Exception as e:
+            log.warning("Error flushing Scribe payloads. {}".format(repr(e)))
+        finally:
+            with self._lock:
+                self._reset()
@@ -18,6 +18,9 @@ ZipkinAttrs = namedtuple(
     "ZipkinAttrs", ["trace_id", "span_id", "parent_span_id", "flags", "is_sampled"],
 )
 
+# 1% of the 64 bit trace id space, see _should_sample_trace_id.
+_TRACE_ID_RANGE_PERCENT = float(1 << 64) / 100
+
 
 def generate_random_64bit_string():
     """Returns a 64 bit UTF-8 encoded string. In the interests of simplicity,
@@ -83,12 +86,34 @@ def _should_sample(sample_rate):
     return (random.random() * 100) < sample_rate
 
 
+def _should_sample_trace_id(trace_id, sample_rate):
+    """Deterministic version of _should_sample.
+
+    Trace ids are random, so their lower 64 bits are uniformly distributed
+    and can be compared against a threshold instead of rolling a die.
+    Trace ids usually come from request headers: if they're not valid hex we
+    fall back to rolling the die, since this must never fail a request.
+    """
+    if sample_rate == 0.0:
+        return False
+    elif sample_rate == 100.0:
+        return True
+    try:
+        lower_bits = int(trace_id[-16:], 16)
+    except ValueError:
+        return _should_sample(sample_rate)
+    return lower_bits < sample_rate * _TRACE_ID_RANGE_PERCENT
+
+
 def create_attrs_for_span(
     sample_rate=100.0,
     trace_id=None,
     span_id=None,
     use_128bit_trace_id=False,
     flags=None,
+    sampler=None,
+    span_name=None,
+    sample_by_trace_id=False,
 ):
     """Creates a set of zipkin attributes for a span.
 
@@ -102,6 +127,16 @@ def create_attrs_for_span(
     :type span_id: str
     :param use_128bit_trace_id: If true, generate 128-bit trace_ids
     :type use_128bit_trace_id: bool
+    :param flags: Optional flags value.
+    :type flags: str
+    :param sampler: Optional sampler. If set, it's used instead of sample_rate.
+    :type sampler: py_zipkin.sampling.Sampler
+    :param span_name: Name of the span, passed to the sampler.
+    :type span_name: str
+    :param sample_by_trace_id: If true, the sampling decision is derived from
+        the lower 64 bits of the trace id instead of a random number, so all
+        the services using the same sample_rate agree on it.
+    :type sample_by_trace_id: bool
     """
     # Calculate if this trace is sampled based on the sample rate
     if trace_id is None:
@@ -111,7 +146,12 @@ def create_attrs_for_span(
             trace_id = generate_random_64bit_string()
     if span_id is None:
         span_id = generate_random_64bit_string()
-    is_sampled = _should_sample(sample_rate)
+    if sampler is not None:
+        is_sampled = sampler.should_sample(trace_id, span_name)
+    elif sample_by_trace_id:
+        is_sampled = _should_sample_trace_id(trace_id, sample_rate)
+    else:
+        is_sampled = _should_sample(sample_rate)
 
     return ZipkinAttrs(
         trace_id=trace_id,
@@ -6,6 +6,7 @@ import time
 from py_zipkin import Encoding
 from py_zipkin import Kind
 from py_zipkin import storage
+from py_zipkin.encoding._helpers import create_cached_endpoint
 from py_zipkin.encoding._helpers import create_endpoint
 from py_zipkin.encoding._helpers import Span
 from py_zipkin.exception import ZipkinError
@@ -101,6 +102,9 @@ class zipkin_span(object):
         timestamp=None,
         duration=None,
         encoding=Encoding.V1_THRIFT,
+        max_buffered_spans=None,
+        max_buffer_seconds=None,
+        sampler=None,
         _tracer=None,
     ):
         """Logs a zipkin span. If this is the root span, then a zipkin
@@ -172,6 +176,18 @@ class zipkin_span(object):
         :type duration: float
         :param encoding: Output encoding format, defaults to V1 thrift spans.
         :type encoding: Encoding
+        :param max_buffered_spans: Only for root spans. By default child spans
+            are kept in memory until the root span ends. If this is set, they
+            are sent as soon as this many of them have finished.
+        :type max_buffered_spans: int
+        :param max_buffer_seconds: Only for root spans. If this is set, the
+            finished child spans are sent when a child span ends at least
+            this many seconds after the previous flush.
+        :type max_buffer_seconds: float
+        :param sampler: Sampler used to decide whether to sample new traces.
+            It can be used instead of sample_rate, and like sample_rate it
+            makes this a root span.
+        :type sampler: py_zipkin.sampling.Sampler
         :param _tracer: Current tracer object. This argument is passed in
             automatically when you create a zipkin_span from a Tracer.
         :type _tracer: Tracer
@@ -196,10 +212,15 @@ class zipkin_span(object):
         self.timestamp = timestamp
         self.duration = duration
         self.encoding = encoding
+        self.max_buffered_spans = max_buffered_spans
+        self.max_buffer_seconds = max_buffer_seconds
+        self.sampler = sampler
         self._tracer = _tracer
 
         self._is_local_root_span = False
         self.logging_context = None
+        # Callback of an enclosing root span, restored when this one ends.
+        self._previous_span_added_callback = None
         self.do_pop_attrs = False
         # Spans that log a 'cs' timestamp can additionally record a
         # 'sa' binary annotation that shows where the request is going.
@@ -228,8 +249,12 @@ class zipkin_span(object):
             )
 
         # Root spans have transport_handler and at least one of
-        # zipkin_attrs_override or sample_rate.
-        if self.zipkin_attrs_override or self.sample_rate is not None:
+        # zipkin_attrs_override, sample_rate or sampler.
+        if (
+            self.zipkin_attrs_override
+            or self.sample_rate is not None
+            or self.sampler is not None
+        ):
             # transport_handler is mandatory for root spans
             if self.transport_handler is None:
                 raise ZipkinError("Root spans require a transport handler to be given")
@@ -283,6 +308,9 @@ class zipkin_span(object):
                 timestamp=self.timestamp,
                 duration=self.duration,
                 encoding=self.encoding,
+                max_buffered_spans=self.max_buffered_spans,
+                max_buffer_seconds=self.max_buffer_seconds,
+                sampler=self.sampler,
                 _tracer=self._tracer,
             ):
                 return f(*args, **kwargs)
@@ -342,7 +370,7 @@ class zipkin_span(object):
             #                        a sampled trace, so we do nothing.
             # If no zipkin_attrs were passed in, we generate new ones and start a
             # new trace.
-            if self.sample_rate is not None:
+            if self.sample_rate is not None or self.sampler is not None:
 
                 # If this trace is not sampled, we re-roll the dice.
                 if (
@@ -356,6 +384,8 @@ class zipkin_span(object):
                         create_attrs_for_span(
                             sample_rate=self.sample_rate,
                             trace_id=self.zipkin_attrs_override.trace_id,
+                            sampler=self.sampler,
+                            span_name=self.span_name,
                         ),
                     )
 
@@ -367,6 +397,8 @@ class zipkin_span(object):
                         create_attrs_for_span(
                             sample_rate=self.sample_rate,
                             use_128bit_trace_id=self.use_128bit_trace_id,
+                            sampler=self.sampler,
+                            span_name=self.span_name,
                         ),
                     )
 
@@ -443,7 +475,7 @@ class zipkin_span(object):
                     "from span {}".format(self.span_name)
                 )
                 return self
-            endpoint = create_endpoint(self.port, self.service_name, self.host)
+            endpoint = create_cached_endpoint(self.port, self.service_name, self.host)
             self.logging_context = ZipkinLoggingContext(
                 self.zipkin_attrs,
                 endpoint,
@@ -459,9 +491,20 @@ class zipkin_span(object):
                 firehose_handler=self.firehose_handler,
                 encoding=self.encoding,
                 annotations=self.annotations,
+                max_buffered_spans=self.max_buffered_spans,
+                max_buffer_seconds=self.max_buffer_seconds,
             )
             self.logging_context.start()
             self.get_tracer().set_transport_configured(configured=True)
+            self._previous_span_added_callback = (
+                self.get_tracer().get_span_added_callback()
+            )
+            if self.max_buffered_spans is not None or (
+                self.max_buffer_seconds is not None
+            ):
+                self.get_tracer().set_span_added_callback(
+                    self.logging_context.maybe_flush_spans,
+                )
 
         return self
 
@@ -502,6 +545,10 @@ class zipkin_span(object):
                 self.logging_context = None
                 self.get_tracer().clear()
                 self.get_tracer().set_transport_configured(configured=False)
+                self.get_tracer().set_span_added_callback(
+                    self._previous_span_added_callback,
+                )
+                self._previous_span_added_callback = None
                 return
 
         # If we've gotten here, that means that this span is a child span of
@@ -514,7 +561,7 @@ class zipkin_span(object):
         else:
             duration = end_timestamp - self.start_timestamp
 
-        endpoint = create_endpoint(self.port, self.service_name, self.host)
+        endpoint = create_cached_endpoint(self.port, self.service_name, self.host)
         self.get_tracer().add_span(
             Span(
                 trace_id=self.zipkin_attrs.trace_id,
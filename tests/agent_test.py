@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+import json
+import socket
+import threading
+import time
+from operator import itemgetter
+
+import mock
+import pytest
+from six.moves import queue
+
+from py_zipkin import agent
+from py_zipkin.encoding import Encoding
+from py_zipkin.encoding._encoders import get_encoder
+from py_zipkin.exception import ZipkinError
+from py_zipkin.transport import UnixSocketTransport
+from tests.test_helpers import MockTransportHandler
+from tests.transport_test import generate_single_span
+
+
+def _encode(encoding, spans):
+    encoder = get_encoder(encoding)
+    payload = encoder.encode_queue([encoder.encode_span(span) for span in spans])
+    if not isinstance(payload, bytes):
+        payload = payload.encode("utf-8")
+    return payload
+
+
+def _wait_for(condition):
+    deadline = time.time() + 5
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("encoding", list(Encoding))
+def test_merge_payloads(encoding):
+    spans = [generate_single_span() for _ in range(5)]
+    payloads = [
+        _encode(encoding, spans[:2]),
+        _encode(encoding, []),
+        _encode(encoding, spans[2:]),
+    ]
+
+    merged = agent.merge_payloads(encoding, payloads)
+
+    assert merged == _encode(encoding, spans)
+    assert len(merged) <= sum(len(p) for p in payloads)
+
+
+@pytest.fixture
+def upstream():
+    return MockTransportHandler()
+
+
+@pytest.fixture
+def socket_path(tmpdir):
+    return str(tmpdir.join("agent.sock"))
+
+
+class TestAgent(object):
+    def test_unknown_encoding(self, socket_path, upstream):
+        with pytest.raises(ZipkinError):
+            agent.Agent(socket_path, upstream, "V3_XML")
+
+    @pytest.mark.parametrize(
+        "upstream,expected",
+        [
+            (MockTransportHandler(1000), 1000),
+            (MockTransportHandler(), agent._DEFAULT_MAX_PAYLOAD_BYTES),
+            (mock.Mock(), agent._DEFAULT_MAX_PAYLOAD_BYTES),
+        ],
+    )
+    def test_max_payload_bytes_defaults_to_upstream(
+        self, socket_path, upstream, expected,
+    ):
+        zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+
+        assert zipkin_agent.max_payload_bytes == expected
+
+    def test_merges_payloads_from_many_workers(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+        zipkin_agent.start()
+        spans = [generate_single_span() for _ in range(6)]
+
+        workers = [UnixSocketTransport(socket_path) for _ in range(3)]
+        for i, worker in enumerate(workers):
+            start = 2 * i
+            worker.send(_encode(Encoding.V2_JSON, spans[start:start + 2]))
+        _wait_for(lambda: zipkin_agent.payloads_received == 3)
+        for worker in workers:
+            worker.close()
+        zipkin_agent.close()
+
+        # Connections are handled concurrently, so the order isn't fixed.
+        (batch,) = upstream.get_payloads()
+        received = json.loads(batch.decode("utf-8"))
+        expected = json.loads(_encode(Encoding.V2_JSON, spans).decode("utf-8"))
+        assert sorted(received, key=itemgetter("id")) == sorted(
+            expected, key=itemgetter("id"),
+        )
+        assert zipkin_agent.batches_sent == 1
+
+    def test_batches_respect_max_payload_bytes(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(
+            socket_path, upstream, Encoding.V1_THRIFT, max_payload_bytes=500,
+        )
+        payload = _encode(Encoding.V1_THRIFT, [generate_single_span()])
+
+        for _ in range(10):
+            zipkin_agent.add_payload(payload)
+        zipkin_agent.flush()
+        zipkin_agent._batches.put(agent._STOP)
+        zipkin_agent._run_sender()
+
+        batches = upstream.get_payloads()
+        assert len(batches) > 1
+        assert all(len(batch) <= 500 for batch in batches)
+        assert sum(agent._thrift_list_size.unpack_from(b, 1)[0] for b in batches) == 10
+
+    def test_batches_keep_the_agent_encoding(self, socket_path):
+        upstream = mock.Mock(spec=MockTransportHandler)
+        zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+
+        zipkin_agent._send(_encode(Encoding.V2_JSON, [generate_single_span()]))
+
+        (payload,), _ = upstream.call_args
+        assert payload.encoding == Encoding.V2_JSON
+
+    def test_oversized_payloads_are_sent_alone(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(
+            socket_path, upstream, Encoding.V2_PROTO3, max_payload_bytes=10,
+        )
+
+        zipkin_agent.add_payload(b"small")
+        zipkin_agent.add_payload(b"much bigger than 10 bytes")
+
+        assert zipkin_agent._batches.get_nowait() == b"small"
+        assert zipkin_agent._batches.get_nowait() == b"much bigger than 10 bytes"
+        assert zipkin_agent._payloads == []
+
+    def test_invalid_payloads_are_dropped(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+
+        zipkin_agent.add_payload(b"\x0c\x00\x00\x00\x01")
+
+        assert zipkin_agent.payloads_dropped == 1
+        assert zipkin_agent._payloads == []
+
+    def test_batches_are_dropped_when_the_queue_is_full(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(
+            socket_path, upstream, Encoding.V2_JSON, max_queued_batches=1,
+        )
+
+        zipkin_agent.add_payload(b"[1]")
+        zipkin_agent.flush()
+        zipkin_agent.add_payload(b"[2]")
+        zipkin_agent.flush()
+        zipkin_agent.flush()
+
+        assert zipkin_agent.batches_dropped == 1
+
+    def test_flush_interval(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(
+            socket_path, upstream, Encoding.V2_JSON, flush_interval=0.01,
+        )
+        zipkin_agent.start()
+
+        zipkin_agent.add_payload(b"[1]")
+        _wait_for(lambda: upstream.get_payloads() == [b"[1]"])
+        zipkin_agent.add_payload(b"[2]")
+        _wait_for(lambda: upstream.get_payloads() == [b"[1]", b"[2]"])
+        zipkin_agent.close()
+
+    def test_flush_interval_starts_with_the_batch(self, socket_path):
+        sent = []
+        upstream = mock.Mock(side_effect=lambda payload: sent.append(time.time()))
+        zipkin_agent = agent.Agent(
+            socket_path, upstream, Encoding.V2_JSON, flush_interval=0.2,
+        )
+        zipkin_agent.start()
+        # The sender is idle when the batch starts.
+        time.sleep(0.1)
+
+        added = time.time()
+        zipkin_agent.add_payload(b"[1]")
+        _wait_for(lambda: sent)
+
+        assert 0.19 <= sent[0] - added < 0.35
+        zipkin_agent.close()
+
+    def test_wakes_up_the_idle_sender(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(
+            socket_path, upstream, Encoding.V2_JSON, max_queued_batches=1,
+        )
+        zipkin_agent._sender_idle = True
+
+        zipkin_agent.add_payload(b"[1]")
+        zipkin_agent.add_payload(b"[2]")
+
+        assert zipkin_agent._batches.get_nowait() is agent._WAKEUP
+        assert zipkin_agent._batches.empty()
+
+        # The sender is busy if the queue is full.
+        zipkin_agent._batches.put_nowait(b"[0]")
+        zipkin_agent._sender_idle = True
+        zipkin_agent.flush()
+        zipkin_agent.add_payload(b"[3]")
+        assert zipkin_agent._batches.get_nowait() == b"[0]"
+        assert zipkin_agent._sender_idle is False
+
+    def test_batches_flushed_while_waiting_are_not_sent_early(
+        self, socket_path, upstream,
+    ):
+        zipkin_agent = agent.Agent(
+            socket_path, upstream, Encoding.V2_JSON, flush_interval=10,
+        )
+        zipkin_agent.add_payload(b"[1]")
+        get = zipkin_agent._batches.get
+
+        def flush_then_timeout(timeout):
+            zipkin_agent.flush()
+            zipkin_agent.add_payload(b"[2]")
+            zipkin_agent._batches.get = get
+            zipkin_agent._batches.put_nowait(agent._STOP)
+            raise queue.Empty()
+
+        zipkin_agent._batches.get = flush_then_timeout
+        zipkin_agent._run_sender()
+
+        # [2] started a new batch, it wasn't taken when [1]'s deadline passed.
+        assert upstream.get_payloads() == [b"[1]", b"[2]"]
+
+    def test_dropped_payloads_from_many_threads(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(
+            socket_path, upstream, Encoding.V2_JSON, max_queued_batches=1,
+        )
+
+        def add_payloads():
+            for _ in range(100):
+                zipkin_agent.add_payload(b"x")
+                zipkin_agent.add_payload(b"[1]")
+                zipkin_agent.flush()
+
+        threads = [threading.Thread(target=add_payloads) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert zipkin_agent.payloads_dropped == 400
+        assert zipkin_agent.payloads_received == 400
+        # Only the first batch fits in the queue, nothing is sending them.
+        assert zipkin_agent.batches_dropped > 0
+
+    def test_send_errors_are_counted(self, socket_path):
+        upstream = mock.Mock(side_effect=socket.error("connection refused"))
+        zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+
+        zipkin_agent.add_payload(b"[1]")
+        zipkin_agent._batches.put(agent._STOP)
+        zipkin_agent._run_sender()
+
+        assert zipkin_agent.send_errors == 1
+        assert zipkin_agent.batches_sent == 0
+
+    def test_bad_frames_close_the_connection(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+        zipkin_agent.start()
+
+        for frame in [b"\x00\x00\x00\x05[1]", b"\xff\xff\xff\xff", b"\x00\x00"]:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(5)
+            sock.connect(socket_path)
+            sock.sendall(frame)
+            sock.shutdown(socket.SHUT_WR)
+            # The agent closes the connection without waiting for more data.
+            assert sock.recv(1) == b""
+            sock.close()
+        zipkin_agent.close()
+
+        assert zipkin_agent.payloads_received == 0
+        assert upstream.get_payloads() == []
+
+    def test_refuses_to_steal_a_running_agent_socket(self, socket_path, upstream):
+        zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+        zipkin_agent.start()
+
+        with pytest.raises(ZipkinError):
+            agent.Agent(socket_path, upstream, Encoding.V2_JSON).start()
+        zipkin_agent.close()
+        # Closing twice is fine.
+        zipkin_agent.close()
+
+    def test_removes_stale_sockets(self, socket_path, upstream):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+        zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+
+        zipkin_agent.start()
+        worker = UnixSocketTransport(socket_path)
+        worker.send(b"[1]")
+        _wait_for(lambda: zipkin_agent.payloads_received == 1)
+        worker.close()
+        zipkin_agent.close()
+
+        assert upstream.get_payloads() == [b"[1]"]
+
+
+def test_parse_args():
+    args = agent.parse_args(
+        ["-s", "agent.sock", "-e", "v1_thrift", "--collector-port", "9999"],
+    )
+
+    assert args.socket == "agent.sock"
+    assert args.encoding == Encoding.V1_THRIFT
+    assert args.collector_host == "localhost"
+    assert args.collector_port == 9999
+    assert args.compress is False
+
+
+def test_parse_args_unknown_encoding():
+    with pytest.raises(SystemExit):
+        agent.parse_args(["-s", "agent.sock", "-e", "xml"])
+
+
+@pytest.mark.parametrize("error", [KeyboardInterrupt, SystemExit])
+def test_main(socket_path, error):
+    with mock.patch.object(
+        agent.Agent, "serve_forever", autospec=True, side_effect=error,
+    ) as mock_serve, mock.patch.object(
+        agent.PooledHTTPTransport, "close", autospec=True,
+    ) as mock_close, mock.patch.object(
+        agent.signal, "signal",
+    ) as mock_signal:
+        assert agent.main(["-s", socket_path, "-e", "V2_JSON", "--compress"]) == 0
+
+    zipkin_agent = mock_serve.call_args[0][0]
+    assert zipkin_agent.socket_path == socket_path
+    assert zipkin_agent.encoding == Encoding.V2_JSON
+    assert zipkin_agent.transport_handler.compress is True
+    assert mock_close.call_count == 1
+    mock_signal.assert_called_once_with(agent.signal.SIGTERM, agent._exit_on_sigterm)
+    with pytest.raises(SystemExit):
+        agent._exit_on_sigterm(agent.signal.SIGTERM, None)
+
+
+def test_serve_forever_sends_buffered_spans_when_stopped(socket_path, upstream):
+    zipkin_agent = agent.Agent(socket_path, upstream, Encoding.V2_JSON)
+
+    def serve_forever(*args, **kwargs):
+        zipkin_agent.add_payload(b"[1]")
+        raise KeyboardInterrupt()
+
+    with mock.patch.object(
+        agent._AgentServer, "serve_forever", side_effect=serve_forever,
+    ), mock.patch.object(agent._AgentServer, "shutdown"):
+        with pytest.raises(KeyboardInterrupt):
+            zipkin_agent.serve_forever()
+
+    assert upstream.get_payloads() == [b"[1]"]
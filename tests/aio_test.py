@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+import mock
+import pytest
+
+from py_zipkin import aio
+from py_zipkin.encoding import Encoding
+from py_zipkin.exception import ZipkinError
+from py_zipkin.transport import Payload
+from py_zipkin.zipkin import zipkin_span
+from tests.test_helpers import MockTransportHandler
+from tests.transport_test import _v2_json_payload
+from tests.transport_test import collector  # noqa: F401
+
+PAYLOAD = b'[{"traceId": "000000000000000a", "id": "000000000000000b"}]'
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+class CannedServer(object):
+    """Answers each request with the next canned response. An empty response
+    closes the connection and None never answers."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.responses = []
+        self.requests = []
+        self.connections = 0
+        self.stopped = asyncio.Event()
+        self.server = loop.run_until_complete(
+            asyncio.start_server(self.handle, "127.0.0.1", 0),
+        )
+        self.address = self.server.sockets[0].getsockname()[:2]
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = dict(
+                    line.split(": ", 1)
+                    for line in head.decode("latin-1").split("\r\n")[1:]
+                    if line
+                )
+                body = await reader.readexactly(int(headers["Content-Length"]))
+                self.requests.append((head, body))
+
+                response = self.responses.pop(0)
+                if response is None:
+                    await self.stopped.wait()
+                if not response:
+                    break
+                writer.write(response)
+                await writer.drain()
+                if b"Connection: close" in response:
+                    break
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.stopped.set()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        # Let the handlers exit.
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+
+
+@pytest.fixture
+def canned_server(loop):
+    server = CannedServer(loop)
+    yield server
+    server.close()
+
+
+class TestAsyncioHTTPTransport(object):
+    def test_send_is_not_supported(self):
+        with pytest.raises(ZipkinError):
+            aio.AsyncioHTTPTransport("localhost", 9411).send(PAYLOAD)
+
+    def test_reuses_the_connection(self, loop, collector):  # noqa: F811
+        transport = aio.AsyncioHTTPTransport(*collector.server_address)
+        payload = _v2_json_payload()
+
+        for _ in range(3):
+            loop.run_until_complete(transport.send_async(payload))
+
+        assert [r[0] for r in collector.requests] == ["/api/v2/spans"] * 3
+        assert collector.requests[0][1]["Content-Type"] == "application/json"
+        assert collector.requests[0][2] == payload.encode("utf-8")
+        assert len(collector.connections) == 1
+        transport.close()
+
+    def test_uses_the_payload_encoding(self, loop, collector):  # noqa: F811
+        transport = aio.AsyncioHTTPTransport(*collector.server_address)
+
+        with mock.patch.object(
+            aio.AsyncioHTTPTransport, "_get_path_content_type", autospec=True,
+            return_value=("/api/v2/spans", "application/x-protobuf"),
+        ) as mock_path:
+            loop.run_until_complete(
+                transport.send_async(Payload(PAYLOAD, Encoding.V2_PROTO3, 1)),
+            )
+
+        mock_path.assert_called_once_with(transport, PAYLOAD, Encoding.V2_PROTO3)
+        transport.close()
+
+    def test_reconnects_if_the_connection_was_closed(
+        self, loop, collector,  # noqa: F811
+    ):
+        transport = aio.AsyncioHTTPTransport(*collector.server_address)
+        payload = _v2_json_payload()
+        collector.drop_connections = True
+
+        loop.run_until_complete(transport.send_async(payload))
+        loop.run_until_complete(transport.send_async(payload))
+
+        assert len(collector.requests) == 2
+        assert len(collector.connections) == 2
+        transport.close()
+
+    def test_errors_on_new_connections_are_raised(self, loop, canned_server):
+        transport = aio.AsyncioHTTPTransport(*canned_server.address)
+        canned_server.responses = [b"garbage that isn't HTTP\r\n"]
+
+        with pytest.raises(ValueError):
+            loop.run_until_complete(transport.send_async(PAYLOAD))
+        assert transport._writer is None
+
+    def test_closed_connections_are_reported(self, loop, canned_server):
+        transport = aio.AsyncioHTTPTransport(*canned_server.address)
+        canned_server.responses = [b""]
+
+        with pytest.raises(ConnectionResetError):
+            loop.run_until_complete(transport.send_async(PAYLOAD))
+
+    def test_error_status(self, loop, collector):  # noqa: F811
+        transport = aio.AsyncioHTTPTransport(*collector.server_address)
+        collector.statuses = [500]
+
+        with pytest.raises(ZipkinError, match="500"):
+            loop.run_until_complete(transport.send_async(_v2_json_payload()))
+        transport.close()
+
+    def test_connection_close(self, loop, collector):  # noqa: F811
+        transport = aio.AsyncioHTTPTransport(*collector.server_address)
+        collector.send_connection_close = True
+
+        loop.run_until_complete(transport.send_async(_v2_json_payload()))
+
+        assert transport._writer is None
+
+    @pytest.mark.parametrize(
+        "response,will_close",
+        [
+            (b"HTTP/1.1 202 Accepted\r\nContent-Length: 2\r\n\r\nok", False),
+            (
+                b"HTTP/1.1 202 Accepted\r\nTransfer-Encoding: chunked\r\n\r\n"
+                b"2;ext=1\r\nok\r\n0\r\nTrailer: yes\r\n\r\n",
+                False,
+            ),
+            (b"HTTP/1.1 204\r\n\r\n", False),
+            (b"HTTP/1.0 202 Accepted\r\nContent-Length: 0\r\n\r\n", True),
+            (
+                b"HTTP/1.0 202 Accepted\r\nConnection: keep-alive\r\n"
+                b"Content-Length: 0\r\n\r\n",
+                False,
+            ),
+        ],
+    )
+    def test_responses_are_read_completely(
+        self, loop, canned_server, response, will_close,
+    ):
+        transport = aio.AsyncioHTTPTransport(*canned_server.address)
+        canned_server.responses = [response, response]
+
+        loop.run_until_complete(transport.send_async(PAYLOAD))
+        assert (transport._writer is None) is will_close
+        loop.run_until_complete(transport.send_async(PAYLOAD))
+
+        assert len(canned_server.requests) == 2
+        assert canned_server.connections == (2 if will_close else 1)
+        transport.close()
+
+    def test_body_until_the_connection_is_closed(self, loop, canned_server):
+        transport = aio.AsyncioHTTPTransport(*canned_server.address)
+        canned_server.responses = [
+            b"HTTP/1.1 202 Accepted\r\nConnection: close\r\n\r\nbody",
+        ]
+
+        loop.run_until_complete(transport.send_async(PAYLOAD))
+
+        assert transport._writer is None
+        head, body = canned_server.requests[0]
+        assert head.startswith(b"POST /api/v2/spans HTTP/1.1\r\n")
+        assert body == PAYLOAD
+
+    def test_timeout(self, loop, canned_server):
+        transport = aio.AsyncioHTTPTransport(
+            *canned_server.address, read_timeout=0.01
+        )
+        canned_server.responses = [None]
+
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(transport.send_async(PAYLOAD))
+
+        assert transport._writer is None
+
+
+def _payload(span_name):
+    transport = MockTransportHandler()
+    with zipkin_span(
+        service_name="my_service",
+        span_name=span_name,
+        sample_rate=100,
+        transport_handler=transport,
+        encoding=Encoding.V2_JSON,
+    ):
+        pass
+    return transport.get_payloads()[0]
+
+
+class TestAsyncioReporter(object):
+    def test_sends_from_a_background_task(self, loop, collector):  # noqa: F811
+        reporter = aio.AsyncioReporter(
+            aio.AsyncioHTTPTransport(*collector.server_address),
+        )
+
+        async def handle_request():
+            with zipkin_span(
+                service_name="my_service",
+                span_name="handle",
+                sample_rate=100,
+                transport_handler=reporter,
+                encoding=Encoding.V2_JSON,
+            ):
+                pass
+            # Nothing has been sent yet, the loop hasn't been blocked.
+            assert collector.requests == []
+            await reporter.flush()
+
+        loop.run_until_complete(handle_request())
+
+        (_, _, body) = collector.requests[0]
+        assert json.loads(body.decode("utf-8"))[0]["name"] == "handle"
+        assert reporter.payloads_sent == 1
+        loop.run_until_complete(reporter.close())
+        reporter.transport_handler.close()
+
+    def test_merges_queued_payloads(self, loop):
+        transport = MockTransportHandler()
+        reporter = aio.AsyncioReporter(transport)
+
+        async def report():
+            for name in ["a", "b", "c"]:
+                reporter.send(_payload(name))
+            await reporter.close()
+
+        loop.run_until_complete(report())
+
+        (batch,) = transport.get_payloads()
+        assert [s["name"] for s in json.loads(batch.decode("utf-8"))] == [
+            "a",
+            "b",
+            "c",
+        ]
+
+    def test_forwards_the_payload_encoding(self, loop):
+        sent = []
+
+        async def send_async(payload):
+            sent.append(payload)
+
+        reporter = aio.AsyncioReporter(
+            mock.Mock(spec=["send_async"], send_async=send_async),
+        )
+
+        async def report():
+            reporter.send_payload(Payload(_payload("a"), Encoding.V2_JSON, 1))
+            reporter.send_payload(Payload(_payload("b"), Encoding.V2_JSON, 1))
+            await reporter.close()
+
+        with mock.patch.object(aio, "_detect_encoding", autospec=True) as detect:
+            loop.run_until_complete(report())
+
+        assert not detect.called
+        (batch,) = sent
+        assert (batch.encoding, batch.span_count) == (Encoding.V2_JSON, 2)
+        assert [s["name"] for s in json.loads(batch.data.decode("utf-8"))] == [
+            "a",
+            "b",
+        ]
+
+    def test_batches_respect_the_encoding_and_max_payload_bytes(self, loop):
+        payload = _payload("a").encode("utf-8")
+        transport = MockTransportHandler(max_payload_bytes=len(payload) * 2)
+        reporter = aio.AsyncioReporter(transport)
+
+        async def report():
+            for _ in range(3):
+                reporter.send(payload)
+            reporter.send(b"\x0c\x00\x00\x00\x00")
+            await reporter.close()
+
+        loop.run_until_complete(report())
+
+        payloads = transport.get_payloads()
+        assert [len(json.loads(p.decode("utf-8"))) for p in payloads[:2]] == [2, 1]
+        assert payloads[2] == b"\x0c\x00\x00\x00\x00"
+        assert reporter.get_max_payload_bytes() == len(payload) * 2
+
+    def test_invalid_payloads_are_dropped(self, loop):
+        transport = MockTransportHandler()
+        reporter = aio.AsyncioReporter(transport)
+
+        async def report():
+            reporter.send(b"x")
+            reporter.send(PAYLOAD)
+            await reporter.flush()
+
+        loop.run_until_complete(report())
+
+        assert transport.get_payloads() == [PAYLOAD]
+        assert reporter.send_errors == 1
+        loop.run_until_complete(reporter.close())
+
+    def test_drops_payloads_when_the_queue_is_full(self, loop):
+        transport = MockTransportHandler()
+        reporter = aio.AsyncioReporter(transport, max_queue_size=1)
+
+        async def report():
+            for _ in range(2):
+                reporter.send(PAYLOAD)
+            await reporter.close()
+            reporter.send(PAYLOAD)
+
+        loop.run_until_complete(report())
+
+        assert transport.get_payloads() == [PAYLOAD]
+        assert reporter.payloads_dropped == 2
+
+    def test_send_errors_and_timeouts_are_counted(self, loop):
+        async def slow_send(payload):
+            await asyncio.sleep(10)
+
+        transport = mock.Mock(spec=["send_async"], send_async=slow_send)
+        reporter = aio.AsyncioReporter(transport, timeout=0.01)
+        failing = aio.AsyncioReporter(mock.Mock(side_effect=ValueError))
+
+        async def report():
+            reporter.send(PAYLOAD)
+            failing.send(PAYLOAD)
+            await reporter.close()
+            await failing.close()
+
+        loop.run_until_complete(report())
+
+        assert reporter.send_errors == 1
+        assert failing.send_errors == 1
+        assert reporter.get_max_payload_bytes() is None
+
+    def test_close_and_flush_without_payloads(self, loop):
+        reporter = aio.AsyncioReporter(MockTransportHandler())
+
+        loop.run_until_complete(reporter.flush())
+        loop.run_until_complete(reporter.close())
+        loop.run_until_complete(reporter.close())
+
+    def test_cancellation_is_not_swallowed(self, loop):
+        async def slow_send(payload):
+            await asyncio.sleep(10)
+
+        reporter = aio.AsyncioReporter(
+            mock.Mock(spec=["send_async"], send_async=slow_send),
+        )
+
+        async def report():
+            reporter.send(PAYLOAD)
+            await asyncio.sleep(0.01)
+            reporter._task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await reporter._task
+
+        loop.run_until_complete(report())
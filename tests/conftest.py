@@ -1,7 +1,23 @@
+import sys
+
 import pytest
 
+from py_zipkin.encoding import clear_endpoint_cache
 from py_zipkin.zipkin import ZipkinAttrs
 
+# py_zipkin.aio uses async/await.
+if sys.version_info < (3, 5):
+    collect_ignore = ["aio_test.py"]
+
+
+@pytest.fixture(autouse=True)
+def clean_endpoint_cache():
+    # Many tests mock the local host ip, so make sure they don't see
+    # endpoints cached by a previous test.
+    clear_endpoint_cache()
+    yield
+    clear_endpoint_cache()
+
 
 @pytest.fixture
 def zipkin_attributes():
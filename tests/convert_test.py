@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+import os
+import stat
+
+import mock
+import pytest
+
+from py_zipkin import convert
+from py_zipkin.encoding import convert_spans
+from py_zipkin.encoding import Encoding
+from py_zipkin.encoding._decoders import get_decoder
+from py_zipkin.exception import ZipkinError
+from tests.encoding._decoders_test import _no_mmap_memoryview
+from tests.test_helpers import generate_list_of_spans
+
+
+def _write_spans(path, encoding):
+    spans, _, _, _ = generate_list_of_spans(encoding)
+    if not isinstance(spans, bytes):
+        spans = spans.encode("utf-8")
+    path.write_binary(spans)
+    return spans
+
+
+def _read(path):
+    with open(str(path), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize(
+    "input_encoding,output_encoding",
+    [
+        (Encoding.V1_THRIFT, Encoding.V2_JSON),
+        (Encoding.V2_JSON, Encoding.V1_THRIFT),
+        (Encoding.V1_JSON, Encoding.V2_PROTO3),
+    ],
+)
+def test_convert_file(tmpdir, input_encoding, output_encoding):
+    spans = _write_spans(tmpdir.join("spans"), input_encoding)
+    expected = convert_spans(spans, output_encoding)
+    if not isinstance(expected, bytes):
+        expected = expected.encode("utf-8")
+
+    count = convert.convert_file(
+        str(tmpdir.join("spans")), str(tmpdir.join("converted")), output_encoding,
+    )
+
+    assert count == 2
+    assert _read(tmpdir.join("converted")) == expected
+    assert tmpdir.listdir(sort=True) == [
+        tmpdir.join("converted"),
+        tmpdir.join("spans"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "input_encoding,output_encoding",
+    [
+        (Encoding.V1_THRIFT, Encoding.V2_JSON),
+        (Encoding.V2_JSON, Encoding.V1_THRIFT),
+        (Encoding.V1_JSON, Encoding.V2_JSON),
+    ],
+)
+def test_convert_file_concatenated_batches(tmpdir, input_encoding, output_encoding):
+    spans = _write_spans(tmpdir.join("spans"), input_encoding)
+    tmpdir.join("spans").write_binary(spans * 2)
+    converted = convert_spans(spans, output_encoding)
+    if not isinstance(converted, bytes):
+        converted = converted.encode("utf-8")
+
+    count = convert.convert_file(
+        str(tmpdir.join("spans")), str(tmpdir.join("converted")), output_encoding,
+    )
+
+    assert count == 4
+    assert get_decoder(output_encoding).decode_spans(
+        _read(tmpdir.join("converted")),
+    ) == get_decoder(output_encoding).decode_spans(converted) * 2
+
+
+@pytest.mark.parametrize(
+    "input_encoding,output_encoding",
+    [
+        (Encoding.V2_JSON, Encoding.V1_THRIFT),
+        (Encoding.V1_THRIFT, Encoding.V2_PROTO3),
+        (Encoding.V2_JSON, Encoding.V2_JSON),
+    ],
+)
+def test_convert_file_mmap_without_buffer_interface(
+    tmpdir, input_encoding, output_encoding,
+):
+    spans = _write_spans(tmpdir.join("spans"), input_encoding)
+    expected = convert_spans(spans, output_encoding)
+    if not isinstance(expected, bytes):
+        expected = expected.encode("utf-8")
+
+    # Like on python 2.
+    with _no_mmap_memoryview():
+        convert.convert_file(
+            str(tmpdir.join("spans")), str(tmpdir.join("converted")), output_encoding,
+        )
+
+    assert _read(tmpdir.join("converted")) == expected
+
+
+def test_convert_file_honors_the_umask(tmpdir):
+    _write_spans(tmpdir.join("spans"), Encoding.V2_JSON)
+    old_umask = os.umask(0o027)
+    try:
+        convert.convert_file(
+            str(tmpdir.join("spans")), str(tmpdir.join("converted")), Encoding.V1_JSON,
+        )
+    finally:
+        os.umask(old_umask)
+
+    assert stat.S_IMODE(os.stat(str(tmpdir.join("converted"))).st_mode) == 0o640
+
+
+def test_convert_file_unique_temporary_files(tmpdir):
+    _write_spans(tmpdir.join("spans"), Encoding.V2_JSON)
+    tmpdir.join("converted.tmp").write_binary(b"not ours")
+    files_while_converting = []
+
+    def fake_convert(spans, output_file, *args, **kwargs):
+        files_while_converting.extend(tmpdir.listdir(sort=True))
+        return 0
+
+    with mock.patch.object(
+        convert, "stream_convert_spans", autospec=True, side_effect=fake_convert,
+    ):
+        convert.convert_file(
+            str(tmpdir.join("spans")), str(tmpdir.join("converted")), Encoding.V1_JSON,
+        )
+
+    (tmp_path,) = set(files_while_converting) - {
+        tmpdir.join("converted.tmp"),
+        tmpdir.join("spans"),
+    }
+    assert tmp_path.basename.startswith("converted.")
+    assert _read(tmpdir.join("converted.tmp")) == b"not ours"
+    assert not tmp_path.exists()
+
+
+def test_convert_file_same_encoding(tmpdir):
+    spans = _write_spans(tmpdir.join("spans"), Encoding.V2_JSON)
+
+    count = convert.convert_file(
+        str(tmpdir.join("spans")),
+        str(tmpdir.join("converted")),
+        Encoding.V2_JSON,
+        input_encoding=Encoding.V2_JSON,
+    )
+
+    assert count is None
+    assert _read(tmpdir.join("converted")) == spans
+
+
+def test_convert_file_refuses_to_overwrite_input(tmpdir):
+    _write_spans(tmpdir.join("spans"), Encoding.V2_JSON)
+
+    with pytest.raises(ZipkinError):
+        convert.convert_file(
+            str(tmpdir.join("spans")), str(tmpdir.join("spans")), Encoding.V1_JSON,
+        )
+
+
+def test_convert_file_empty_file(tmpdir):
+    tmpdir.join("spans").write_binary(b"")
+
+    with pytest.raises(ZipkinError):
+        convert.convert_file(
+            str(tmpdir.join("spans")),
+            str(tmpdir.join("converted")),
+            Encoding.V1_JSON,
+        )
+
+
+def test_convert_file_removes_partial_output(tmpdir):
+    tmpdir.join("spans").write_binary(b'[{"traceId": "000000000000000a", "id": ')
+
+    with pytest.raises(ZipkinError):
+        convert.convert_file(
+            str(tmpdir.join("spans")),
+            str(tmpdir.join("converted")),
+            Encoding.V1_THRIFT,
+            input_encoding=Encoding.V2_JSON,
+        )
+
+    assert tmpdir.listdir() == [tmpdir.join("spans")]
+
+
+def test_parse_args_encodings():
+    args = convert.parse_args(
+        ["-e", "v2_json", "-i", "V1_THRIFT", "-o", "out", "-j", "3", "a", "b"],
+    )
+
+    assert args.output_encoding == Encoding.V2_JSON
+    assert args.input_encoding == Encoding.V1_THRIFT
+    assert args.output_dir == "out"
+    assert args.jobs == 3
+    assert args.files == ["a", "b"]
+
+
+def test_parse_args_unknown_encoding():
+    with pytest.raises(SystemExit):
+        convert.parse_args(["-e", "xml", "-o", "out", "a"])
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_main(tmpdir, capsys, jobs):
+    thrift_spans = _write_spans(tmpdir.join("a.thrift"), Encoding.V1_THRIFT)
+    json_spans = _write_spans(tmpdir.join("b.json"), Encoding.V2_JSON)
+    output_dir = tmpdir.join("out")
+
+    exit_code = convert.main(
+        [
+            "--output-encoding",
+            "V2_JSON",
+            "--output-dir",
+            str(output_dir),
+            "--jobs",
+            jobs,
+            str(tmpdir.join("a.thrift")),
+            str(tmpdir.join("b.json")),
+        ]
+    )
+
+    assert exit_code == 0
+    assert _read(output_dir.join("a.thrift")) == convert_spans(
+        thrift_spans, Encoding.V2_JSON,
+    ).encode("utf-8")
+    assert _read(output_dir.join("b.json")) == json_spans
+    out, _ = capsys.readouterr()
+    assert "a.thrift: 2 spans" in out
+    assert "b.json: copied" in out
+
+
+def test_main_duplicate_file_names(tmpdir, capsys):
+    _write_spans(tmpdir.mkdir("a").join("spans"), Encoding.V2_JSON)
+    _write_spans(tmpdir.mkdir("b").join("spans"), Encoding.V2_JSON)
+    output_dir = tmpdir.join("out")
+
+    exit_code = convert.main(
+        [
+            "-e",
+            "V1_JSON",
+            "-o",
+            str(output_dir),
+            str(tmpdir.join("a", "spans")),
+            str(tmpdir.join("b", "spans")),
+        ]
+    )
+
+    assert exit_code == 1
+    _, err = capsys.readouterr()
+    assert "Multiple input files are named spans" in err
+    assert not output_dir.exists()
+
+
+def test_main_reports_failures(tmpdir, capsys):
+    tmpdir.join("empty").write_binary(b"")
+    output_dir = tmpdir.mkdir("out")
+
+    with mock.patch.object(convert.multiprocessing, "Pool") as mock_pool:
+        exit_code = convert.main(
+            ["-e", "V2_JSON", "-o", str(output_dir), str(tmpdir.join("empty"))],
+        )
+
+    assert exit_code == 1
+    # There's no point in starting a process pool for a single file.
+    assert not mock_pool.called
+    _, err = capsys.readouterr()
+    assert "{}: ZipkinError: Empty file".format(tmpdir.join("empty")) in err
+    assert os.listdir(str(output_dir)) == []
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
+import io
+
 import pytest
 
 from py_zipkin import Encoding
 from py_zipkin.encoding import convert_spans
 from py_zipkin.encoding import detect_span_version_and_encoding
+from py_zipkin.encoding import stream_convert_spans
 from py_zipkin.exception import ZipkinError
 from tests.test_helpers import generate_list_of_spans
 
@@ -50,9 +53,90 @@ def test_convert_spans_thrift_to_v2_json():
     assert detect_span_version_and_encoding(converted_spans) == Encoding.V2_JSON
 
 
+def test_convert_spans_proto3_to_v2_json():
+    spans, _, _, _ = generate_list_of_spans(Encoding.V2_PROTO3)
+
+    converted_spans = convert_spans(spans=spans, output_encoding=Encoding.V2_JSON)
+
+    assert detect_span_version_and_encoding(converted_spans) == Encoding.V2_JSON
+    assert convert_spans(converted_spans, Encoding.V2_PROTO3) == spans
+
+
 def test_convert_spans_v2_json_to_v2_json():
     spans, _, _, _ = generate_list_of_spans(Encoding.V2_JSON)
 
     converted_spans = convert_spans(spans=spans, output_encoding=Encoding.V2_JSON)
 
     assert detect_span_version_and_encoding(converted_spans) == Encoding.V2_JSON
+
+
+class NonSeekableBytesIO(io.BytesIO):
+    def seekable(self):
+        return False
+
+
+@pytest.mark.parametrize(
+    "input_encoding,output_encoding",
+    [
+        (Encoding.V1_THRIFT, Encoding.V2_JSON),
+        (Encoding.V1_THRIFT, Encoding.V2_PROTO3),
+        (Encoding.V1_JSON, Encoding.V1_THRIFT),
+        (Encoding.V2_JSON, Encoding.V1_THRIFT),
+        (Encoding.V2_JSON, Encoding.V1_JSON),
+        (Encoding.V2_JSON, Encoding.V2_PROTO3),
+        (Encoding.V2_PROTO3, Encoding.V1_THRIFT),
+    ],
+)
+@pytest.mark.parametrize("output_class", [io.BytesIO, NonSeekableBytesIO])
+def test_stream_convert_spans(input_encoding, output_encoding, output_class):
+    spans, _, _, _ = generate_list_of_spans(input_encoding)
+    expected = convert_spans(spans, output_encoding, input_encoding)
+    if not isinstance(expected, bytes):
+        expected = expected.encode("utf-8")
+    output = output_class()
+
+    count = stream_convert_spans(spans, output, output_encoding, chunk_size=1)
+
+    assert count == 2
+    assert output.getvalue() == expected
+
+
+def test_stream_convert_spans_from_file():
+    spans, _, _, _ = generate_list_of_spans(Encoding.V2_JSON)
+    output = io.BytesIO()
+
+    stream_convert_spans(
+        io.BytesIO(spans.encode("utf-8")),
+        output,
+        Encoding.V1_THRIFT,
+        input_encoding=Encoding.V2_JSON,
+    )
+
+    assert output.getvalue() == convert_spans(spans, Encoding.V1_THRIFT)
+
+
+def test_stream_convert_spans_requires_input_encoding_for_files():
+    with pytest.raises(ZipkinError):
+        stream_convert_spans(io.BytesIO(b"[]"), io.BytesIO(), Encoding.V2_JSON)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1024])
+def test_stream_convert_spans_same_encoding_copies(chunk_size):
+    spans, _, _, _ = generate_list_of_spans(Encoding.V2_JSON)
+    output = io.BytesIO()
+
+    assert (
+        stream_convert_spans(spans, output, Encoding.V2_JSON, chunk_size=chunk_size)
+        is None
+    )
+    assert output.getvalue() == spans.encode("utf-8")
+
+    output = io.BytesIO()
+    stream_convert_spans(
+        io.BytesIO(spans.encode("utf-8")),
+        output,
+        Encoding.V2_JSON,
+        input_encoding=Encoding.V2_JSON,
+        chunk_size=chunk_size,
+    )
+    assert output.getvalue() == spans.encode("utf-8")
@@ -1,16 +1,37 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import contextlib
+import io
+import json
+import mmap
+import struct
+
 import mock
 import pytest
+from thriftpy2.thrift import TType
 
+from py_zipkin import encoding
 from py_zipkin import thrift
+from py_zipkin.encoding import _decoders
+from py_zipkin.encoding import protobuf
+from py_zipkin.encoding._decoders import _iter_json_elements
+from py_zipkin.encoding._decoders import _iter_json_list
+from py_zipkin.encoding._decoders import _iter_thrift_spans
+from py_zipkin.encoding._decoders import _Reader
+from py_zipkin.encoding._decoders import _V1JSONDecoder
 from py_zipkin.encoding._decoders import _V1ThriftDecoder
+from py_zipkin.encoding._decoders import _V2JSONDecoder
+from py_zipkin.encoding._decoders import _V2ProtobufDecoder
 from py_zipkin.encoding._decoders import get_decoder
 from py_zipkin.encoding._decoders import IDecoder
+from py_zipkin.encoding._encoders import get_encoder
+from py_zipkin.encoding._helpers import create_endpoint
 from py_zipkin.encoding._helpers import Endpoint
+from py_zipkin.encoding._helpers import Span
 from py_zipkin.encoding._types import Encoding
 from py_zipkin.encoding._types import Kind
+from py_zipkin.encoding.protobuf import _wire as protobuf_wire
 from py_zipkin.exception import ZipkinError
 from py_zipkin.thrift import create_binary_annotation
 from py_zipkin.thrift import zipkin_core
@@ -29,10 +50,9 @@ def thrift_endpoint():
 
 def test_get_decoder():
     assert isinstance(get_decoder(Encoding.V1_THRIFT), _V1ThriftDecoder)
-    with pytest.raises(NotImplementedError):
-        get_decoder(Encoding.V1_JSON)
-    with pytest.raises(NotImplementedError):
-        get_decoder(Encoding.V2_JSON)
+    assert isinstance(get_decoder(Encoding.V1_JSON), _V1JSONDecoder)
+    assert isinstance(get_decoder(Encoding.V2_JSON), _V2JSONDecoder)
+    assert isinstance(get_decoder(Encoding.V2_PROTO3), _V2ProtobufDecoder)
     with pytest.raises(ZipkinError):
         get_decoder(None)
 
@@ -41,15 +61,189 @@ def test_idecoder_throws_not_implemented_errors():
     encoder = IDecoder()
     with pytest.raises(NotImplementedError):
         encoder.decode_spans(b"[]")
+    with pytest.raises(NotImplementedError):
+        encoder.iter_decode_spans(b"[]")
+
+
+@contextlib.contextmanager
+def _no_mmap_memoryview():
+    """Makes memoryview fail on mmaps, like on python 2."""
+
+    def fake_memoryview(source):
+        if isinstance(source, mmap.mmap):
+            raise TypeError("cannot make memory view")
+        return memoryview(source)
+
+    with mock.patch.object(
+        _decoders, "memoryview", fake_memoryview, create=True,
+    ), mock.patch.object(encoding, "memoryview", fake_memoryview, create=True):
+        yield
+
+
+class TestReader(object):
+    def test_read_buffer(self):
+        reader = _Reader(b"abcdef")
+        assert reader.read(2) == b"ab"
+        reader.unread(b"ab")
+        assert reader.read(3) == b"abc"
+        assert reader.read(10) == b"def"
+        assert reader.read(1) == b""
+
+    def test_read_text(self):
+        assert _Reader(u"àb").read(10) == u"àb".encode("utf-8")
+
+    def test_read_file_loops_until_size(self):
+        source = mock.Mock()
+        source.read.side_effect = [b"ab", b"c", b""]
+        reader = _Reader(source)
+        assert reader.read(4) == b"abc"
+        assert source.read.call_args_list == [
+            mock.call(4),
+            mock.call(2),
+            mock.call(1),
+        ]
+
+    def test_read_mmap_without_buffer_interface(self, tmpdir):
+        path = tmpdir.join("spans")
+        path.write_binary(b"abcdef")
+        with open(str(path), "rb") as f:
+            spans = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Python 2 mmaps can't be used with memoryview, and reading them
+        # depends on their file position.
+        spans.seek(3)
+
+        with _no_mmap_memoryview():
+            reader = _Reader(spans)
+        assert reader.read(4) == b"abcd"
+        assert reader.read(4) == b"ef"
+        spans.close()
+
+
+class TestIterJSONList(object):
+    @pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+    def test_iter_json_list(self, chunk_size):
+        encoded = u' [ {"a": "à"} ,\n{"b": [1, 2]}, 123, "x" ] '.encode("utf-8")
+        elements = list(_iter_json_list(io.BytesIO(encoded), chunk_size))
+        assert elements == [{"a": u"à"}, {"b": [1, 2]}, 123, "x"]
+
+    def test_iter_json_list_trailing_number(self):
+        elements = _iter_json_list(b"[1, 234", chunk_size=2)
+        assert next(elements) == 1
+        assert next(elements) == 234
+        with pytest.raises(ZipkinError):
+            next(elements)
+
+    def test_iter_json_list_big_element(self):
+        encoded = json.dumps([{"a": "x" * 100000}, 1]).encode("utf-8")
+        reader = _Reader(io.BytesIO(encoded))
+
+        with mock.patch.object(reader, "read", wraps=reader.read) as mock_read:
+            elements = list(_iter_json_elements(reader, 10))
+
+        assert elements == [{"a": "x" * 100000}, 1]
+        # Reads grow with the element instead of being parsed every 10 bytes.
+        assert mock_read.call_count < 20
+
+    def test_iter_json_list_short_reads(self):
+        encoded = io.BytesIO(b'[{"a": 1}, 2]')
+        # Only the end of the input is an empty read.
+        reader = mock.Mock(read=lambda size: encoded.read(1))
+
+        assert list(_iter_json_elements(reader, 4)) == [{"a": 1}, 2]
+
+    @pytest.mark.parametrize("chunk_size", [1, 1024])
+    def test_iter_json_list_concatenated_lists(self, chunk_size):
+        encoded = b'[1, {"a": 2}]\n[] [3]\n'
+        assert list(_iter_json_list(encoded, chunk_size)) == [1, {"a": 2}, 3]
+
+    @pytest.mark.parametrize("encoded", [b"[]", b"  [ ] "])
+    def test_iter_json_list_empty(self, encoded):
+        assert list(_iter_json_list(encoded, chunk_size=1)) == []
+
+    @pytest.mark.parametrize(
+        "encoded", [b"", b"{}", b"[1 2]", b'[{"a": 1', b"[1] 2", b"[1],[2]"],
+    )
+    def test_iter_json_list_invalid(self, encoded):
+        with pytest.raises(ZipkinError):
+            list(_iter_json_list(encoded, chunk_size=2))
+
+
+def _thrift_field(ttype, field_id, value):
+    """Encodes a struct field, to add unknown fields to encoded spans."""
+    return struct.pack("!bh", ttype, field_id) + value
+
+
+def _thrift_span(annotations=(), binary_annotations=(), **kwargs):
+    span_kwargs = {
+        "span_id": "0000000000000001",
+        "parent_span_id": None,
+        "trace_id": "000000000000000f",
+        "span_name": "test_span",
+        "annotations": list(annotations),
+        "binary_annotations": list(binary_annotations),
+        "timestamp_s": None,
+        "duration_s": None,
+    }
+    span_kwargs.update(kwargs)
+    return thrift.span_to_bytes(thrift.create_span(**span_kwargs))
 
 
 class TestV1ThriftDecoder(object):
     def test_decode_spans_list(self):
+        spans, zipkin_attrs, inner_span_id, _ = generate_list_of_spans(
+            Encoding.V1_THRIFT,
+        )
+
+        inner_span, root_span = _V1ThriftDecoder().decode_spans(spans)
+
+        assert inner_span.span_id == inner_span_id
+        assert inner_span.annotations == {"ws": 1538544126.1159}
+        assert root_span.span_id == zipkin_attrs.span_id
+        assert root_span.parent_id == zipkin_attrs.parent_span_id
+        assert root_span.kind == Kind.CLIENT
+        assert root_span.tags == {"some_key": "some_value"}
+        assert root_span.remote_endpoint == Endpoint(
+            "sa_service", None, "2001:db8:85a3::8a2e:370:7334", 8888,
+        )
+
+    @pytest.mark.parametrize("encoded", [b"", b"\x0c\x00\x00", b"\x0c\x00\x00\x00"])
+    def test_decode_truncated_input(self, encoded):
+        with pytest.raises(ZipkinError):
+            _V1ThriftDecoder().decode_spans(encoded)
+
+    def test_decode_truncated_span(self):
+        encoder = get_encoder(Encoding.V1_THRIFT)
+        encoded = encoder.encode_queue([encoder.encode_span(_make_spans()[0])])
+
+        with pytest.raises(ZipkinError):
+            _V1ThriftDecoder().decode_spans(encoded[:-1])
+        with pytest.raises(ZipkinError):
+            list(_iter_thrift_spans(io.BytesIO(encoded[:-1]), chunk_size=7))
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+    def test_iter_decode_spans_from_file(self, chunk_size):
         spans, _, _, _ = generate_list_of_spans(Encoding.V1_THRIFT)
-        decoder = _V1ThriftDecoder()
-        with mock.patch.object(decoder, "_decode_thrift_span") as mock_decode:
-            decoder.decode_spans(spans)
-            assert mock_decode.call_count == 2
+
+        decoded = list(_iter_thrift_spans(io.BytesIO(spans), chunk_size))
+
+        assert decoded == _V1ThriftDecoder().decode_spans(spans)
+        assert list(_V1ThriftDecoder().iter_decode_spans(io.BytesIO(spans))) == (
+            decoded
+        )
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, None, 1024])
+    def test_iter_decode_concatenated_lists(self, chunk_size):
+        spans, _, _, _ = generate_list_of_spans(Encoding.V1_THRIFT)
+        expected = _V1ThriftDecoder().decode_spans(spans)
+        if chunk_size is None:
+            # The first list ends right at the end of the first chunk.
+            chunk_size = len(spans)
+
+        from_file = _iter_thrift_spans(io.BytesIO(spans * 2), chunk_size)
+        from_buffer = _iter_thrift_spans(spans * 2)
+
+        assert list(from_file) == expected * 2
+        assert list(from_buffer) == expected * 2
 
     def test_decode_old_style_thrift_span(self):
         """Test it can handle single thrift spans (not a list with 1 span).
@@ -60,167 +254,410 @@ class TestV1ThriftDecoder(object):
         it's a thrift list.
         """
         span = generate_single_thrift_span()
-        decoder = _V1ThriftDecoder()
-        with mock.patch.object(decoder, "_decode_thrift_span") as mock_decode:
-            decoder.decode_spans(span)
-            assert mock_decode.call_count == 1
 
-    def test__convert_from_thrift_endpoint(self, thrift_endpoint):
-        decoder = _V1ThriftDecoder()
+        decoded = _V1ThriftDecoder().decode_spans(span)
 
-        ipv4_endpoint = decoder._convert_from_thrift_endpoint(thrift_endpoint)
-        assert ipv4_endpoint == Endpoint("test_service", "10.0.0.1", None, 8888)
+        assert len(decoded) == 1
+        assert decoded[0].name == "foo"
+        assert decoded[0].kind == Kind.CLIENT
+        # cs without cr, so the duration comes from the span.
+        assert decoded[0].duration == 2.0
+        assert decoded[0].tags == {"key": "value"}
 
-        ipv6_thrift_endpoint = thrift.create_endpoint(8888, "test_service", None, "::1")
-        ipv6_endpoint = decoder._convert_from_thrift_endpoint(ipv6_thrift_endpoint)
-        assert ipv6_endpoint == Endpoint("test_service", None, "::1", 8888)
+    def test_decode_round_trip(self):
+        encoder = get_encoder(Encoding.V1_THRIFT)
+        encoded = encoder.encode_queue([encoder.encode_span(s) for s in _make_spans()])
 
-    def test__decode_thrift_annotations(self, thrift_endpoint):
-        timestamp = 1.0
-        decoder = _V1ThriftDecoder()
-        thrift_annotations = thrift.annotation_list_builder(
-            {"cs": timestamp, "cr": timestamp + 10, "my_annotation": timestamp + 15},
-            thrift_endpoint,
-        )
+        assert _V1ThriftDecoder().decode_spans(encoded) == _make_spans()
+        assert _V1ThriftDecoder().decode_spans(bytearray(encoded)) == _make_spans()
 
-        annotations, end, kind, ts, dur = decoder._decode_thrift_annotations(
-            thrift_annotations,
-        )
-        assert annotations == {"my_annotation": 16.0}
-        assert end == Endpoint("test_service", "10.0.0.1", None, 8888)
-        assert kind == Kind.CLIENT
-        assert ts == timestamp * USEC
-        assert dur == 10 * USEC
-
-    def test__decode_thrift_annotations_server_span(self, thrift_endpoint):
-        timestamp = 1.0
-        decoder = _V1ThriftDecoder()
-        thrift_annotations = thrift.annotation_list_builder(
-            {"sr": timestamp, "ss": timestamp + 10}, thrift_endpoint,
-        )
+    def test_decode_endpoints(self):
+        annotations = [
+            thrift.create_annotation(
+                1000000, "cs", thrift.create_endpoint(8888, "test_service", None),
+            ),
+            thrift.create_annotation(
+                2000000, "cr", thrift.create_endpoint(65535, None, None, "::1"),
+            ),
+        ]
+        span = _V1ThriftDecoder().decode_spans(_thrift_span(annotations))[0]
 
-        annotations, end, kind, ts, dur = decoder._decode_thrift_annotations(
-            thrift_annotations,
-        )
-        assert annotations == {}
-        assert end == Endpoint("test_service", "10.0.0.1", None, 8888)
-        assert kind == Kind.SERVER
-        assert ts == timestamp * USEC
-        assert dur == 10 * USEC
-
-    def test__decode_thrift_annotations_local_span(self, thrift_endpoint):
-        timestamp = 1.0
-        decoder = _V1ThriftDecoder()
-        thrift_annotations = thrift.annotation_list_builder(
-            {
-                "cs": timestamp,
-                "sr": timestamp,
-                "ss": timestamp + 10,
-                "cr": timestamp + 10,
-            },
-            thrift_endpoint,
-        )
+        # The last endpoint wins.
+        assert span.local_endpoint == Endpoint(None, None, "::1", 65535)
+        assert span.timestamp == 1.0
+        assert span.duration == 1.0
 
-        annotations, end, kind, ts, dur = decoder._decode_thrift_annotations(
-            thrift_annotations,
-        )
-        assert annotations == {}
-        assert end == Endpoint("test_service", "10.0.0.1", None, 8888)
-        assert kind == Kind.LOCAL
-        # ts and dur are not computed for a local span since those always have
-        # timestamp and duration set as span arguments.
-        assert ts is None
-        assert dur is None
-
-    def test__convert_from_thrift_binary_annotations(self):
-        decoder = _V1ThriftDecoder()
+    @pytest.mark.parametrize(
+        "trace_id_generator",
+        [(generate_random_64bit_string), (generate_random_128bit_string)],
+    )
+    def test_decode_ids(self, trace_id_generator):
+        trace_id = trace_id_generator()
+        span_id = generate_random_64bit_string()
+        parent_id = generate_random_64bit_string()
+
+        span = _V1ThriftDecoder().decode_spans(
+            _thrift_span(trace_id=trace_id, span_id=span_id, parent_span_id=parent_id)
+        )[0]
+
+        assert span.trace_id == trace_id
+        assert span.span_id == span_id
+        assert span.parent_id == parent_id
+
+    def test_decode_binary_annotations(self):
         local_host = thrift.create_endpoint(8888, "test_service", "10.0.0.1", None)
         remote_host = thrift.create_endpoint(9999, "rem_service", "10.0.0.2", None)
         ann_type = zipkin_core.AnnotationType
-        thrift_binary_annotations = [
-            create_binary_annotation("key1", True, ann_type.BOOL, local_host),
+        binary_annotations = [
+            create_binary_annotation("key1", b"\x01", ann_type.BOOL, local_host),
             create_binary_annotation("key2", "val2", ann_type.STRING, local_host),
-            create_binary_annotation("key3", False, ann_type.BOOL, local_host),
+            create_binary_annotation("key3", b"\x00", ann_type.BOOL, local_host),
             create_binary_annotation("key4", b"04", ann_type.I16, local_host),
-            create_binary_annotation("key5", b"0004", ann_type.I32, local_host),
-            create_binary_annotation("sa", True, ann_type.BOOL, remote_host),
+            create_binary_annotation("key5", u"再见", ann_type.STRING, None),
+            create_binary_annotation("key6", b"\xff", ann_type.STRING, None),
+            create_binary_annotation("sa", b"\x01", ann_type.BOOL, remote_host),
         ]
 
-        (
-            tags,
-            local_endpoint,
-            remote_endpoint,
-        ) = decoder._convert_from_thrift_binary_annotations(thrift_binary_annotations)
+        with mock.patch("py_zipkin.encoding._decoders.log") as mock_log:
+            span = _V1ThriftDecoder().decode_spans(
+                _thrift_span(binary_annotations=binary_annotations),
+            )[0]
 
-        assert tags == {
+        assert span.tags == {
             "key1": "true",
             "key2": "val2",
             "key3": "false",
+            "key5": u"再见",
+            # Not valid utf-8
+            "key6": b"\xff",
         }
-        assert local_endpoint == Endpoint("test_service", "10.0.0.1", None, 8888)
-        assert remote_endpoint == Endpoint("rem_service", "10.0.0.2", None, 9999)
+        assert mock_log.warning.call_count == 1
+        assert span.local_endpoint == Endpoint("test_service", "10.0.0.1", None, 8888)
+        assert span.remote_endpoint == Endpoint("rem_service", "10.0.0.2", None, 9999)
 
-    def test__convert_from_thrift_binary_annotations_unicode(self):
-        decoder = _V1ThriftDecoder()
-        local_host = thrift.create_endpoint(8888, "test_service", "10.0.0.1", None)
-        ann_type = zipkin_core.AnnotationType
-        thrift_binary_annotations = [
-            create_binary_annotation("key1", u"再见", ann_type.STRING, local_host),
-            create_binary_annotation("key2", "val2", ann_type.STRING, local_host),
-            create_binary_annotation("key3", "再见", ann_type.STRING, local_host),
-        ]
+    def test_decode_skips_unknown_fields(self):
+        endpoint = thrift.create_endpoint(8888, "test_service", "10.0.0.1", None)
+        encoded = _thrift_span(
+            [thrift.create_annotation(1000000, "ws", endpoint)], timestamp_s=1.0,
+        )
+        struct_value = _thrift_field(TType.I16, 1, b"\x00\x01") + b"\x00"
+        unknown_fields = b"".join(
+            [
+                _thrift_field(TType.BOOL, 100, b"\x01"),
+                _thrift_field(TType.DOUBLE, 101, b"\x00" * 8),
+                _thrift_field(TType.STRING, 102, b"\x00\x00\x00\x01a"),
+                _thrift_field(TType.STRUCT, 103, struct_value),
+                _thrift_field(TType.LIST, 104, b"\x08\x00\x00\x00\x01\x00\x00\x00\x01"),
+                _thrift_field(TType.SET, 105, b"\x03\x00\x00\x00\x02\x01\x02"),
+                _thrift_field(TType.MAP, 106, b"\x03\x06\x00\x00\x00\x01\x01\x00\x01"),
+                # Known field ids with unexpected types.
+                _thrift_field(TType.I32, 1, b"\x00\x00\x00\x01"),
+                _thrift_field(TType.I32, 6, b"\x00\x00\x00\x01"),
+                # Annotations that aren't structs.
+                _thrift_field(TType.LIST, 8, b"\x0b\x00\x00\x00\x01\x00\x00\x00\x00"),
+            ]
+        )
+        # Insert the unknown fields before the STOP of the span struct.
+        encoded_with_unknown_fields = encoded[:-1] + unknown_fields + b"\x00"
 
-        (
-            tags,
-            local_endpoint,
-            remote_endpoint,
-        ) = decoder._convert_from_thrift_binary_annotations(thrift_binary_annotations)
+        decoded = _V1ThriftDecoder().decode_spans(encoded_with_unknown_fields)
 
-        assert tags == {
-            "key1": u"再见",
-            "key2": "val2",
-            "key3": "再见",
-        }
-        assert local_endpoint == Endpoint("test_service", "10.0.0.1", None, 8888)
+        assert decoded == _V1ThriftDecoder().decode_spans(encoded)
+        assert decoded[0].annotations == {"ws": 1.0}
+
+    @pytest.mark.parametrize(
+        "read_struct, expected",
+        [
+            (_decoders._read_endpoint, Endpoint(None, None, None, 0)),
+            (_decoders._read_annotation, (None, None, None)),
+            (_decoders._read_binary_annotation, (None, None, None, None)),
+        ],
+    )
+    def test_structs_skip_unknown_fields(self, read_struct, expected):
+        encoded = _thrift_field(TType.BOOL, 100, b"\x01") + b"\x00"
+
+        assert read_struct(memoryview(encoded), 0) == (expected, len(encoded))
+
+    @pytest.mark.parametrize(
+        "field",
+        [
+            _thrift_field(TType.VOID, 100, b""),
+            _thrift_field(TType.STRING, 100, b"\xff\xff\xff\xff"),
+        ],
+    )
+    def test_decode_invalid_fields(self, field):
+        encoded = _thrift_span()
+
+        with pytest.raises(ZipkinError):
+            _V1ThriftDecoder().decode_spans(encoded[:-1] + field + b"\x00")
+
+    def test_endpoint_cache_is_bounded(self):
+        encoded = _thrift_span(
+            [
+                thrift.create_annotation(1, "a", thrift.create_endpoint(1, "a")),
+                thrift.create_annotation(2, "b", thrift.create_endpoint(2, "b")),
+            ]
+        )
+        with mock.patch.dict(_decoders._ENDPOINT_CACHE, clear=True):
+            with mock.patch.object(_decoders, "_ENDPOINT_CACHE_MAX_SIZE", 1):
+                span = _V1ThriftDecoder().decode_spans(encoded)[0]
+
+                assert list(_decoders._ENDPOINT_CACHE.values()) == [
+                    span.local_endpoint,
+                ]
 
     def test_seconds_doesnt_crash_with_none(self):
         decoder = _V1ThriftDecoder()
         assert decoder.seconds(6000000) == 6.0
         assert decoder.seconds(None) is None
 
-    @pytest.mark.parametrize(
-        "trace_id_generator",
-        [(generate_random_64bit_string), (generate_random_128bit_string)],
+
+def _make_spans():
+    local_endpoint = create_endpoint(8080, "test_service", "10.0.0.1")
+    remote_endpoint = create_endpoint(8888, "remote_service", "2001:db8::1")
+    return [
+        Span(
+            trace_id="000000000000000f",
+            name="client_span",
+            parent_id="0000000000000002",
+            span_id="0000000000000001",
+            kind=Kind.CLIENT,
+            timestamp=26.0,
+            duration=4.0,
+            local_endpoint=local_endpoint,
+            remote_endpoint=remote_endpoint,
+            annotations={"ws": 27.5},
+            tags={"key": "value"},
+        ),
+        Span(
+            trace_id="000000000000000f",
+            name="server_span",
+            parent_id=None,
+            span_id="0000000000000003",
+            kind=Kind.SERVER,
+            timestamp=26.0,
+            duration=4.0,
+            local_endpoint=local_endpoint,
+            shared=True,
+        ),
+        Span(
+            trace_id="000000000000000f",
+            name="local_span",
+            parent_id=None,
+            span_id="0000000000000004",
+            kind=Kind.LOCAL,
+            timestamp=26.0,
+            duration=4.0,
+            local_endpoint=local_endpoint,
+            tags={"a": "b"},
+        ),
+    ]
+
+
+@pytest.mark.parametrize("encoding", [Encoding.V1_JSON, Encoding.V2_JSON])
+def test_json_decoders_round_trip(encoding):
+    encoder = get_encoder(encoding)
+    encoded = encoder.encode_queue([encoder.encode_span(s) for s in _make_spans()])
+    decoder = get_decoder(encoding)
+
+    assert decoder.decode_spans(encoded) == _make_spans()
+    assert decoder.decode_spans(encoded.encode("utf-8")) == _make_spans()
+    assert list(decoder.iter_decode_spans(io.BytesIO(encoded.encode()))) == (
+        _make_spans()
     )
-    def test__convert_trace_id_to_string(self, trace_id_generator):
-        decoder = _V1ThriftDecoder()
-        trace_id = trace_id_generator()
-        span = thrift.create_span(
-            generate_random_64bit_string(),
-            None,
-            trace_id,
-            "test_span",
-            [],
-            [],
-            None,
-            None,
+
+
+@pytest.mark.parametrize(
+    "us, seconds",
+    [
+        (None, None),
+        (1538544126115900, 1538544126.1159),
+        (1500000.0, 1.5),
+        # Too big to skip rounding, which is off by 1us here.
+        (7263671176648988, 7263671176.648989),
+    ],
+)
+def test_seconds(us, seconds):
+    assert _decoders._seconds(us) == seconds
+
+
+def test_json_decoders_share_endpoints():
+    encoder = get_encoder(Encoding.V2_JSON)
+    encoded = encoder.encode_queue([encoder.encode_span(s) for s in _make_spans()])
+
+    spans = _V2JSONDecoder().decode_spans(encoded)
+
+    assert spans[0].local_endpoint is spans[1].local_endpoint
+
+
+def test_v2_json_decoder_invalid_kind():
+    encoded = '[{"traceId": "000000000000000f", "id": "01", "kind": "FOO"}]'
+
+    with pytest.raises(ValueError):
+        _V2JSONDecoder().decode_spans(encoded)
+
+
+class TestV1JSONDecoder(object):
+    def test_decode_binary_annotations(self):
+        encoded = json.dumps(
+            [
+                {
+                    "traceId": "000000000000000f",
+                    "id": "0000000000000001",
+                    "name": "",
+                    "timestamp": 1000000,
+                    "duration": 10,
+                    "annotations": [{"value": "cs", "timestamp": 1000000}],
+                    "binaryAnnotations": [
+                        {"key": "bool", "value": False},
+                        {"key": "int", "value": 42},
+                        {"key": "str", "value": "x", "endpoint": {"ipv4": "1.2.3.4"}},
+                        {"key": "ca", "value": True, "endpoint": {"port": 1}},
+                    ],
+                }
+            ]
         )
-        assert (
-            decoder._convert_trace_id_to_string(span.trace_id, span.trace_id_high)
-            == trace_id
+
+        span = _V1JSONDecoder().decode_spans(encoded)[0]
+
+        assert span.name is None
+        assert span.kind == Kind.CLIENT
+        assert span.timestamp == 1.0
+        # cs without cr, so the duration comes from the span.
+        assert span.duration == 0.00001
+        assert span.tags == {"bool": "false", "int": "42", "str": "x"}
+        assert span.local_endpoint == Endpoint(None, "1.2.3.4", None, 0)
+        assert span.remote_endpoint == Endpoint(None, None, None, 1)
+
+    def test_decode_server_span_without_ss(self):
+        encoded = (
+            '[{"traceId": "000000000000000f", "id": "0000000000000001", '
+            '"annotations": [{"value": "sr", "timestamp": 2000000}]}]'
         )
 
-    def test__convert_unsigned_long_to_lower_hex(self):
-        decoder = _V1ThriftDecoder()
-        span_id = generate_random_64bit_string()
-        span = thrift.create_span(
-            span_id,
-            None,
-            generate_random_64bit_string(),
-            "test_span",
-            [],
-            [],
-            None,
-            None,
+        span = _V1JSONDecoder().decode_spans(encoded)[0]
+
+        assert span.kind == Kind.SERVER
+        assert span.timestamp == 2.0
+        assert span.duration is None
+        assert span.shared is True
+
+
+def _proto_field(field_number, wire_type, value):
+    """Encodes a message field, to add unknown fields to encoded spans."""
+    if wire_type == 2:
+        value = protobuf_wire.encode_varint(len(value)) + value
+    return protobuf_wire.encode_varint((field_number << 3) | wire_type) + value
+
+
+def _proto_list(*encoded_spans):
+    return b"".join(_proto_field(1, 2, span) for span in encoded_spans)
+
+
+class TestV2ProtobufDecoder(object):
+    def test_decode_round_trip(self):
+        encoded = protobuf_wire.encode_list_of_spans(_make_spans())
+        decoder = _V2ProtobufDecoder()
+
+        assert decoder.decode_spans(encoded) == _make_spans()
+        assert decoder.decode_spans(bytearray(encoded)) == _make_spans()
+        assert decoder.decode_spans(b"") == []
+
+    def test_decode_protobuf_runtime_output(self):
+        spans = _make_spans()
+        spans[0].debug = True
+        spans[1].kind = Kind.CONSUMER
+        spans[2].kind = Kind.PRODUCER
+        spans[2].local_endpoint = create_endpoint(0, None, None, False)
+        spans[2].annotations[u"ä"] = 28.0
+        spans[2].tags[u"ü"] = u"é"
+        encoded = protobuf.encode_pb_list(
+            [protobuf.create_protobuf_span(span) for span in spans],
         )
-        assert decoder._convert_unsigned_long_to_lower_hex(span.id) == span_id
+
+        assert _V2ProtobufDecoder().decode_spans(encoded) == spans
+
+    def test_iter_decode_spans_from_file(self):
+        encoded = protobuf_wire.encode_list_of_spans(_make_spans())
+        # Spans smaller than the biggest possible span header.
+        shared_spans = _proto_list(b"\x68\x01", b"\x68\x01")
+
+        decoder = _V2ProtobufDecoder()
+        decoded = list(decoder.iter_decode_spans(io.BytesIO(encoded)))
+        decoded_shared_spans = list(decoder.iter_decode_spans(io.BytesIO(shared_spans)))
+
+        assert decoded == _make_spans()
+        assert [span.shared for span in decoded_shared_spans] == [True, True]
+
+    @pytest.mark.parametrize(
+        "encoded",
+        [
+            b"\x0a",
+            b"\x0a\x05\x68\x01",
+            # Not a ListOfSpans
+            b"\x12\x00",
+        ],
+    )
+    def test_decode_invalid_list(self, encoded):
+        with pytest.raises(ZipkinError):
+            _V2ProtobufDecoder().decode_spans(encoded)
+        with pytest.raises(ZipkinError):
+            list(_V2ProtobufDecoder().iter_decode_spans(io.BytesIO(encoded)))
+
+    def test_decode_skips_unknown_fields(self):
+        unknown_fields = b"".join(
+            [
+                _proto_field(100, 0, b"\x01"),
+                _proto_field(101, 1, b"\x00" * 8),
+                _proto_field(102, 2, b"abc"),
+                _proto_field(103, 5, b"\x00" * 4),
+            ]
+        )
+        span = _make_spans()[0]
+        endpoint = protobuf_wire.encode_endpoint(span.local_endpoint)
+        encoded = b"".join(
+            [
+                protobuf_wire.encode_span(span),
+                _proto_field(8, 2, endpoint + unknown_fields),
+                _proto_field(10, 2, _proto_field(2, 2, b"a") + unknown_fields),
+                _proto_field(11, 2, _proto_field(1, 2, b"b") + unknown_fields),
+                _proto_field(4, 0, b"\x63"),
+                unknown_fields,
+            ]
+        )
+
+        decoded = _V2ProtobufDecoder().decode_spans(_proto_list(encoded))[0]
+
+        assert decoded.local_endpoint == span.local_endpoint
+        assert decoded.annotations == {"ws": 27.5, "a": 0.0}
+        assert decoded.tags == {"key": "value", "b": ""}
+        # Unknown kinds are decoded as local spans.
+        assert decoded.kind == Kind.LOCAL
+
+    @pytest.mark.parametrize(
+        "encoded_span",
+        [
+            # Unknown wire type
+            _proto_field(100, 3, b""),
+            # Nested field longer than the span.
+            _proto_field(8, 2, b"\x0a\x05ab"),
+            # Fixed64 field longer than the span.
+            _proto_field(6, 1, b"\x00" * 4),
+            _proto_field(10, 2, _proto_field(1, 1, b"\x00" * 4)),
+        ],
+    )
+    def test_decode_invalid_span(self, encoded_span):
+        with pytest.raises(ZipkinError):
+            _V2ProtobufDecoder().decode_spans(_proto_list(encoded_span))
+        # Fields must not overflow into the next span either.
+        with pytest.raises(ZipkinError):
+            _V2ProtobufDecoder().decode_spans(
+                _proto_list(encoded_span, b"\x68\x01\x68\x01"),
+            )
+
+    def test_endpoints_are_shared(self):
+        encoded = protobuf_wire.encode_list_of_spans(_make_spans())
+
+        spans = _V2ProtobufDecoder().decode_spans(encoded)
+
+        assert spans[0].local_endpoint is spans[2].local_endpoint
@@ -1,12 +1,19 @@
+import json
 import socket
+import sys
 
 import mock
 import pytest
+from thriftpy2.protocol import TBinaryProtocol
+from thriftpy2.transport import TMemoryBuffer
 
 from py_zipkin import Encoding
 from py_zipkin import thrift
+from py_zipkin.encoding import _encoders
+from py_zipkin.encoding import protobuf
 from py_zipkin.encoding._encoders import _V1JSONEncoder
 from py_zipkin.encoding._encoders import _V1ThriftEncoder
+from py_zipkin.encoding._encoders import _V2FastJSONEncoder
 from py_zipkin.encoding._encoders import _V2JSONEncoder
 from py_zipkin.encoding._encoders import _V2ProtobufEncoder
 from py_zipkin.encoding._encoders import get_encoder
@@ -71,7 +78,7 @@ def test_malformed_host():
 def test_encoder():
     assert isinstance(get_encoder(Encoding.V1_THRIFT), _V1ThriftEncoder)
     assert isinstance(get_encoder(Encoding.V1_JSON), _V1JSONEncoder)
-    assert isinstance(get_encoder(Encoding.V2_JSON), _V2JSONEncoder)
+    assert isinstance(get_encoder(Encoding.V2_JSON), _V2FastJSONEncoder)
     assert isinstance(get_encoder(Encoding.V2_PROTO3), _V2ProtobufEncoder)
     with pytest.raises(ZipkinError):
         get_encoder(None)
@@ -179,37 +186,94 @@ class TestV1JSONEncoder(object):
 
 
 class TestV1ThriftEncoder(object):
-    def test_remote_endpoint(self):
+    @pytest.mark.parametrize("kind,key", [(Kind.SERVER, "ca"), (Kind.CLIENT, "sa")])
+    def test_remote_endpoint(self, kind, key):
         encoder = get_encoder(Encoding.V1_THRIFT)
         remote_endpoint = create_endpoint(service_name="test_server", host="127.0.0.1")
+        span = Span(
+            "1",
+            "name",
+            None,
+            "2",
+            kind,
+            10,
+            10,
+            local_endpoint=create_endpoint(8080, "test_service", "10.0.0.1"),
+            remote_endpoint=remote_endpoint,
+        )
 
-        # For server spans, the remote endpoint is encoded as 'ca'
-        binary_annotations = thrift.binary_annotation_list_builder({}, None)
-        encoder.encode_remote_endpoint(
-            remote_endpoint, Kind.SERVER, binary_annotations,
+        thrift_span = thrift.zipkin_core.Span()
+        thrift_span.read(
+            TBinaryProtocol(TMemoryBuffer(encoder.encode_span(span))),
         )
-        assert binary_annotations == [
+
+        # For server spans, the remote endpoint is encoded as 'ca' and for
+        # client spans as 'sa'.
+        assert thrift_span.binary_annotations == [
             thrift.create_binary_annotation(
-                key="ca",
-                value=thrift.SERVER_ADDR_VAL,
+                key=key,
+                value=thrift.SERVER_ADDR_VAL.encode(),
                 annotation_type=thrift.zipkin_core.AnnotationType.BOOL,
                 host=thrift.create_endpoint(0, "test_server", "127.0.0.1", None),
             )
         ]
 
-        # For client spans, the remote endpoint is encoded as 'sa'
-        binary_annotations = thrift.binary_annotation_list_builder({}, None)
-        encoder.encode_remote_endpoint(
-            remote_endpoint, Kind.CLIENT, binary_annotations,
-        )
-        assert binary_annotations == [
-            thrift.create_binary_annotation(
-                key="sa",
-                value=thrift.SERVER_ADDR_VAL,
-                annotation_type=thrift.zipkin_core.AnnotationType.BOOL,
-                host=thrift.create_endpoint(0, "test_server", "127.0.0.1", None),
-            )
+
+class TestV2FastJSONEncoder(object):
+    @pytest.mark.parametrize(
+        "span",
+        [
+            Span("1", None, None, "3", Kind.LOCAL, None, None),
+            Span(
+                "0123456789abcdef0123456789abcdef",
+                "name",
+                "2",
+                "3",
+                Kind.CLIENT,
+                1538544126.1159,
+                0.000123,
+                local_endpoint=create_endpoint(8080, "test_server", "10.0.0.1"),
+                remote_endpoint=create_endpoint(
+                    0, None, "2001:0db8:85a3:0000:0000:8a2e:0370:7334", False,
+                ),
+                tags={"key": "value", 42: True, "quote\"": u"caf\xe9\n"},
+                annotations={"ws": 1538544126.1159, u"\u2603": 1538544126.2},
+            ),
+            Span(
+                "1",
+                u"na\xefve \"name\"",
+                None,
+                "3",
+                Kind.SERVER,
+                10,
+                20,
+                shared=True,
+                local_endpoint=create_endpoint(0, u"sv\xe7", "127.0.0.1"),
+                tags={},
+                annotations={42: 10},
+            ),
+        ],
+    )
+    def test_encode_span_matches_json_encoder(self, span):
+        expected = _V2JSONEncoder().encode_span(span)
+        encoded = [
+            _V2FastJSONEncoder().encode_span(span),
+            # Again, now that the endpoints are cached.
+            _V2FastJSONEncoder().encode_span(span),
         ]
+        if sys.version_info >= (3, 7):
+            assert encoded == [expected, expected]
+        else:
+            # Dicts aren't ordered, so only the decoded JSON is the same.
+            assert [json.loads(e) for e in encoded] == [json.loads(expected)] * 2
+
+    def test_endpoint_cache_is_bounded(self):
+        encoder = _V2FastJSONEncoder()
+        with mock.patch.dict(_encoders._JSON_ENDPOINT_CACHE, clear=True):
+            with mock.patch.object(_encoders, "_JSON_ENDPOINT_CACHE_MAX_SIZE", 1):
+                encoder._json_endpoint(create_endpoint(1, "a", "127.0.0.1"))
+                encoder._json_endpoint(create_endpoint(2, "b", "127.0.0.1"))
+                assert len(_encoders._JSON_ENDPOINT_CACHE) == 1
 
 
 class TestV2ProtobufEncoder(object):
@@ -226,17 +290,19 @@ class TestV2ProtobufEncoder(object):
         assert encoder.fits(None, span_len, span_len * 2, pb_span) is True
         assert encoder.fits(None, span_len + 1, span_len * 2, pb_span) is False
 
-    @mock.patch("py_zipkin.encoding.protobuf.installed", autospec=True)
-    def test_encode_span(self, mock_installed, encoder):
+    def test_encode_span(self, encoder):
         span = Span("1", "name", "2", "3", Kind.CLIENT, 10, 10)
 
-        mock_installed.return_value = False
-        with pytest.raises(ZipkinError):
-            encoder.encode_span(span)
-
-        mock_installed.return_value = True
         pb_span = encoder.encode_span(span)
         assert isinstance(pb_span, bytes)
+        assert pb_span == protobuf.encode_pb_list([protobuf.create_protobuf_span(span)])
+
+    def test_encode_span_without_protobuf_installed(self, encoder):
+        span = Span("1", "name", "2", "3", Kind.CLIENT, 10, 10)
+        expected = encoder.encode_span(span)
+
+        with mock.patch.object(protobuf, "zipkin_pb2", None):
+            assert encoder.encode_span(span) == expected
 
     def test_encode_queue(self, encoder):
         span = Span("1", "name", "2", "3", Kind.CLIENT, 10, 10)
@@ -3,6 +3,9 @@ import socket
 import mock
 import pytest
 
+from py_zipkin.encoding import _helpers
+from py_zipkin.encoding._helpers import clear_endpoint_cache
+from py_zipkin.encoding._helpers import create_cached_endpoint
 from py_zipkin.encoding._helpers import create_endpoint
 from py_zipkin.encoding._helpers import Span
 from py_zipkin.encoding._types import Kind
@@ -57,6 +60,72 @@ def test_create_span_with_bad_remote_endpoint():
     assert "Invalid remote_endpoint value. Must be of type Endpoint." in str(e.value)
 
 
+def _make_span(**kwargs):
+    return Span(
+        trace_id="000000000000000f",
+        name="test span",
+        parent_id=None,
+        span_id="0000000000000001",
+        kind=Kind.LOCAL,
+        timestamp=26.0,
+        duration=4.0,
+        **kwargs
+    )
+
+
+def test_span_has_no_dict():
+    span = _make_span()
+
+    assert not hasattr(span, "__dict__")
+    with pytest.raises(AttributeError):
+        span.foo = "bar"
+
+
+def test_span_annotations_and_tags_are_lazy():
+    span = _make_span(annotations={}, tags={})
+    assert span._annotations is None
+    assert span._tags is None
+
+    span.tags["key"] = "value"
+    span.annotations["ws"] = 27.0
+
+    assert span.tags == {"key": "value"}
+    assert span.annotations == {"ws": 27.0}
+
+    span.tags = {"other": "value"}
+    span.annotations = {"wr": 28.0}
+    assert span._tags == {"other": "value"}
+    assert span._annotations == {"wr": 28.0}
+
+
+def test_span_equality():
+    span = _make_span(tags={"key": "value"})
+
+    assert span == _make_span(tags={"key": "value"})
+    assert not span != _make_span(tags={"key": "value"})
+    assert span != _make_span(tags={"key": "other"})
+    assert span != _make_span(tags={"key": "value"}, shared=True)
+    assert span != "not a span"
+    assert not span == "not a span"
+    # Comparing doesn't allocate the missing annotations.
+    assert span == _make_span(annotations={}, tags={"key": "value"})
+    assert span._annotations is None
+
+
+def test_span_is_not_hashable():
+    with pytest.raises(TypeError):
+        hash(_make_span())
+
+
+def test_span_repr():
+    assert repr(_make_span(tags={"key": "value"})) == (
+        "Span(annotations={}, debug=False, duration=4.0, kind=<Kind.LOCAL: None>, "
+        "local_endpoint=None, name='test span', parent_id=None, "
+        "remote_endpoint=None, shared=False, span_id='0000000000000001', "
+        "tags={'key': 'value'}, timestamp=26.0, trace_id='000000000000000f')"
+    )
+
+
 @mock.patch("socket.gethostbyname", autospec=True)
 def test_create_endpoint_defaults_service_name(gethostbyname):
     gethostbyname.return_value = "0.0.0.0"
@@ -106,3 +175,42 @@ def test_malformed_host():
     assert endpoint.port == 8080
     assert endpoint.ipv4 is None
     assert endpoint.ipv6 is None
+
+
+@mock.patch("socket.gethostbyname", autospec=True)
+def test_create_cached_endpoint(gethostbyname):
+    gethostbyname.return_value = "1.2.3.4"
+
+    endpoint = create_cached_endpoint(port=8080, service_name="foo")
+    assert endpoint == create_endpoint(port=8080, service_name="foo")
+    gethostbyname.reset_mock()
+
+    assert create_cached_endpoint(port=8080, service_name="foo") is endpoint
+    assert gethostbyname.call_count == 0
+
+    # Different parameters get a different endpoint
+    other_endpoint = create_cached_endpoint(port=8080, service_name="bar")
+    assert other_endpoint.service_name == "bar"
+    assert gethostbyname.call_count == 1
+
+
+@mock.patch("socket.gethostbyname", autospec=True)
+def test_clear_endpoint_cache(gethostbyname):
+    gethostbyname.return_value = "1.2.3.4"
+    assert create_cached_endpoint(service_name="foo").ipv4 == "1.2.3.4"
+
+    gethostbyname.return_value = "4.3.2.1"
+    assert create_cached_endpoint(service_name="foo").ipv4 == "1.2.3.4"
+
+    clear_endpoint_cache()
+    assert create_cached_endpoint(service_name="foo").ipv4 == "4.3.2.1"
+
+
+def test_create_cached_endpoint_is_bounded():
+    with mock.patch.object(_helpers, "_ENDPOINT_CACHE_MAX_SIZE", 2):
+        create_cached_endpoint(service_name="foo", host="127.0.0.1")
+        create_cached_endpoint(service_name="bar", host="127.0.0.1")
+        assert len(_helpers._ENDPOINT_CACHE) == 2
+
+        create_cached_endpoint(service_name="baz", host="127.0.0.1")
+        assert len(_helpers._ENDPOINT_CACHE) == 1
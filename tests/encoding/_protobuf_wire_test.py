@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import mock
+import pytest
+
+from py_zipkin.encoding import protobuf
+from py_zipkin.encoding._helpers import create_endpoint
+from py_zipkin.encoding._helpers import Span
+from py_zipkin.encoding._types import Kind
+from py_zipkin.encoding.protobuf import _wire
+from py_zipkin.exception import ZipkinError
+
+
+def _pb_encode(spans):
+    return protobuf.encode_pb_list([protobuf.create_protobuf_span(s) for s in spans])
+
+
+@pytest.mark.parametrize(
+    "span",
+    [
+        Span("1", "name", "2", "3", Kind.CLIENT, 10, 10),
+        Span("1", None, None, "3", Kind.LOCAL, None, None),
+        Span(
+            "0123456789abcdef0123456789abcdef",
+            u"n\xe4me",
+            None,
+            "ffffffffffffffff",
+            Kind.SERVER,
+            1538544126.1159,
+            0.000123,
+            local_endpoint=create_endpoint(8080, "service1", "10.0.0.1"),
+            remote_endpoint=create_endpoint(
+                0, None, "2001:0db8:85a3:0000:0000:8a2e:0370:7334", False,
+            ),
+            annotations={"ws": 1538544126.1159, "": 0},
+            tags={"key": "value", "": "", "empty": ""},
+            debug=True,
+            shared=True,
+        ),
+        Span(
+            "1",
+            "name",
+            None,
+            "3",
+            Kind.PRODUCER,
+            0.0000001,
+            0.0000001,
+            local_endpoint=create_endpoint(0, None, None, False),
+        ),
+        Span(
+            "1",
+            "name",
+            None,
+            "3",
+            Kind.CONSUMER,
+            10,
+            10,
+            local_endpoint=create_endpoint(65535, "service1", "127.0.0.1"),
+        ),
+    ],
+)
+def test_encode_list_of_spans_matches_protobuf(span):
+    assert _wire.encode_list_of_spans([span]) == _pb_encode([span])
+
+
+def test_encode_list_of_spans_multiple_spans():
+    spans = [
+        Span("1", "name", "2", "3", Kind.CLIENT, 10, 10),
+        Span("4", "name", "5", "6", Kind.SERVER, 10, 10),
+    ]
+    assert _wire.encode_list_of_spans(spans) == _pb_encode(spans)
+    assert _wire.encode_list_of_spans(spans) == b"".join(
+        _wire.encode_list_of_spans([s]) for s in spans
+    )
+
+
+def test_encode_tags_are_stringified():
+    span = Span("1", "name", "2", "3", Kind.CLIENT, 10, 10, tags={"code": 200})
+    str_span = Span("1", "name", "2", "3", Kind.CLIENT, 10, 10, tags={"code": "200"})
+    assert _wire.encode_list_of_spans([span]) == _pb_encode([str_span])
+
+
+@pytest.mark.parametrize(
+    "value,encoded",
+    [
+        (0, b"\x00"),
+        (1, b"\x01"),
+        (127, b"\x7f"),
+        (128, b"\x80\x01"),
+        (300, b"\xac\x02"),
+        (2 ** 64 - 1, b"\xff\xff\xff\xff\xff\xff\xff\xff\xff\x01"),
+        (-1, b"\xff\xff\xff\xff\xff\xff\xff\xff\xff\x01"),
+    ],
+)
+def test_encode_varint(value, encoded):
+    assert _wire.encode_varint(value) == encoded
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 300, 2 ** 63, 2 ** 64 - 1])
+def test_decode_varint(value):
+    encoded = b"\x00" + _wire.encode_varint(value) + b"\x00"
+
+    assert _wire.decode_varint(memoryview(encoded), 1) == (value, len(encoded) - 1)
+
+
+def test_decode_varint_invalid():
+    with pytest.raises(IndexError):
+        _wire.decode_varint(b"\x80\x80", 0)
+    with pytest.raises(ZipkinError):
+        _wire.decode_varint(b"\xff" * 11, 0)
+
+
+def test_hex_to_bytes():
+    for hex_id in (
+        "6e611a263bd498a",
+        "5c72e322656b5346e611a263bd498a",
+        "325c72e322656b5346e611a263bd498a",
+    ):
+        assert _wire.hex_to_bytes(hex_id) == protobuf._hex_to_bytes(hex_id)
+
+
+def test_endpoint_cache_is_bounded():
+    with mock.patch.dict(_wire._ENDPOINT_CACHE, clear=True):
+        with mock.patch.object(_wire, "_ENDPOINT_CACHE_MAX_SIZE", 1):
+            _wire.encode_endpoint(create_endpoint(1, "a", "127.0.0.1"))
+            endpoint = create_endpoint(2, "b", "127.0.0.1")
+            encoded = _wire.encode_endpoint(endpoint)
+            assert _wire._ENDPOINT_CACHE == {endpoint: encoded}
+            assert _wire.encode_endpoint(endpoint) is encoded
+
+
+def test_encode_bytes_strings():
+    span = Span("1", b"name", "2", "3", Kind.CLIENT, 10, 10)
+    str_span = Span("1", "name", "2", "3", Kind.CLIENT, 10, 10)
+    assert _wire.encode_list_of_spans([span]) == _pb_encode([str_span])
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+
+import pytest
+
+from py_zipkin.encoding._decoders import _iter_thrift_spans
+from py_zipkin.encoding._decoders import get_decoder
+from py_zipkin.encoding._encoders import get_encoder
+from py_zipkin.encoding._helpers import create_endpoint
+from py_zipkin.encoding._helpers import Span
+from py_zipkin.encoding._transcoders import get_transcoder
+from py_zipkin.encoding._transcoders import ITranscoder
+from py_zipkin.encoding._types import Encoding
+from py_zipkin.encoding._types import Kind
+from tests.test_helpers import generate_list_of_spans
+
+DIRECT_CONVERSIONS = [
+    (Encoding.V1_THRIFT, Encoding.V2_JSON),
+    (Encoding.V1_THRIFT, Encoding.V2_PROTO3),
+    (Encoding.V2_JSON, Encoding.V2_PROTO3),
+]
+
+
+def test_itranscoder_throws_not_implemented_errors():
+    transcoder = ITranscoder()
+    with pytest.raises(NotImplementedError):
+        transcoder.transcode_spans(b"[]")
+    with pytest.raises(NotImplementedError):
+        transcoder.iter_transcode_spans(b"[]")
+
+
+def _make_spans():
+    local_endpoint = create_endpoint(8080, "test_service", "10.0.0.1")
+    remote_endpoint = create_endpoint(8888, u"r\xe9mote", "2001:db8::1")
+    return [
+        Span(
+            trace_id="0123456789abcdef0123456789abcdef",
+            name=u"n\xe4me",
+            parent_id="0000000000000002",
+            span_id="ffffffffffffffff",
+            kind=Kind.CLIENT,
+            # Microseconds that don't survive the float conversion as-is.
+            timestamp=1538544126.115901,
+            duration=0.000123,
+            local_endpoint=local_endpoint,
+            remote_endpoint=remote_endpoint,
+            annotations={"ws": 1538544126.116, "": 0.000001, u"\xe9": 26.5},
+            tags={"key": "value", "": "", u"k\xe9y": u"v\xe4lue"},
+        ),
+        Span(
+            trace_id="000000000000000f",
+            name="server_span",
+            parent_id=None,
+            span_id="0000000000000003",
+            kind=Kind.SERVER,
+            timestamp=26.0,
+            duration=4.0,
+            local_endpoint=local_endpoint,
+            remote_endpoint=remote_endpoint,
+            shared=True,
+        ),
+        Span(
+            trace_id="000000000000000f",
+            name=None,
+            parent_id=None,
+            span_id="0000000000000004",
+            kind=Kind.LOCAL,
+            timestamp=26.0,
+            duration=0.0000001,
+            local_endpoint=create_endpoint(0, None, None, False),
+            debug=True,
+        ),
+    ]
+
+
+def _encode(spans, encoding):
+    encoder = get_encoder(encoding)
+    encoded = encoder.encode_queue([encoder.encode_span(span) for span in spans])
+    if isinstance(encoded, bytes):
+        return encoded
+    return encoded.encode("utf-8")
+
+
+def _convert_through_span_objects(spans, input_encoding, output_encoding):
+    encoder = get_encoder(output_encoding)
+    return encoder.encode_queue(
+        [
+            encoder.encode_span(span)
+            for span in get_decoder(input_encoding).decode_spans(spans)
+        ]
+    )
+
+
+@pytest.mark.parametrize("input_encoding,output_encoding", DIRECT_CONVERSIONS)
+def test_transcode_spans_same_as_decoding_and_encoding(
+    input_encoding, output_encoding,
+):
+    spans = _encode(_make_spans(), input_encoding)
+    generated_spans, _, _, _ = generate_list_of_spans(input_encoding)
+    if not isinstance(generated_spans, bytes):
+        generated_spans = generated_spans.encode("utf-8")
+    transcoder = get_transcoder(input_encoding, output_encoding)
+    encoder = get_encoder(output_encoding)
+
+    for encoded in [spans, generated_spans]:
+        expected = _convert_through_span_objects(
+            encoded, input_encoding, output_encoding,
+        )
+        assert encoder.encode_queue(transcoder.transcode_spans(encoded)) == expected
+        assert (
+            encoder.encode_queue(
+                list(transcoder.iter_transcode_spans(io.BytesIO(encoded))),
+            )
+            == expected
+        )
+
+
+@pytest.mark.parametrize("output_encoding", [Encoding.V2_JSON, Encoding.V2_PROTO3])
+@pytest.mark.parametrize("chunk_size", [1, 7])
+def test_v1_thrift_transcoders_from_file(output_encoding, chunk_size):
+    spans = _encode(_make_spans(), Encoding.V1_THRIFT)
+    transcoder = get_transcoder(Encoding.V1_THRIFT, output_encoding)
+
+    transcoded = _iter_thrift_spans(
+        io.BytesIO(spans), chunk_size, read_span=transcoder._read_span,
+    )
+
+    assert list(transcoded) == transcoder.transcode_spans(spans)
+
+
+def test_v2_json_to_v2_proto3_transcoder():
+    json_spans = [
+        {
+            "traceId": "1",
+            "id": "2",
+            "parentId": "",
+            "kind": "PRODUCER",
+            "name": "",
+            "timestamp": 1.5e15,
+            "duration": 0,
+            "remoteEndpoint": {"serviceName": "kafka"},
+            "annotations": [
+                {"value": "a", "timestamp": 10},
+                # Same as the V2_JSON decoder, the last one wins.
+                {"value": "a", "timestamp": 9007199254740993},
+            ],
+            "debug": True,
+            "shared": True,
+        },
+    ]
+    spans = json.dumps(json_spans)
+    transcoder = get_transcoder(Encoding.V2_JSON, Encoding.V2_PROTO3)
+
+    assert b"".join(transcoder.transcode_spans(spans)) == (
+        _convert_through_span_objects(spans, Encoding.V2_JSON, Encoding.V2_PROTO3)
+    )
+
+
+@pytest.mark.parametrize(
+    "input_encoding,output_encoding",
+    [
+        (Encoding.V1_JSON, Encoding.V2_JSON),
+        (Encoding.V2_JSON, Encoding.V1_THRIFT),
+        (Encoding.V2_PROTO3, Encoding.V2_JSON),
+        (Encoding.V1_THRIFT, Encoding.V1_JSON),
+    ],
+)
+def test_get_transcoder_without_direct_conversion(input_encoding, output_encoding):
+    assert get_transcoder(input_encoding, output_encoding) is None
@@ -1,3 +1,5 @@
+import json
+
 import mock
 import pytest
 
@@ -9,6 +11,7 @@ from py_zipkin.encoding._helpers import create_endpoint
 from py_zipkin.encoding._helpers import Endpoint
 from py_zipkin.encoding._helpers import Span
 from py_zipkin.exception import ZipkinError
+from py_zipkin.reporter import AsyncReporter
 from py_zipkin.zipkin import ZipkinAttrs
 from tests.test_helpers import MockEncoder
 from tests.test_helpers import MockTracer
@@ -181,9 +184,12 @@ def test_zipkin_logging_server_context_emit_spans_with_firehose(
     time_mock.return_value = 42
 
     context.emit_spans()
+    # Each span is sent to the firehose and to the transport handler in turn.
     call_args = add_span_mock.call_args_list
-    firehose_client_log_call, client_log_call = call_args[0], call_args[2]
-    firehose_server_log_call, server_log_call = call_args[1], call_args[3]
+    firehose_client_log_call, client_log_call = call_args[0], call_args[1]
+    firehose_server_log_call, server_log_call = call_args[2], call_args[3]
+    assert server_log_call[0][1] is firehose_server_log_call[0][1]
+    assert server_log_call[0][2] is firehose_server_log_call[0][2]
     assert (
         server_log_call[0][1].build_v1_span()
         == firehose_server_log_call[0][1].build_v1_span()
@@ -333,6 +339,55 @@ def test_batch_sender_add_span_not_sampled_with_firehose(
     assert flush_mock.call_count == 1
 
 
+def test_emit_spans_encodes_spans_once_with_firehose(fake_endpoint):
+    tracer = MockTracer()
+    tracer.get_spans().append(
+        Span(
+            trace_id="000000000000000f",
+            name="child",
+            parent_id="0000000000000002",
+            span_id="0000000000000003",
+            kind=Kind.LOCAL,
+            timestamp=26.0,
+            duration=4.0,
+            local_endpoint=create_endpoint(service_name="test_server"),
+        )
+    )
+    transport = MockTransportHandler()
+    firehose = MockTransportHandler(max_payload_bytes=300)
+    context = logging_helper.ZipkinLoggingContext(
+        zipkin_attrs=ZipkinAttrs(
+            trace_id="000000000000000f",
+            span_id="0000000000000002",
+            parent_span_id=None,
+            flags=None,
+            is_sampled=True,
+        ),
+        endpoint=fake_endpoint,
+        span_name="GET /foo",
+        transport_handler=transport,
+        report_root_timestamp=True,
+        get_tracer=lambda: tracer,
+        firehose_handler=firehose,
+        service_name="test_server",
+        encoding=Encoding.V2_JSON,
+    )
+    context.start_timestamp = 24
+
+    with mock.patch.object(
+        context.encoder, "encode_span", wraps=context.encoder.encode_span,
+    ) as mock_encode_span:
+        context.emit_spans()
+
+    assert mock_encode_span.call_count == 2
+    # Each handler is batched according to its own max payload size.
+    assert len(transport.get_payloads()) == 1
+    assert len(firehose.get_payloads()) == 2
+    assert json.loads(transport.get_payloads()[0]) == [
+        span for payload in firehose.get_payloads() for span in json.loads(payload)
+    ]
+
+
 def test_batch_sender_add_span(fake_endpoint):
     # This test verifies it's possible to add 1 span without throwing errors.
     # It also checks that exiting the ZipkinBatchSender context manager
@@ -370,6 +425,40 @@ def test_batch_sender_with_error_on_exit():
             raise Exception("Error!")
 
 
+def test_fan_out_sender_with_error_on_exit():
+    batch_sender = logging_helper.ZipkinBatchSender(
+        MockTransportHandler(), None, MockEncoder(),
+    )
+    sender = logging_helper.ZipkinFanOutSender([batch_sender], MockEncoder())
+    with pytest.raises(ZipkinError):
+        with sender:
+            raise Exception("Error!")
+
+
+def test_fan_out_sender_doesnt_encode_for_reporters(fake_endpoint):
+    reporter = mock.Mock(spec=AsyncReporter)
+    reporter.get_max_payload_bytes.return_value = None
+    encoder = mock.Mock()
+    span = Span(
+        trace_id="000000000000000f",
+        name="span",
+        parent_id=None,
+        span_id="0000000000000003",
+        kind=Kind.LOCAL,
+        timestamp=26.0,
+        duration=4.0,
+        local_endpoint=fake_endpoint,
+    )
+
+    with logging_helper.ZipkinFanOutSender(
+        [logging_helper.ZipkinBatchSender(reporter, None, encoder)], encoder,
+    ) as sender:
+        sender.add_span(span)
+
+    reporter.report.assert_called_once_with(span)
+    assert encoder.encode_span.call_count == 0
+
+
 def test_batch_sender_add_span_many_times(fake_endpoint):
     # We create MAX_PORTION_SIZE * 2 + 1 spans, so we should trigger flush 3
     # times, once every MAX_PORTION_SIZE spans.
@@ -433,10 +522,15 @@ def test_batch_sender_add_span_too_big(fake_endpoint):
     for i in range(40):
         # The first 40 batches have 5 spans of 197 bytes + 5 bytes of
         # list headers = 990 bytes
-        assert len(mock_transport_handler.call_args_list[i][0][0]) == 990
+        payload = mock_transport_handler.call_args_list[i][0][0]
+        assert len(payload.data) == payload.size == 990
+        assert payload.span_count == 5
+        assert payload.encoding == Encoding.V1_THRIFT
     # The last batch has a single remaining span of 197 bytes + 5 bytes of
     # list headers = 202 bytes
-    assert len(mock_transport_handler.call_args_list[40][0][0]) == 202
+    payload = mock_transport_handler.call_args_list[40][0][0]
+    assert len(payload.data) == payload.size == 202
+    assert payload.span_count == 1
 
 
 def test_batch_sender_flush_calls_transport_handler_with_correct_params(fake_endpoint):
@@ -490,3 +584,109 @@ def test_batch_sender_defensive_about_transport_handler(fake_endpoint):
         )
     assert encoder.encode_span.call_count == 1
     assert encoder.encode_queue.call_count == 0
+
+
+def _make_flushing_context(tracer, transport, **kwargs):
+    context = logging_helper.ZipkinLoggingContext(
+        zipkin_attrs=ZipkinAttrs("000000000000000f", "0000000000000001", None, 0, True),
+        endpoint=create_endpoint(80, "test_server", "127.0.0.1"),
+        span_name="span_name",
+        transport_handler=transport,
+        report_root_timestamp=False,
+        get_tracer=lambda: tracer,
+        service_name="test_server",
+        encoding=Encoding.V2_JSON,
+        **kwargs
+    )
+    context.start()
+    return context
+
+
+def _make_child_span(name):
+    return Span(
+        trace_id="000000000000000f",
+        name=name,
+        parent_id="0000000000000001",
+        span_id="0000000000000002",
+        kind=Kind.LOCAL,
+        timestamp=26.0,
+        duration=4.0,
+        local_endpoint=create_endpoint(service_name="child_service"),
+    )
+
+
+def test_maybe_flush_spans_max_buffered_spans():
+    tracer = MockTracer()
+    transport = MockTransportHandler()
+    context = _make_flushing_context(tracer, transport, max_buffered_spans=2)
+
+    tracer.add_span(_make_child_span("a"))
+    context.maybe_flush_spans()
+    assert transport.get_payloads() == []
+
+    tracer.add_span(_make_child_span("b"))
+    context.maybe_flush_spans()
+
+    assert len(tracer.get_spans()) == 0
+    payloads = transport.get_payloads()
+    assert len(payloads) == 1
+    spans = json.loads(payloads[0])
+    assert [span["name"] for span in spans] == ["a", "b"]
+    # Child spans get the root span endpoint, like in emit_spans.
+    assert spans[0]["localEndpoint"] == {
+        "serviceName": "child_service",
+        "ipv4": "127.0.0.1",
+        "port": 80,
+    }
+
+
+@mock.patch("py_zipkin.logging_helper.time.time", autospec=True)
+def test_maybe_flush_spans_max_buffer_seconds(time_mock):
+    time_mock.return_value = 10
+    tracer = MockTracer()
+    transport = MockTransportHandler()
+    context = _make_flushing_context(tracer, transport, max_buffer_seconds=5)
+
+    time_mock.return_value = 14
+    tracer.add_span(_make_child_span("a"))
+    context.maybe_flush_spans()
+    assert transport.get_payloads() == []
+
+    time_mock.return_value = 15
+    context.maybe_flush_spans()
+    assert len(transport.get_payloads()) == 1
+    assert context.last_flush_timestamp == 15
+
+    # Nothing to send.
+    time_mock.return_value = 20
+    context.maybe_flush_spans()
+    assert len(transport.get_payloads()) == 1
+
+
+def test_maybe_flush_spans_logs_errors():
+    tracer = MockTracer()
+    transport = MockTransportHandler()
+    context = _make_flushing_context(tracer, transport, max_buffered_spans=1)
+    tracer.add_span(_make_child_span("a"))
+
+    with mock.patch.object(
+        transport, "send", side_effect=IOError("boom"),
+    ), mock.patch.object(logging_helper.log, "error") as mock_log:
+        context.maybe_flush_spans()
+
+    assert mock_log.call_count == 1
+    assert len(tracer.get_spans()) == 0
+
+
+def test_flush_spans_with_firehose_not_sampled():
+    tracer = MockTracer()
+    transport = MockTransportHandler()
+    firehose = MockTransportHandler()
+    context = _make_flushing_context(tracer, transport, firehose_handler=firehose)
+    context.zipkin_attrs = context.zipkin_attrs._replace(is_sampled=False)
+    tracer.add_span(_make_child_span("a"))
+
+    context.flush_spans()
+
+    assert transport.get_payloads() == []
+    assert len(firehose.get_payloads()) == 1
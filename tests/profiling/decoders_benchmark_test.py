@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import io
+
+import pytest
+
+from py_zipkin.encoding import convert_spans
+from py_zipkin.encoding._decoders import _V1ThriftDecoder
+from py_zipkin.encoding._decoders import get_decoder
+from py_zipkin.encoding._encoders import _V1ThriftEncoder
+from py_zipkin.encoding._encoders import get_encoder
+from py_zipkin.encoding._types import Encoding
+from py_zipkin.encoding.protobuf import _wire as protobuf_wire
+from tests.profiling.encoders_benchmark_test import generate_spans
+from tests.profiling.encoders_benchmark_test import NUM_SPANS
+from tests.profiling.encoders_benchmark_test import record_spans_per_sec
+
+# JSON payloads from collectors can be big, and json.loads reads them at once.
+NUM_JSON_SPANS = 100000
+
+
+def _encode_v1_thrift(spans):
+    encoder = _V1ThriftEncoder()
+    return encoder.encode_queue([encoder.encode_span(span) for span in spans])
+
+
+def test_v1_thrift_decode_spans(benchmark):
+    encoded = _encode_v1_thrift(generate_spans())
+    decoder = _V1ThriftDecoder()
+
+    decoded = benchmark(decoder.decode_spans, encoded)
+    record_spans_per_sec(benchmark)
+    assert len(decoded) == NUM_SPANS
+
+
+def test_v1_thrift_iter_decode_spans_from_file(benchmark):
+    encoded = _encode_v1_thrift(generate_spans())
+    decoder = _V1ThriftDecoder()
+
+    def decode():
+        return list(decoder.iter_decode_spans(io.BytesIO(encoded)))
+
+    decoded = benchmark(decode)
+    record_spans_per_sec(benchmark)
+    assert len(decoded) == NUM_SPANS
+
+
+@pytest.fixture(scope="module")
+def json_spans():
+    return generate_spans(NUM_JSON_SPANS)
+
+
+@pytest.mark.parametrize("encoding", [Encoding.V1_JSON, Encoding.V2_JSON])
+def test_json_decode_spans(benchmark, json_spans, encoding):
+    encoder = get_encoder(encoding)
+    encoded = encoder.encode_queue([encoder.encode_span(s) for s in json_spans])
+    decoder = get_decoder(encoding)
+
+    decoded = benchmark.pedantic(decoder.decode_spans, args=(encoded,))
+    record_spans_per_sec(benchmark, NUM_JSON_SPANS)
+    assert len(decoded) == NUM_JSON_SPANS
+
+
+def test_v2_proto3_decode_spans(benchmark):
+    encoded = protobuf_wire.encode_list_of_spans(generate_spans())
+    decoder = get_decoder(Encoding.V2_PROTO3)
+
+    decoded = benchmark(decoder.decode_spans, encoded)
+    record_spans_per_sec(benchmark)
+    assert len(decoded) == NUM_SPANS
+
+
+@pytest.mark.parametrize(
+    "input_encoding,output_encoding",
+    [
+        (Encoding.V1_THRIFT, Encoding.V2_JSON),
+        (Encoding.V1_THRIFT, Encoding.V2_PROTO3),
+        (Encoding.V2_JSON, Encoding.V2_PROTO3),
+    ],
+)
+def test_convert_spans(benchmark, input_encoding, output_encoding):
+    encoder = get_encoder(input_encoding)
+    encoded = encoder.encode_queue([encoder.encode_span(s) for s in generate_spans()])
+
+    benchmark(convert_spans, encoded, output_encoding, input_encoding)
+    record_spans_per_sec(benchmark)
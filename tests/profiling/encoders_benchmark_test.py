@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from py_zipkin import Kind
+from py_zipkin.encoding import protobuf
+from py_zipkin.encoding._encoders import _V1ThriftEncoder
+from py_zipkin.encoding._encoders import _V2FastJSONEncoder
+from py_zipkin.encoding._encoders import _V2JSONEncoder
+from py_zipkin.encoding._encoders import _V2ProtobufEncoder
+from py_zipkin.encoding._helpers import create_endpoint
+from py_zipkin.encoding._helpers import Span
+from py_zipkin.util import generate_random_64bit_string
+from tests.thrift._wire_test import thriftpy2_encode_span
+
+NUM_SPANS = 1000
+
+
+def generate_spans(num_spans=NUM_SPANS):
+    """Generates spans similar to the ones created by a web request."""
+    local_endpoint = create_endpoint(8080, "test_service", "10.0.0.1")
+    remote_endpoint = create_endpoint(9090, "remote_service", "10.0.0.2")
+    trace_id = generate_random_64bit_string()
+    return [
+        Span(
+            trace_id=trace_id,
+            name="GET /api/v1/resource",
+            parent_id=generate_random_64bit_string(),
+            span_id=generate_random_64bit_string(),
+            kind=Kind.CLIENT,
+            timestamp=1538544126.1159,
+            duration=0.0123,
+            local_endpoint=local_endpoint,
+            remote_endpoint=remote_endpoint,
+            annotations={"ws": 1538544126.116},
+            tags={"http.status_code": "200", "http.route": "/api/v1/resource"},
+        )
+        for _ in range(num_spans)
+    ]
+
+
+def record_spans_per_sec(benchmark, num_spans=NUM_SPANS):
+    """Adds the spans/sec throughput to the benchmark report."""
+    if benchmark.stats:
+        benchmark.extra_info["spans_per_sec"] = int(
+            num_spans / benchmark.stats.stats.mean
+        )
+
+
+@pytest.mark.parametrize(
+    "encoder", [_V2JSONEncoder(), _V2FastJSONEncoder()], ids=["json", "fast"],
+)
+def test_v2_json_encode_span(benchmark, encoder):
+    spans = generate_spans()
+
+    def encode():
+        return [encoder.encode_span(span) for span in spans]
+
+    encoded = benchmark(encode)
+    record_spans_per_sec(benchmark)
+    assert len(encoded) == NUM_SPANS
+
+
+def _pb2_encode_span(span):
+    return protobuf.encode_pb_list([protobuf.create_protobuf_span(span)])
+
+
+@pytest.mark.parametrize(
+    "encode_span",
+    [_pb2_encode_span, _V2ProtobufEncoder().encode_span],
+    ids=["zipkin_pb2", "wire"],
+)
+def test_v2_proto3_encode_span(benchmark, encode_span):
+    spans = generate_spans()
+
+    def encode():
+        return [encode_span(span) for span in spans]
+
+    encoded = benchmark(encode)
+    record_spans_per_sec(benchmark)
+    assert len(encoded) == NUM_SPANS
+
+
+@pytest.mark.parametrize(
+    "encode_span",
+    [thriftpy2_encode_span, _V1ThriftEncoder().encode_span],
+    ids=["thriftpy2", "wire"],
+)
+def test_v1_thrift_encode_span(benchmark, encode_span):
+    spans = generate_spans()
+
+    def encode():
+        return [encode_span(span) for span in spans]
+
+    encoded = benchmark(encode)
+    record_spans_per_sec(benchmark)
+    assert len(encoded) == NUM_SPANS
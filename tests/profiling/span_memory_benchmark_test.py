@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from py_zipkin import Kind
+from py_zipkin.encoding._helpers import create_endpoint
+from py_zipkin.encoding._helpers import Span
+from py_zipkin.storage import SpanStorage
+from py_zipkin.util import generate_random_64bit_string
+
+tracemalloc = pytest.importorskip("tracemalloc")
+
+NUM_SPANS = 10000
+
+
+def buffer_spans(storage, num_spans, tags):
+    """Fills storage with local spans, like zipkin_span does for child spans."""
+    local_endpoint = create_endpoint(8080, "test_service", "10.0.0.1")
+    trace_id = generate_random_64bit_string()
+    parent_id = generate_random_64bit_string()
+    for _ in range(num_spans):
+        storage.append(
+            Span(
+                trace_id=trace_id,
+                name="process_item",
+                parent_id=parent_id,
+                span_id=generate_random_64bit_string(),
+                kind=Kind.LOCAL,
+                timestamp=1538544126.1159,
+                duration=0.0123,
+                local_endpoint=local_endpoint,
+                annotations={},
+                tags=dict(tags),
+            )
+        )
+
+
+@pytest.mark.parametrize(
+    "tags", [{}, {"item.id": "42"}], ids=["no_tags", "one_tag"],
+)
+def test_span_storage_bytes_per_span(benchmark, tags):
+    def measure():
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            storage = SpanStorage()
+            buffer_spans(storage, NUM_SPANS, tags)
+            after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert len(storage) == NUM_SPANS
+        return (after - before) // NUM_SPANS
+
+    bytes_per_span = benchmark.pedantic(measure, rounds=3)
+    benchmark.extra_info["bytes_per_span"] = bytes_per_span
+    assert bytes_per_span > 0
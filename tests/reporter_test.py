@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+
+import mock
+
+from py_zipkin import Encoding
+from py_zipkin import Kind
+from py_zipkin.encoding._helpers import create_endpoint
+from py_zipkin.encoding._helpers import Span
+from py_zipkin.reporter import AsyncReporter
+from py_zipkin.transport import Payload
+from py_zipkin.zipkin import zipkin_span
+from tests.test_helpers import MockTransportHandler
+
+
+def _make_span(name="span"):
+    return Span(
+        trace_id="000000000000000f",
+        name=name,
+        parent_id=None,
+        span_id="0000000000000001",
+        kind=Kind.LOCAL,
+        timestamp=26.0,
+        duration=4.0,
+        local_endpoint=create_endpoint(80, "test_server", "127.0.0.1"),
+    )
+
+
+class BlockingTransportHandler(MockTransportHandler):
+    """Transport that blocks in send until `unblock` is set."""
+
+    def __init__(self, *args, **kwargs):
+        super(BlockingTransportHandler, self).__init__(*args, **kwargs)
+        self.unblock = threading.Event()
+
+    def send(self, payload):
+        self.unblock.wait()
+        return super(BlockingTransportHandler, self).send(payload)
+
+
+class TestAsyncReporter(object):
+    def test_report_encodes_and_batches_in_background(self):
+        transport = MockTransportHandler()
+        reporter = AsyncReporter(transport, encoding=Encoding.V2_JSON)
+
+        assert reporter.report(_make_span("a")) is True
+        assert reporter.report(_make_span("b")) is True
+        assert reporter.flush(timeout=5) is True
+
+        payloads = transport.get_payloads()
+        assert len(payloads) == 1
+        assert [s["name"] for s in json.loads(payloads[0])] == ["a", "b"]
+        assert reporter.spans_reported == 2
+        assert reporter.spans_dropped == 0
+        reporter.close(timeout=5)
+
+    def test_respects_max_span_batch_size(self):
+        transport = MockTransportHandler()
+        reporter = AsyncReporter(
+            transport, encoding=Encoding.V2_JSON, max_span_batch_size=2,
+        )
+
+        for _ in range(5):
+            reporter.report(_make_span())
+        reporter.close(timeout=5)
+
+        assert [len(json.loads(p)) for p in transport.get_payloads()] == [2, 2, 1]
+
+    def test_flush_interval(self):
+        transport = MockTransportHandler()
+        reporter = AsyncReporter(
+            transport, encoding=Encoding.V2_JSON, flush_interval=0.01,
+        )
+        with mock.patch.object(transport, "send", autospec=True) as mock_send:
+            sent = threading.Event()
+            mock_send.side_effect = lambda payload: sent.set()
+
+            reporter.report(_make_span())
+            # No flush is requested, the interval should kick in.
+            assert sent.wait(5) is True
+        reporter.close(timeout=5)
+
+    def test_flush_interval_under_sustained_load(self):
+        transport = BlockingTransportHandler()
+        reporter = AsyncReporter(transport, encoding=Encoding.V2_JSON, flush_interval=0)
+
+        # The queue is never empty once the worker is unblocked.
+        reporter.send(b"payload")
+        for _ in range(3):
+            reporter.report(_make_span())
+        transport.unblock.set()
+        reporter.close(timeout=5)
+
+        assert [len(json.loads(p)) for p in transport.get_payloads()[1:]] == [1, 1, 1]
+
+    def test_drops_spans_when_the_queue_is_full(self):
+        transport = BlockingTransportHandler()
+        reporter = AsyncReporter(transport, encoding=Encoding.V2_JSON, max_queue_size=1)
+
+        # The first payload blocks the worker thread in send().
+        reporter.send(b"payload")
+        while reporter._queue.qsize() > 0:
+            pass
+        assert reporter.report(_make_span()) is True
+        assert reporter.report(_make_span()) is False
+        reporter.send(b"payload")
+
+        assert reporter.spans_reported == 1
+        assert reporter.spans_dropped == 1
+        assert reporter.payloads_dropped == 1
+
+        transport.unblock.set()
+        reporter.close(timeout=5)
+        assert len(transport.get_payloads()) == 2
+
+    def test_send_errors_are_counted(self):
+        transport = MockTransportHandler()
+        reporter = AsyncReporter(transport, encoding=Encoding.V2_JSON)
+        with mock.patch.object(transport, "send", autospec=True) as mock_send:
+            mock_send.side_effect = IOError("boom")
+            reporter.report(_make_span())
+            reporter.send(b"payload")
+            reporter.flush(timeout=5)
+
+        assert reporter.send_errors == 2
+        # The failed batch is dropped rather than retried forever.
+        reporter.report(_make_span())
+        reporter.close(timeout=5)
+        assert len(transport.get_payloads()) == 1
+
+    def test_send_payload_keeps_the_metadata(self):
+        transport = MockTransportHandler()
+        received = []
+        reporter = AsyncReporter(transport)
+        function_reporter = AsyncReporter(received.append)
+        payload = Payload(b"payload", Encoding.V2_JSON, 1)
+
+        with mock.patch.object(
+            transport, "send_payload", autospec=True,
+        ) as mock_send_payload:
+            reporter.send_payload(payload)
+            reporter.close(timeout=5)
+        function_reporter.send_payload(payload)
+        function_reporter.close(timeout=5)
+
+        mock_send_payload.assert_called_once_with(payload)
+        assert received == [b"payload"]
+
+    def test_send_errors_while_batching(self):
+        transport = MockTransportHandler()
+        reporter = AsyncReporter(
+            transport, encoding=Encoding.V2_JSON, max_span_batch_size=1,
+        )
+        with mock.patch.object(transport, "send", autospec=True) as mock_send:
+            mock_send.side_effect = IOError("boom")
+            # The second span triggers a flush of the first one.
+            reporter.report(_make_span())
+            reporter.report(_make_span())
+            reporter.flush(timeout=5)
+
+        assert reporter.send_errors == 1
+        reporter.close(timeout=5)
+
+    def test_close_drops_new_spans(self):
+        transport = MockTransportHandler()
+        reporter = AsyncReporter(transport)
+        reporter.close()
+        assert reporter.flush() is True
+        reporter.close()
+
+        assert reporter.report(_make_span()) is False
+        assert reporter.spans_dropped == 1
+        assert transport.get_payloads() == []
+
+    def test_close_while_reporting(self):
+        transport = MockTransportHandler()
+        reporter = AsyncReporter(transport)
+        reporter.report(_make_span())
+
+        # close() runs right before the span is queued.
+        with mock.patch.object(
+            reporter, "_ensure_started", autospec=True, side_effect=reporter.close,
+        ):
+            assert reporter.report(_make_span()) is False
+
+        assert reporter.spans_dropped == 1
+        assert reporter._queue.empty()
+        assert len(transport.get_payloads()) == 1
+
+    def test_flush_after_close(self):
+        transport = BlockingTransportHandler()
+        reporter = AsyncReporter(transport)
+        reporter.send(b"payload")
+        reporter.close(timeout=0.01)
+
+        # The worker is still blocked, but this doesn't wait for it.
+        assert reporter.flush() is False
+
+        transport.unblock.set()
+        reporter._thread.join(5)
+        reporter.close()
+        assert reporter.flush() is True
+
+    def test_stats_from_many_threads(self):
+        reporter = AsyncReporter(BlockingTransportHandler(), max_queue_size=10)
+
+        def report():
+            for _ in range(100):
+                reporter.report(_make_span())
+                reporter.send(b"payload")
+
+        threads = [threading.Thread(target=report) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        reporter.transport_handler.unblock.set()
+        reporter.close(timeout=5)
+
+        assert reporter.spans_reported + reporter.spans_dropped == 400
+        # The worker was blocked by the first payload, so most were dropped.
+        assert reporter.spans_dropped > 0
+        assert reporter.payloads_dropped > 0
+
+    def test_flush_timeout(self):
+        transport = BlockingTransportHandler()
+        reporter = AsyncReporter(transport)
+        reporter.send(b"payload")
+
+        assert reporter.flush(timeout=0.01) is False
+
+        transport.unblock.set()
+        reporter.close(timeout=5)
+
+    def test_get_max_payload_bytes(self):
+        assert AsyncReporter(MockTransportHandler(42)).get_max_payload_bytes() == 42
+        assert AsyncReporter(lambda payload: None).get_max_payload_bytes() is None
+
+    def test_zipkin_span_hands_spans_over_to_the_reporter(self):
+        transport = MockTransportHandler()
+        reporter = AsyncReporter(transport, encoding=Encoding.V2_JSON)
+
+        with mock.patch.object(reporter, "report", autospec=True) as mock_report:
+            with zipkin_span(
+                service_name="test_service",
+                span_name="root",
+                transport_handler=reporter,
+                sample_rate=100.0,
+                encoding=Encoding.V1_THRIFT,
+            ):
+                with zipkin_span(service_name="test_service", span_name="child"):
+                    pass
+
+        # Nothing has been encoded in the request thread.
+        assert [c[0][0].name for c in mock_report.call_args_list] == [
+            "child",
+            "root",
+        ]
+
+        with zipkin_span(
+            service_name="test_service",
+            span_name="root",
+            transport_handler=reporter,
+            sample_rate=100.0,
+        ):
+            pass
+        reporter.close(timeout=5)
+
+        payloads = transport.get_payloads()
+        assert len(payloads) == 1
+        assert json.loads(payloads[0])[0]["name"] == "root"
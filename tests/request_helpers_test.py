@@ -3,6 +3,7 @@ import mock
 import pytest
 
 from py_zipkin import request_helpers
+from py_zipkin import util
 from py_zipkin.request_helpers import ZipkinAttrs
 from tests.test_helpers import MockTracer
 
@@ -463,3 +464,64 @@ def test_create_http_headers_new_span_id(gen_mock):
         "X-B3-Flags": "0",
         "X-B3-Sampled": "1",
     }
+
+
+@pytest.mark.parametrize("sampled", [True, False])
+def test_extract_zipkin_attrs_from_headers_deferred_with_sampler(sampled):
+    sampler = mock.Mock()
+    sampler.should_sample.return_value = sampled
+
+    attrs = request_helpers.extract_zipkin_attrs_from_headers(
+        {"b3": "a" * 16 + "-" + "b" * 16},
+        sample_rate=100.0 - 100.0 * sampled,
+        sampler=sampler,
+        span_name="GET /",
+    )
+
+    assert attrs.is_sampled is sampled
+    assert sampler.should_sample.call_args == mock.call("a" * 16, "GET /")
+
+
+def test_extract_zipkin_attrs_from_headers_sampler_not_used_if_propagated():
+    sampler = mock.Mock()
+
+    attrs = request_helpers.extract_zipkin_attrs_from_headers(
+        {"b3": "a" * 16 + "-" + "b" * 16 + "-0"}, sampler=sampler,
+    )
+
+    assert attrs.is_sampled is False
+    assert sampler.should_sample.call_count == 0
+
+
+@mock.patch("py_zipkin.util.random.random", autospec=True)
+def test_extract_zipkin_attrs_from_headers_sample_by_trace_id(mock_random):
+    def extract(trace_id):
+        return request_helpers.extract_zipkin_attrs_from_headers(
+            {"X-B3-TraceId": trace_id, "X-B3-SpanId": "b" * 16},
+            sample_rate=50.0,
+            sample_by_trace_id=True,
+        )
+
+    assert extract("0" * 16 + "7fffffffffffffff").is_sampled is True
+    assert extract("8000000000000000").is_sampled is False
+    # The decision matches the one made by the service that started the trace.
+    assert extract("8000000000000000").is_sampled is (
+        util.create_attrs_for_span(
+            sample_rate=50.0, trace_id="8000000000000000", sample_by_trace_id=True,
+        ).is_sampled
+    )
+    assert mock_random.call_count == 0
+
+
+@mock.patch("py_zipkin.util.random.random", autospec=True)
+def test_extract_zipkin_attrs_from_headers_sample_by_non_hex_trace_id(mock_random):
+    mock_random.return_value = 0.9
+
+    attrs = request_helpers.extract_zipkin_attrs_from_headers(
+        {"X-B3-TraceId": "zzzz-not-hex", "X-B3-SpanId": "1" * 16},
+        sample_rate=50.0,
+        sample_by_trace_id=True,
+    )
+
+    assert attrs.is_sampled is False
+    assert attrs.trace_id == "zzzz-not-hex"
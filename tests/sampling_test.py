@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import mock
+import pytest
+
+from py_zipkin import request_helpers
+from py_zipkin import sampling
+from py_zipkin.exception import ZipkinError
+
+
+def test_sampler_interface():
+    with pytest.raises(NotImplementedError):
+        sampling.Sampler().should_sample("0000000000000001")
+
+
+@pytest.mark.parametrize(
+    "sampler_class", [sampling.ProbabilisticSampler, sampling.TraceIdSampler],
+)
+@pytest.mark.parametrize("sample_rate", [-1.0, 100.1])
+def test_invalid_sample_rate(sampler_class, sample_rate):
+    with pytest.raises(ZipkinError):
+        sampler_class(sample_rate)
+
+
+@mock.patch("py_zipkin.util.random.random", autospec=True)
+def test_probabilistic_sampler(mock_random):
+    sampler = sampling.ProbabilisticSampler(20.0)
+
+    mock_random.return_value = 0.1
+    assert sampler.should_sample("0000000000000001") is True
+    mock_random.return_value = 0.3
+    assert sampler.should_sample("0000000000000001") is False
+
+
+def test_trace_id_sampler_is_deterministic():
+    sampler = sampling.TraceIdSampler(50.0)
+
+    assert sampler.should_sample("7fffffffffffffff") is True
+    assert sampler.should_sample("8000000000000000") is False
+    assert sampler.should_sample("8000000000000000", "span") is False
+
+
+@mock.patch("py_zipkin.util.random.random", autospec=True)
+def test_trace_id_sampler_non_hex_trace_id(mock_random):
+    sampler = sampling.TraceIdSampler(50.0)
+
+    mock_random.return_value = 0.1
+    assert sampler.should_sample("zzzz-not-hex") is True
+    mock_random.return_value = 0.9
+    assert sampler.should_sample("zzzz-not-hex") is False
+
+    attrs = request_helpers.extract_zipkin_attrs_from_headers(
+        {"X-B3-TraceId": "zzzz-not-hex", "X-B3-SpanId": "1" * 16}, sampler=sampler,
+    )
+    assert attrs.is_sampled is False
+
+
+@mock.patch.object(sampling, "_clock", autospec=True)
+def test_rate_limiting_sampler(mock_clock):
+    mock_clock.return_value = 100.0
+    sampler = sampling.RateLimitingSampler(2)
+
+    # The bucket starts full.
+    assert [sampler.should_sample("1") for _ in range(3)] == [True, True, False]
+
+    # Refills at 2 traces/sec.
+    mock_clock.return_value = 100.5
+    assert [sampler.should_sample("1") for _ in range(2)] == [True, False]
+
+    # But never above max_burst.
+    mock_clock.return_value = 200.0
+    assert [sampler.should_sample("1") for _ in range(3)] == [True, True, False]
+
+
+@mock.patch.object(sampling, "_clock", autospec=True)
+def test_rate_limiting_sampler_less_than_one_per_sec(mock_clock):
+    mock_clock.return_value = 100.0
+    sampler = sampling.RateLimitingSampler(0.5)
+
+    assert sampler.max_burst == 1.0
+    assert sampler.should_sample("1") is True
+    mock_clock.return_value = 101.0
+    assert sampler.should_sample("1") is False
+    mock_clock.return_value = 102.0
+    assert sampler.should_sample("1") is True
+
+
+def test_rate_limiting_sampler_zero():
+    sampler = sampling.RateLimitingSampler(0)
+    assert sampler.should_sample("1") is False
+
+    with pytest.raises(ZipkinError):
+        sampling.RateLimitingSampler(-1)
+
+
+def test_span_name_sampler():
+    always = sampling.ProbabilisticSampler(100.0)
+    sampler = sampling.SpanNameSampler(
+        {"/health": 0.0, "/important": always}, default=100.0,
+    )
+
+    assert sampler.samplers["/important"] is always
+    assert sampler.should_sample("1", "/health") is False
+    assert sampler.should_sample("1", "/important") is True
+    assert sampler.should_sample("1", "/other") is True
+    assert sampler.should_sample("1") is True
+
+    assert sampling.SpanNameSampler({}).should_sample("1", "/other") is False
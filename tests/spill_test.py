@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import mock
+import pytest
+
+from py_zipkin import spill
+from py_zipkin.encoding import Encoding
+from py_zipkin.transport import Payload
+from tests.test_helpers import MockTransportHandler
+
+# Room for a few small records after the header.
+SMALL_QUEUE_BYTES = spill._HEADER.size + 40
+
+
+def _drain(queue):
+    payloads = []
+    while True:
+        payload = queue.peek()
+        if payload is None:
+            return payloads
+        payloads.append(payload)
+        queue.pop()
+
+
+def _wait_for(condition):
+    deadline = time.time() + 5
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def spill_path(tmpdir):
+    return str(tmpdir.join("zipkin.spill"))
+
+
+class TestSpillQueue(object):
+    def test_fifo(self, spill_path):
+        queue = spill.SpillQueue(spill_path)
+
+        assert queue.peek() is None
+        queue.append(b"first")
+        queue.append(b"second")
+
+        assert len(queue) == 2
+        assert queue.peek() == b"first"
+        assert queue.peek() == b"first"
+        assert _drain(queue) == [b"first", b"second"]
+        queue.pop()
+        assert len(queue) == 0
+        queue.close()
+
+    def test_wraps_around(self, spill_path):
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES)
+
+        # 12 bytes per record, so the 4th one doesn't fit before the end.
+        for payload in [b"aaaaaaaa", b"bbbbbbbb", b"cccccccc"]:
+            queue.append(payload)
+        queue.pop()
+        queue.append(b"dddddddd")
+
+        assert queue.evicted == 0
+        assert _drain(queue) == [b"bbbbbbbb", b"cccccccc", b"dddddddd"]
+        queue.close()
+
+    def test_wraps_around_without_room_for_the_marker(self, spill_path):
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES)
+
+        queue.append(b"a" * 14)
+        queue.append(b"b" * 14)
+        queue.pop()
+        # Only 2 bytes left before the end, less than a record header.
+        queue.append(b"c" * 14)
+
+        assert queue.evicted == 0
+        assert _drain(queue) == [b"b" * 14, b"c" * 14]
+        queue.close()
+
+    def test_evicts_oldest_first(self, spill_path):
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES)
+
+        for i in range(6):
+            queue.append(str(i).encode() * 8)
+
+        assert queue.evicted == 3
+        assert _drain(queue) == [b"33333333", b"44444444", b"55555555"]
+        queue.close()
+
+    def test_evicts_when_full_after_wrapping(self, spill_path):
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES)
+
+        for payload in [b"a" * 16, b"b" * 16]:
+            queue.append(payload)
+        queue.pop()
+        queue.append(b"c" * 16)
+        # The tail caught up with the head.
+        queue.append(b"d" * 16)
+
+        assert queue.evicted == 1
+        assert _drain(queue) == [b"c" * 16, b"d" * 16]
+        queue.close()
+
+    def test_drops_payloads_bigger_than_the_queue(self, spill_path):
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES)
+        queue.append(b"small")
+
+        assert queue.append(b"x" * 40) is False
+
+        assert queue.dropped == 1
+        assert _drain(queue) == [b"small"]
+        queue.close()
+
+    def test_survives_restarts(self, spill_path):
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES)
+        for payload in [b"aaaaaaaa", b"bbbbbbbb", b"cccccccc", b"dddddddd"]:
+            queue.append(payload)
+        queue.close()
+
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES)
+
+        assert _drain(queue) == [b"bbbbbbbb", b"cccccccc", b"dddddddd"]
+        queue.close()
+
+    def test_resets_files_with_different_settings(self, spill_path):
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES * 2)
+        for _ in range(5):
+            queue.append(b"payload")
+        queue.close()
+
+        queue = spill.SpillQueue(spill_path, SMALL_QUEUE_BYTES)
+
+        assert len(queue) == 0
+        assert queue.peek() is None
+        queue.close()
+
+
+class FlakyTransport(MockTransportHandler):
+    def __init__(self):
+        super(FlakyTransport, self).__init__()
+        self.is_down = True
+        self.calls = 0
+        self.encodings = []
+
+    def send_payload(self, payload):
+        self.encodings.append(payload.encoding)
+        return super(FlakyTransport, self).send_payload(payload)
+
+    def send(self, payload):
+        self.calls += 1
+        if self.is_down:
+            raise IOError("Connection refused")
+        return super(FlakyTransport, self).send(payload)
+
+
+class TestSpillingTransport(object):
+    def test_sends_directly_when_the_collector_is_up(self, spill_path):
+        upstream = MockTransportHandler(max_payload_bytes=1000)
+        transport = spill.SpillingTransport(upstream, spill_path)
+
+        transport(b"payload")
+
+        assert upstream.get_payloads() == [b"payload"]
+        assert transport.get_max_payload_bytes() == 1000
+        assert transport._thread is None
+        transport.close()
+
+    def test_spills_and_replays(self, spill_path):
+        upstream = FlakyTransport()
+        transport = spill.SpillingTransport(
+            upstream, spill_path, replay_interval=0.01,
+        )
+
+        transport(b"first")
+        # The collector is down, don't even try to send this one.
+        transport(u"second")
+
+        assert transport.payloads_spilled == 2
+        assert upstream.calls == 1
+        # Let the replay fail a couple times.
+        _wait_for(lambda: upstream.calls > 2)
+        upstream.is_down = False
+        _wait_for(lambda: transport.payloads_replayed == 2)
+        assert upstream.get_payloads() == [b"first", b"second"]
+        assert len(transport.spill_queue) == 0
+        transport.close()
+
+    def test_spills_from_many_threads(self, spill_path):
+        transport = spill.SpillingTransport(
+            FlakyTransport(),
+            spill_path,
+            max_spill_bytes=SMALL_QUEUE_BYTES,
+            replay_interval=10,
+        )
+
+        def send_payloads():
+            for _ in range(100):
+                transport(b"payload")
+                transport(b"x" * SMALL_QUEUE_BYTES)
+
+        threads = [threading.Thread(target=send_payloads) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert transport.payloads_spilled == 400
+        assert transport.spill_queue.dropped == 400
+        transport.close()
+
+    def test_keeps_the_payload_encoding(self, spill_path):
+        upstream = FlakyTransport()
+        transport = spill.SpillingTransport(
+            upstream, spill_path, replay_interval=0.01,
+        )
+
+        transport(Payload(b"[]", Encoding.V2_JSON, 0))
+        transport(Payload(u"[]", None, 0))
+        upstream.is_down = False
+        _wait_for(lambda: transport.payloads_replayed == 2)
+
+        # The second payload's encoding is unknown, it's sent as raw data.
+        assert set(upstream.encodings) == {Encoding.V2_JSON}
+        assert upstream.get_payloads() == [b"[]", b"[]"]
+        transport.close()
+
+    def test_decode_record(self):
+        payload = spill._decode_record(spill._encode_record(b"\x0cdata"))
+        assert payload == b"\x0cdata"
+        payload = spill._decode_record(
+            spill._encode_record(Payload(b"\x0cdata", Encoding.V1_THRIFT, 1)),
+        )
+        assert (payload.data, payload.encoding) == (b"\x0cdata", Encoding.V1_THRIFT)
+        # Unknown prefixes, i.e. from a newer version.
+        assert spill._decode_record(b"\xffdata") == b"data"
+
+    def test_replays_payloads_spilled_by_a_previous_process(self, spill_path):
+        queue = spill.SpillQueue(spill_path)
+        queue.append(spill._encode_record(b"spilled"))
+        queue.close()
+        upstream = MockTransportHandler()
+
+        transport = spill.SpillingTransport(
+            upstream, spill_path, replay_interval=0.01,
+        )
+
+        _wait_for(lambda: upstream.get_payloads() == [b"spilled"])
+        transport.close()
+
+    def test_close_keeps_the_backlog(self, spill_path):
+        upstream = FlakyTransport()
+        transport = spill.SpillingTransport(
+            upstream, spill_path, replay_interval=0.01,
+        )
+        transport(b"payload")
+        _wait_for(
+            lambda: transport.spill_queue.peek() == spill._encode_record(b"payload"),
+        )
+
+        transport.close()
+        # Payloads are not spilled anymore.
+        with pytest.raises(IOError):
+            transport(b"too late")
+        upstream.is_down = False
+        transport(b"sent")
+
+        assert upstream.get_payloads() == [b"sent"]
+        assert transport._thread is not None
+        assert not transport._thread.is_alive()
+        queue = spill.SpillQueue(spill_path)
+        assert len(queue) == 1
+        queue.close()
+
+    def test_stops_replaying_when_closed(self, spill_path):
+        upstream = mock.Mock()
+        transport = spill.SpillingTransport(upstream, spill_path)
+        transport.spill_queue.append(b"payload")
+        transport._stopped.set()
+
+        transport._replay()
+
+        assert not upstream.called
+        assert transport.get_max_payload_bytes() is None
+        transport.close()
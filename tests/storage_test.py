@@ -114,3 +114,18 @@ def test_tracer_copy():
     assert ["span1", "span2", "span3", "span4"] == list(tracer._span_storage)
     assert ["attrs1", "attrs2", "attrs3"] == the_copy._context_stack._storage
     assert ["attrs1", "attrs2", "attrs4"] == tracer._context_stack._storage
+
+
+def test_tracer_span_added_callback():
+    callback = mock.Mock()
+    tracer = storage.Tracer()
+    tracer.set_span_added_callback(callback)
+    assert tracer.get_span_added_callback() is callback
+
+    tracer.add_span("span1")
+    tracer.copy().add_span("span2")
+    assert callback.call_count == 2
+
+    tracer.set_span_added_callback(None)
+    tracer.add_span("span3")
+    assert callback.call_count == 2
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import mock
+import pytest
+
+from py_zipkin import thrift
+from py_zipkin.encoding._helpers import create_endpoint
+from py_zipkin.encoding._helpers import Span
+from py_zipkin.encoding._types import Kind
+from py_zipkin.thrift import _wire
+
+
+def thriftpy2_encode_span(v2_span):
+    """Encodes the span by building thriftpy2 objects, like the V1_THRIFT
+    encoder used to."""
+    span = v2_span.build_v1_span()
+    endpoint = thrift.create_endpoint(
+        span.endpoint.port,
+        span.endpoint.service_name,
+        span.endpoint.ipv4,
+        span.endpoint.ipv6,
+    )
+    annotations = thrift.annotation_list_builder(span.annotations, endpoint)
+    binary_annotations = thrift.binary_annotation_list_builder(
+        span.binary_annotations, endpoint,
+    )
+    if v2_span.remote_endpoint:
+        remote_endpoint = v2_span.remote_endpoint
+        binary_annotations.append(
+            thrift.create_binary_annotation(
+                key="sa" if v2_span.kind == Kind.CLIENT else "ca",
+                value=thrift.SERVER_ADDR_VAL,
+                annotation_type=thrift.zipkin_core.AnnotationType.BOOL,
+                host=thrift.create_endpoint(
+                    remote_endpoint.port,
+                    remote_endpoint.service_name,
+                    remote_endpoint.ipv4,
+                    remote_endpoint.ipv6,
+                ),
+            )
+        )
+    return thrift.span_to_bytes(
+        thrift.create_span(
+            span.id,
+            span.parent_id,
+            span.trace_id,
+            span.name,
+            annotations,
+            binary_annotations,
+            span.timestamp,
+            span.duration,
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "span",
+    [
+        Span(
+            "1",
+            "name",
+            "2",
+            "3",
+            Kind.CLIENT,
+            10,
+            10,
+            local_endpoint=create_endpoint(8080, "service1", "10.0.0.1"),
+        ),
+        Span(
+            "1",
+            None,
+            None,
+            "3",
+            Kind.LOCAL,
+            10,
+            10,
+            local_endpoint=create_endpoint(0, None, None, False),
+        ),
+        Span(
+            "0123456789abcdef0123456789abcdef",
+            u"n\xe4me",
+            "fedcba9876543210",
+            "ffffffffffffffff",
+            Kind.SERVER,
+            1538544126.1159,
+            0.000123,
+            local_endpoint=create_endpoint(65535, u"s\xe9rvice", "127.0.0.1"),
+            remote_endpoint=create_endpoint(
+                0, None, "2001:0db8:85a3:0000:0000:8a2e:0370:7334", False,
+            ),
+            annotations={"ws": 1538544126.1159, "sr": 1538544126.2, "": 0},
+            tags={"key": "value", "": "", "code": 200},
+            debug=True,
+        ),
+        Span(
+            "0000000000000000abcdef0123456789",
+            "name",
+            None,
+            "3",
+            Kind.CLIENT,
+            1538544126.1159,
+            0.0000001,
+            local_endpoint=create_endpoint(
+                80, "service1", "2001:0db8:85a3:0000:0000:8a2e:0370:7334",
+            ),
+            remote_endpoint=create_endpoint(9090, "service2", "10.0.0.2"),
+            shared=True,
+        ),
+    ],
+)
+def test_encode_span_matches_thriftpy2(span):
+    assert _wire.encode_span(span) == thriftpy2_encode_span(span)
+
+
+def test_remote_endpoint_of_other_kinds_is_not_encoded():
+    remote_endpoint = create_endpoint(9090, "kafka", "10.0.0.2")
+    span = Span(
+        "1",
+        "name",
+        None,
+        "3",
+        Kind.LOCAL,
+        10,
+        10,
+        local_endpoint=create_endpoint(8080, "service1", "10.0.0.1"),
+    )
+    with_remote_endpoint = Span(
+        "1",
+        "name",
+        None,
+        "3",
+        Kind.LOCAL,
+        10,
+        10,
+        local_endpoint=create_endpoint(8080, "service1", "10.0.0.1"),
+        remote_endpoint=remote_endpoint,
+    )
+
+    assert _wire.encode_span(with_remote_endpoint) == _wire.encode_span(span)
+
+
+def test_endpoint_cache_is_bounded():
+    with mock.patch.dict(_wire._ENDPOINT_CACHE, clear=True):
+        with mock.patch.object(_wire, "_ENDPOINT_CACHE_MAX_SIZE", 1):
+            _wire.encode_endpoint(create_endpoint(1, "a", "127.0.0.1"))
+            endpoint = create_endpoint(2, "b", "127.0.0.1")
+            encoded = _wire.encode_endpoint(endpoint)
+            assert _wire._ENDPOINT_CACHE == {endpoint: encoded}
+            assert _wire.encode_endpoint(endpoint) is encoded
+
+
+def test_fragment_cache_is_bounded():
+    span = Span(
+        "1",
+        "name",
+        None,
+        "3",
+        Kind.LOCAL,
+        10,
+        10,
+        local_endpoint=create_endpoint(8080, "service1", "10.0.0.1"),
+        tags={"key": "value"},
+    )
+    with mock.patch.dict(_wire._FRAGMENT_CACHE, clear=True):
+        with mock.patch.object(_wire, "_FRAGMENT_CACHE_MAX_SIZE", 1):
+            encoded = _wire.encode_span(span)
+
+            assert len(_wire._FRAGMENT_CACHE) == 1
+            assert _wire.encode_span(span) == encoded
+
+
+def test_kinds_without_v1_annotations_are_not_supported():
+    span = Span(
+        "1",
+        "name",
+        None,
+        "3",
+        Kind.PRODUCER,
+        10,
+        10,
+        local_endpoint=create_endpoint(8080, "service1", "10.0.0.1"),
+    )
+
+    # Same as Span.build_v1_span
+    with pytest.raises(KeyError):
+        span.build_v1_span()
+    with pytest.raises(KeyError):
+        _wire.encode_span(span)
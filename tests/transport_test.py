@@ -1,9 +1,43 @@
 # -*- coding: utf-8 -*-
+import base64
+import errno
+import gzip
+import io
+import json
+import os
+import socket
+import struct
+import threading
+
 import mock
 import pytest
+from six.moves import BaseHTTPServer
+from six.moves import http_client
+from six.moves import socketserver
+from thriftpy2.protocol import TBinaryProtocol
+from thriftpy2.thrift import TApplicationException
+from thriftpy2.thrift import TMessageType
+from thriftpy2.transport import TMemoryBuffer
 
+from py_zipkin import Kind
+from py_zipkin.encoding import create_endpoint
 from py_zipkin.encoding import Encoding
+from py_zipkin.encoding import Span
+from py_zipkin.encoding._encoders import get_encoder
+from py_zipkin.exception import CircuitOpenError
+from py_zipkin.exception import ZipkinError
+from py_zipkin import transport as transport_module
+from py_zipkin.logging_helper import ZipkinBatchSender
+from py_zipkin.transport import CircuitBreaker
+from py_zipkin.transport import Payload
+from py_zipkin.transport import PooledHTTPTransport
+from py_zipkin.thrift import scribe
+from py_zipkin.transport import RetryPolicy
+from py_zipkin.transport import ScribeTransport
 from py_zipkin.transport import SimpleHTTPTransport
+from py_zipkin.transport import UDPTransport
+from py_zipkin.transport import UnixSocketTransport
+from py_zipkin.util import generate_random_64bit_string
 from py_zipkin.zipkin import zipkin_span
 from tests.test_helpers import MockTransportHandler
 
@@ -17,6 +51,135 @@ class TestBaseTransportHandler(object):
             assert transport.send.call_count == 1
             assert transport.send.call_args == mock.call(transport, "foobar")
 
+    def test_call_sends_the_data_of_payload_objects(self):
+        transport = FailingTransport(failures=1)
+        transport.set_retry_policy(RetryPolicy(max_retries=1))
+
+        with mock.patch.object(transport_module.time, "sleep"):
+            transport(Payload("foobar", Encoding.V2_JSON, 1))
+
+        assert transport.calls == 2
+        assert transport.get_payloads() == ["foobar"]
+
+    def test_no_retries_by_default(self):
+        transport = FailingTransport(failures=1)
+
+        with pytest.raises(IOError):
+            transport("foobar")
+
+        assert transport.calls == 1
+
+    def test_retries_with_backoff(self):
+        transport = FailingTransport(failures=2)
+        transport.set_retry_policy(RetryPolicy(max_retries=2))
+
+        with mock.patch.object(transport_module.time, "sleep") as mock_sleep:
+            transport("foobar")
+
+        assert transport.calls == 3
+        assert transport.get_payloads() == ["foobar"]
+        assert mock_sleep.call_count == 2
+
+    def test_gives_up_after_max_retries(self):
+        transport = FailingTransport(failures=3)
+        transport.set_retry_policy(RetryPolicy(max_retries=2))
+
+        with mock.patch.object(transport_module.time, "sleep"):
+            with pytest.raises(IOError):
+                transport("foobar")
+
+        assert transport.calls == 3
+
+    def test_backoff_is_jittered_and_capped(self):
+        policy = RetryPolicy(initial_backoff=0.1, max_backoff=0.3)
+
+        with mock.patch.object(
+            transport_module.random, "uniform", side_effect=lambda a, b: b,
+        ):
+            backoffs = [policy.get_backoff(retry) for retry in range(4)]
+
+        assert backoffs == [0.1, 0.2, 0.3, 0.3]
+        assert 0 <= policy.get_backoff(0) <= 0.1
+
+    def test_circuit_breaker(self):
+        transport = FailingTransport(failures=3)
+        transport.set_circuit_breaker(
+            CircuitBreaker(failure_threshold=2, reset_timeout=10),
+        )
+
+        with mock.patch.object(transport_module, "_clock", return_value=100):
+            for _ in range(2):
+                with pytest.raises(IOError):
+                    transport("foobar")
+            # The breaker is open, don't even try.
+            with pytest.raises(CircuitOpenError):
+                transport("foobar")
+        assert transport.calls == 2
+        assert transport.circuit_breaker.state == CircuitBreaker.OPEN
+
+        # Failed probe.
+        with mock.patch.object(transport_module, "_clock", return_value=110):
+            with pytest.raises(IOError):
+                transport("foobar")
+            with pytest.raises(CircuitOpenError):
+                transport("foobar")
+        assert transport.calls == 3
+
+        # Successful probe.
+        with mock.patch.object(transport_module, "_clock", return_value=120):
+            transport("foobar")
+            transport("foobar")
+        assert transport.calls == 5
+        assert transport.circuit_breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_lets_a_single_probe_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+
+        with mock.patch.object(transport_module, "_clock", return_value=100):
+            breaker.record_failure()
+        with mock.patch.object(transport_module, "_clock", return_value=110):
+            assert breaker.allow_request() is True
+            assert breaker.allow_request() is False
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    def test_retries_stop_when_the_breaker_opens(self):
+        transport = FailingTransport(failures=5)
+        transport.set_retry_policy(RetryPolicy(max_retries=5))
+        transport.set_circuit_breaker(CircuitBreaker(failure_threshold=2))
+
+        with mock.patch.object(transport_module.time, "sleep") as mock_sleep:
+            with pytest.raises(IOError):
+                transport("foobar")
+
+        assert transport.calls == 2
+        assert mock_sleep.call_count == 1
+        transport.set_retry_policy(None)
+        transport.set_circuit_breaker(None)
+        assert FailingTransport.retry_policy is None
+        assert FailingTransport.circuit_breaker is None
+
+
+class TestPayload(object):
+    def test_size(self):
+        assert Payload(b"\x0c\x00", Encoding.V1_THRIFT, 0).size == 2
+        # Text payloads are sent utf-8 encoded.
+        payload = Payload(u'[{"name": "caf\xe9"}]', Encoding.V2_JSON, 1)
+        assert payload.size == len(payload.data) + 1 == 19
+        assert payload.span_count == 1
+
+
+class FailingTransport(MockTransportHandler):
+    def __init__(self, failures):
+        super(FailingTransport, self).__init__()
+        self.failures = failures
+        self.calls = 0
+
+    def send(self, payload):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise IOError("Connection refused")
+        return super(FailingTransport, self).send(payload)
+
 
 class TestSimpleHTTPTransport(object):
     def test_get_max_payload_bytes(self):
@@ -65,3 +228,782 @@ class TestSimpleHTTPTransport(object):
         # I don't understand why, but Type gets lowercased to type by urllib
         # Header keys are case insensitive anyway, so it's not a big deal
         assert request.get_header("Content-type") == "application/json"
+
+    @pytest.mark.parametrize("encoding", [Encoding.V1_THRIFT, Encoding.V2_PROTO3])
+    @mock.patch("py_zipkin.transport.urlopen", autospec=True)
+    def test_send_does_not_detect_the_encoding_of_payloads(
+        self, mock_urlopen, encoding,
+    ):
+        transport = SimpleHTTPTransport("localhost", 9411)
+        with mock.patch.object(
+            transport_module, "detect_span_version_and_encoding", autospec=True,
+        ) as mock_detect, zipkin_span(
+            service_name="my_service",
+            span_name="home",
+            sample_rate=100,
+            transport_handler=transport,
+            encoding=encoding,
+        ):
+            pass
+
+        assert mock_detect.call_count == 0
+        request = mock_urlopen.call_args[0][0]
+        assert request.get_full_url() == "http://localhost:9411{}".format(
+            transport._get_path_content_type(request.data)[0],
+        )
+
+
+class TestHTTPTransportCompression(object):
+    def test_compress(self):
+        transport = SimpleHTTPTransport(
+            "localhost", 9411, compress=True, compression_min_bytes=10,
+        )
+        payload = _v2_json_payload()
+
+        path, body, headers = transport._prepare_request(payload)
+
+        assert path == "/api/v2/spans"
+        assert headers == {
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        }
+        assert gzip.GzipFile(fileobj=io.BytesIO(body)).read() == payload.encode()
+        assert transport.compression_ratio == float(len(payload)) / len(body)
+
+    def test_compression_min_bytes(self):
+        transport = SimpleHTTPTransport("localhost", 9411, compress=True)
+        payload = _v2_json_payload()
+
+        _, body, headers = transport._prepare_request(payload)
+
+        assert body == payload.encode()
+        assert "Content-Encoding" not in headers
+        assert transport.compression_ratio == 1.0
+
+    def test_compression_level(self):
+        payload = b"[" + b", ".join([b'{"traceId": "0000000000000001"}'] * 100) + b"]"
+        sizes = [
+            len(
+                SimpleHTTPTransport(
+                    "localhost", 9411, compress=True, compression_level=level,
+                )._prepare_request(payload)[1]
+            )
+            for level in (0, 9)
+        ]
+
+        assert sizes[0] > len(payload) > sizes[1]
+
+    def test_get_max_payload_bytes(self):
+        transport = SimpleHTTPTransport(
+            "localhost",
+            9411,
+            compress=True,
+            compression_min_bytes=0,
+            max_compressed_payload_bytes=1000,
+        )
+        # Nothing has been compressed yet, so we can't do better than this.
+        assert transport.get_max_payload_bytes() == 1000
+
+        transport._prepare_request(b"[" + b", ".join([b'{"id": "1"}'] * 1000) + b"]")
+
+        assert transport.compression_ratio > 10
+        assert transport.get_max_payload_bytes() == int(
+            1000 * transport.compression_ratio * 0.8
+        )
+
+    def test_get_max_payload_bytes_no_compression(self):
+        transport = SimpleHTTPTransport(
+            "localhost", 9411, max_compressed_payload_bytes=1000,
+        )
+        assert transport.get_max_payload_bytes() == 1000
+
+    @mock.patch("py_zipkin.transport.urlopen", autospec=True)
+    def test_batches_target_the_compressed_budget(self, mock_urlopen):
+        mock_urlopen.return_value.getcode.return_value = 202
+        transport = SimpleHTTPTransport(
+            "localhost",
+            9411,
+            compress=True,
+            compression_min_bytes=0,
+            max_compressed_payload_bytes=2000,
+        )
+        sender = ZipkinBatchSender(transport, 1000, get_encoder(Encoding.V2_JSON))
+
+        with sender:
+            for _ in range(10):
+                sender.add_span(generate_single_span())
+        first_request = mock_urlopen.call_args_list[0][0][0]
+        uncompressed_size = len(
+            gzip.GzipFile(fileobj=io.BytesIO(first_request.data)).read()
+        )
+        assert uncompressed_size <= 2000
+
+        # Now that the compression ratio is known, batches get bigger.
+        mock_urlopen.reset_mock()
+        sender = ZipkinBatchSender(transport, 1000, get_encoder(Encoding.V2_JSON))
+        with sender:
+            for _ in range(100):
+                sender.add_span(generate_single_span())
+        for call in mock_urlopen.call_args_list:
+            assert len(call[0][0].data) <= 2000
+        uncompressed_size = len(
+            gzip.GzipFile(
+                fileobj=io.BytesIO(mock_urlopen.call_args_list[0][0][0].data)
+            ).read()
+        )
+        assert uncompressed_size > 2000
+
+    def test_pooled_transport_sends_gzip(self, collector):
+        transport = PooledHTTPTransport(
+            *collector.server_address, compress=True, compression_min_bytes=0
+        )
+        payload = _v2_json_payload()
+
+        transport.send(payload)
+
+        _, headers, body = collector.requests[0]
+        assert headers["Content-Encoding"] == "gzip"
+        assert gzip.GzipFile(fileobj=io.BytesIO(body)).read() == payload.encode()
+        transport.close()
+
+
+def generate_single_span():
+    return Span(
+        trace_id=generate_random_64bit_string(),
+        name="GET /api/v1/resource",
+        parent_id=None,
+        span_id=generate_random_64bit_string(),
+        kind=Kind.CLIENT,
+        timestamp=1538544126.1159,
+        duration=0.0123,
+        local_endpoint=create_endpoint(8080, "test_service", "10.0.0.1"),
+        tags={"http.status_code": "200"},
+    )
+
+
+class CollectorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server.requests.append((self.path, dict(self.headers), body))
+        server.connections.add(self.client_address)
+
+        status = server.statuses.pop(0) if server.statuses else 202
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        if server.send_connection_close:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        # Close the connection without telling the client, like servers do
+        # with idle keep-alive connections.
+        self.close_connection = server.drop_connections
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeCollector(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), CollectorHandler)
+        self.requests = []
+        self.connections = set()
+        self.statuses = []
+        self.drop_connections = False
+        self.send_connection_close = False
+
+
+@pytest.fixture
+def collector():
+    server = FakeCollector()
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _v2_json_payload():
+    transport = MockTransportHandler()
+    with zipkin_span(
+        service_name="my_service",
+        span_name="home",
+        sample_rate=100,
+        transport_handler=transport,
+        encoding=Encoding.V2_JSON,
+    ):
+        pass
+    return transport.get_payloads()[0]
+
+
+class TestPooledHTTPTransport(object):
+    def test_reuses_connections(self, collector):
+        transport = PooledHTTPTransport(*collector.server_address)
+        payload = _v2_json_payload()
+
+        for _ in range(3):
+            transport.send(payload)
+
+        assert [r[0] for r in collector.requests] == ["/api/v2/spans"] * 3
+        assert collector.requests[0][1]["Content-Type"] == "application/json"
+        assert collector.requests[0][2] == payload.encode("utf-8")
+        assert len(collector.connections) == 1
+        transport.close()
+
+    def test_send_payload(self, collector):
+        transport = PooledHTTPTransport(*collector.server_address)
+        payload = _v2_json_payload()
+
+        # The encoding isn't detected, so it's what decides the path.
+        transport(Payload(payload, Encoding.V1_JSON, 1))
+
+        assert collector.requests[0][0] == "/api/v1/spans"
+        assert collector.requests[0][2] == payload.encode("utf-8")
+        transport.close()
+
+    def test_reconnects_if_the_pooled_connection_was_closed(self, collector):
+        transport = PooledHTTPTransport(*collector.server_address)
+        payload = _v2_json_payload()
+        collector.drop_connections = True
+
+        transport.send(payload)
+        transport.send(payload)
+
+        assert len(collector.requests) == 2
+        assert len(collector.connections) == 2
+        transport.close()
+
+    def test_connection_close_header(self, collector):
+        transport = PooledHTTPTransport(*collector.server_address)
+        collector.send_connection_close = True
+
+        transport.send(_v2_json_payload())
+
+        assert transport._pool.qsize() == 0
+
+    def test_error_status(self, collector):
+        transport = PooledHTTPTransport(*collector.server_address)
+        collector.statuses = [500]
+
+        with pytest.raises(ZipkinError) as e:
+            transport.send(_v2_json_payload())
+
+        assert "500" in str(e.value)
+        # The connection is still good.
+        assert transport._pool.qsize() == 1
+        transport.close()
+        assert transport._pool.qsize() == 0
+
+    def test_does_not_retry_new_connections(self, collector):
+        transport = PooledHTTPTransport(*collector.server_address)
+        connection = mock.Mock()
+        connection.getresponse.side_effect = socket.error("boom")
+
+        with mock.patch.object(
+            transport, "_new_connection", return_value=connection,
+        ), pytest.raises(socket.error):
+            transport.send(_v2_json_payload())
+
+        assert connection.request.call_count == 1
+        assert connection.close.call_count == 1
+        assert transport._pool.qsize() == 0
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            http_client.BadStatusLine("''"),
+            socket.error(errno.ECONNRESET, "Connection reset by peer"),
+            socket.error(errno.EPIPE, "Broken pipe"),
+        ],
+    )
+    def test_retries_stale_pooled_connections(self, collector, error):
+        transport = PooledHTTPTransport(*collector.server_address)
+        stale_connection = mock.Mock()
+        stale_connection.getresponse.side_effect = error
+        transport._release_connection(stale_connection)
+
+        transport.send(_v2_json_payload())
+
+        assert stale_connection.close.call_count == 1
+        assert len(collector.requests) == 1
+        transport.close()
+
+    @pytest.mark.parametrize(
+        "error",
+        [socket.timeout("timed out"), http_client.IncompleteRead(b"")],
+    )
+    def test_does_not_retry_other_errors(self, collector, error):
+        transport = PooledHTTPTransport(*collector.server_address)
+        connection = mock.Mock()
+        connection.getresponse.side_effect = error
+        transport._release_connection(connection)
+
+        with pytest.raises(type(error)):
+            transport.send(_v2_json_payload())
+
+        assert connection.request.call_count == 1
+        assert connection.close.call_count == 1
+        assert collector.requests == []
+
+    def test_does_not_retry_errors_while_reading_the_response(self, collector):
+        transport = PooledHTTPTransport(*collector.server_address)
+        connection = mock.Mock()
+        connection.getresponse.return_value.read.side_effect = socket.error(
+            errno.ECONNRESET, "Connection reset by peer",
+        )
+        transport._release_connection(connection)
+
+        with pytest.raises(socket.error):
+            transport.send(_v2_json_payload())
+
+        assert connection.request.call_count == 1
+        assert collector.requests == []
+
+    def test_connect_error(self):
+        # Nothing is listening on this port.
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        address = sock.getsockname()
+        sock.close()
+        transport = PooledHTTPTransport(*address, connect_timeout=0.5)
+
+        with pytest.raises(socket.error):
+            transport.send(_v2_json_payload())
+
+    def test_timeouts(self, collector):
+        transport = PooledHTTPTransport(
+            *collector.server_address, connect_timeout=0.5, read_timeout=2
+        )
+
+        connection = transport._new_connection()
+
+        assert connection.timeout == 0.5
+        assert connection.sock.gettimeout() == 2
+        connection.close()
+
+    def test_pool_size(self, collector):
+        transport = PooledHTTPTransport(*collector.server_address, pool_size=1)
+        connections = [transport._new_connection() for _ in range(2)]
+
+        for connection in connections:
+            transport._release_connection(connection)
+
+        assert transport._pool.qsize() == 1
+        assert connections[1].sock is None
+        transport.close()
+
+
+@pytest.fixture
+def udp_agent():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(5)
+    yield sock
+    sock.close()
+
+
+class TestUDPTransport(object):
+    def test_send(self, udp_agent):
+        transport = UDPTransport(*udp_agent.getsockname())
+        payload = _v2_json_payload()
+
+        transport.send(payload)
+
+        assert udp_agent.recv(65535) == payload.encode("utf-8")
+        assert transport.get_max_payload_bytes() == 65507
+        transport.close()
+
+    def test_drops_payloads_bigger_than_a_datagram(self, udp_agent):
+        transport = UDPTransport(*udp_agent.getsockname(), max_payload_bytes=10)
+
+        with mock.patch.object(transport, "_socket") as mock_socket:
+            transport.send(b"x" * 11)
+
+        assert transport.payloads_dropped == 1
+        assert mock_socket.sendto.call_count == 0
+
+    def test_send_errors_are_counted(self, udp_agent):
+        transport = UDPTransport(*udp_agent.getsockname())
+
+        with mock.patch.object(transport, "_socket") as mock_socket:
+            mock_socket.sendto.side_effect = socket.error("buffer full")
+            transport.send(b"payload")
+
+        assert transport.send_errors == 1
+
+    def test_batches_fit_in_a_datagram(self, udp_agent):
+        transport = UDPTransport(*udp_agent.getsockname(), max_payload_bytes=1000)
+        encoder = get_encoder(Encoding.V2_JSON)
+
+        with ZipkinBatchSender(transport, 1000, encoder) as sender:
+            for _ in range(20):
+                sender.add_span(generate_single_span())
+
+        datagrams = []
+        received = 0
+        while received < 20:
+            datagram = udp_agent.recv(65535)
+            datagrams.append(datagram)
+            received += len(json.loads(datagram.decode("utf-8")))
+        assert len(datagrams) > 1
+        assert all(len(d) <= 1000 for d in datagrams)
+        assert transport.payloads_dropped == 0
+
+
+@pytest.fixture
+def unix_listener(tmpdir):
+    path = str(tmpdir.join("agent.sock"))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(5)
+    sock.settimeout(5)
+    yield path, sock
+    sock.close()
+
+
+def _read_frame(reader):
+    (size,) = struct.unpack("!I", reader.read(4))
+    return reader.read(size)
+
+
+class TestUnixSocketTransport(object):
+    def test_send(self, unix_listener):
+        path, listener = unix_listener
+        transport = UnixSocketTransport(path, max_payload_bytes=1000)
+
+        transport.send(u"[\"ünicode\"]")
+        transport.send(b"second")
+        conn, _ = listener.accept()
+        conn.settimeout(5)
+        reader = conn.makefile("rb")
+
+        assert _read_frame(reader) == u"[\"ünicode\"]".encode("utf-8")
+        assert _read_frame(reader) == b"second"
+        assert transport.get_max_payload_bytes() == 1000
+        reader.close()
+        conn.close()
+        transport.close()
+
+    def test_connection_errors_are_raised(self, tmpdir):
+        transport = UnixSocketTransport(str(tmpdir.join("missing.sock")))
+
+        with pytest.raises(socket.error):
+            transport.send(b"payload")
+        assert transport._socket is None
+
+    def test_reconnects_once_when_the_connection_breaks(self, unix_listener):
+        path, _ = unix_listener
+        transport = UnixSocketTransport(path)
+        transport.send(b"first")
+        transport._socket.close()
+        broken_socket = mock.Mock()
+        broken_socket.sendall.side_effect = socket.error("broken pipe")
+        transport._socket = broken_socket
+
+        transport.send(b"second")
+
+        assert broken_socket.close.call_count == 1
+        assert transport._socket is not broken_socket
+        transport.close()
+        assert transport._socket is None
+
+    def test_new_connection_errors_are_not_retried(self, unix_listener):
+        path, _ = unix_listener
+        transport = UnixSocketTransport(path)
+
+        with mock.patch.object(
+            transport, "_connect", side_effect=transport._connect,
+        ) as mock_connect, mock.patch(
+            "py_zipkin.transport.socket.socket.sendall",
+            side_effect=socket.error("broken pipe"),
+        ):
+            with pytest.raises(socket.error):
+                transport.send(b"payload")
+
+        assert mock_connect.call_count == 1
+        assert transport._socket is None
+
+    def test_reconnects_after_fork(self, unix_listener):
+        path, _ = unix_listener
+        transport = UnixSocketTransport(path)
+        transport.send(b"parent")
+        parent_socket = transport._socket
+
+        with mock.patch.object(os, "getpid", return_value=transport._pid + 1):
+            transport.send(b"child")
+
+        assert transport._socket is not parent_socket
+        parent_socket.close()
+        transport.close()
+
+
+class ScribeHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        server.connections.append(self.client_address)
+        reader = self.request.makefile("rb")
+        held = []
+        while True:
+            header = reader.read(4)
+            if len(header) < 4:
+                break
+            (size,) = struct.unpack("!I", header)
+            protocol = TBinaryProtocol(TMemoryBuffer(reader.read(size)))
+            _, _, seqid = protocol.read_message_begin()
+            args = scribe.scribe.Log_args()
+            args.read(protocol)
+            server.messages.extend(args.messages)
+            if server.close_without_answering:
+                break
+
+            # Answer in bursts, to check that the client doesn't wait.
+            held.append(seqid)
+            if len(held) >= server.answer_every:
+                for seqid in held:
+                    self.request.sendall(server.response(seqid))
+                held = []
+        reader.close()
+
+
+class FakeScribeCollector(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        socketserver.TCPServer.__init__(self, ("127.0.0.1", 0), ScribeHandler)
+        self.messages = []
+        self.connections = []
+        # ResultCodes or TApplicationExceptions to answer with, then OK.
+        self.results = []
+        self.answer_every = 1
+        self.seqid_offset = 0
+        self.close_without_answering = False
+
+    def response(self, seqid):
+        result = self.results.pop(0) if self.results else scribe.ResultCode.OK
+        buffer = TMemoryBuffer()
+        protocol = TBinaryProtocol(buffer)
+        seqid += self.seqid_offset
+        if isinstance(result, TApplicationException):
+            protocol.write_message_begin("Log", TMessageType.EXCEPTION, seqid)
+            result.write(protocol)
+        else:
+            protocol.write_message_begin("Log", TMessageType.REPLY, seqid)
+            scribe.scribe.Log_result(success=result).write(protocol)
+        protocol.write_message_end()
+        message = buffer.getvalue()
+        return struct.pack("!I", len(message)) + message
+
+    def payloads(self):
+        assert all(m.category == "zipkin" for m in self.messages)
+        return [base64.b64decode(m.message) for m in self.messages]
+
+
+@pytest.fixture
+def scribe_collector():
+    server = FakeScribeCollector()
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestScribeTransport(object):
+    def test_pipelines_calls_on_one_connection(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address)
+        scribe_collector.answer_every = 3
+
+        # The collector only answers after the third call, so this would
+        # time out if send waited for each response.
+        for payload in [b"first", b"second", b"third"]:
+            transport.send(payload)
+        transport.flush()
+
+        assert scribe_collector.payloads() == [b"first", b"second", b"third"]
+        assert len(scribe_collector.connections) == 1
+        assert len(transport._pending) == 0
+        transport.close()
+
+    def test_waits_when_max_pending_is_reached(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address, max_pending=1)
+
+        transport.send(b"first")
+        assert len(transport._pending) == 0
+        transport.send(b"second")
+
+        assert scribe_collector.payloads() == [b"first", b"second"]
+        transport.close()
+
+    def test_sends_spans_from_zipkin_span(self, scribe_collector):
+        transport = ScribeTransport(
+            *scribe_collector.server_address, max_payload_bytes=1000
+        )
+        with zipkin_span(
+            service_name="my_service",
+            span_name="home",
+            sample_rate=100,
+            transport_handler=transport,
+            encoding=Encoding.V1_THRIFT,
+        ):
+            pass
+        transport.close()
+
+        (payload,) = scribe_collector.payloads()
+        assert b"home" in payload
+        assert transport.get_max_payload_bytes() == 1000
+
+    def test_rejects_other_encodings(self):
+        transport = ScribeTransport("localhost", 9410)
+
+        with pytest.raises(ZipkinError):
+            transport.send(u"[]")
+        with pytest.raises(ZipkinError, match="V2_PROTO3"):
+            transport(Payload(b"\x0a\x00", Encoding.V2_PROTO3, 1))
+        assert transport._socket is None
+
+    def test_try_later(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address, max_pending=1)
+        scribe_collector.results = [scribe.ResultCode.TRY_LATER]
+
+        with pytest.raises(ZipkinError, match="busy"):
+            transport.send(b"first")
+        transport.send(b"second")
+
+        assert transport.payloads_rejected == 1
+        assert len(scribe_collector.connections) == 1
+        transport.close()
+
+    def test_collector_exceptions(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address, max_pending=1)
+        scribe_collector.results = [TApplicationException(message="oops")]
+
+        with pytest.raises(ZipkinError, match="oops"):
+            transport.send(b"payload")
+        transport.close()
+
+    def test_unexpected_responses_reset_the_connection(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address, max_pending=1)
+        scribe_collector.seqid_offset = 1
+
+        with pytest.raises(ZipkinError, match="Unexpected"):
+            transport.send(b"payload")
+
+        assert transport._socket is None
+        assert len(transport._pending) == 0
+
+    def test_new_connection_errors_are_raised(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address, max_pending=1)
+        scribe_collector.close_without_answering = True
+
+        with pytest.raises(socket.error, match="closed"):
+            transport.send(b"payload")
+
+        assert transport._socket is None
+        assert len(transport._pending) == 0
+
+    def test_resends_pending_calls_when_the_connection_breaks(
+        self, scribe_collector,
+    ):
+        transport = ScribeTransport(*scribe_collector.server_address)
+        scribe_collector.answer_every = 2
+        transport.send(b"first")
+        transport._socket.close()
+        broken_socket = mock.Mock()
+        broken_socket.sendall.side_effect = socket.error("broken pipe")
+        transport._socket = broken_socket
+
+        transport.send(b"second")
+        transport.flush()
+
+        # The first payload hadn't been acknowledged, so it's sent again.
+        assert scribe_collector.payloads() == [b"first", b"first", b"second"]
+        assert len(scribe_collector.connections) == 2
+        transport.close()
+
+    def test_gives_up_if_the_new_connection_fails(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address, max_pending=2)
+        transport.send(b"first")
+        transport._socket.close()
+        transport._socket = mock.Mock()
+        transport._socket.sendall.side_effect = socket.error("broken pipe")
+        scribe_collector.close_without_answering = True
+
+        with pytest.raises(socket.error):
+            transport.send(b"second")
+
+        assert transport._socket is None
+        assert len(transport._pending) == 0
+
+    def test_timeouts_are_not_retried(self, scribe_collector):
+        transport = ScribeTransport(
+            *scribe_collector.server_address, max_pending=1, timeout=0.05
+        )
+        scribe_collector.answer_every = 10
+
+        with pytest.raises(socket.timeout):
+            transport.send(b"payload")
+
+        assert transport._socket is None
+        assert len(transport._pending) == 0
+        assert len(scribe_collector.connections) == 1
+
+    def test_reads_responses_split_across_packets(self, scribe_collector):
+        transport = ScribeTransport("localhost", 9410, max_pending=1)
+        response = scribe_collector.response(1)
+        transport._socket = mock.Mock()
+        transport._socket.recv.side_effect = [response[:2], response[2:9], response[9:]]
+        transport._pid = os.getpid()
+
+        transport.send(b"payload")
+
+        assert transport._socket.recv.call_count == 3
+        assert len(transport._pending) == 0
+
+    def _close_connection(self, transport):
+        # The collector closed the connection without answering.
+        transport._socket.close()
+        transport._socket = mock.Mock()
+        transport._socket.recv.return_value = b""
+
+    def test_flush_errors(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address)
+        transport.flush()
+        scribe_collector.answer_every = 10
+        transport.send(b"payload")
+        self._close_connection(transport)
+
+        with pytest.raises(socket.error):
+            transport.flush()
+
+        assert transport._socket is None
+        assert len(transport._pending) == 0
+
+    def test_close_logs_flush_errors(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address)
+        scribe_collector.answer_every = 10
+        transport.send(b"payload")
+        self._close_connection(transport)
+
+        with mock.patch.object(transport_module.log, "warning") as mock_warning:
+            transport.close()
+
+        assert mock_warning.call_count == 1
+        assert transport._socket is None
+
+    def test_reconnects_after_fork(self, scribe_collector):
+        transport = ScribeTransport(*scribe_collector.server_address, max_pending=1)
+        transport.send(b"parent")
+        parent_socket = transport._socket
+
+        with mock.patch.object(os, "getpid", return_value=transport._pid + 1):
+            transport.send(b"child")
+
+        assert transport._socket is not parent_socket
+        assert len(scribe_collector.connections) == 2
+        parent_socket.close()
+        transport.close()
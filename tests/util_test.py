@@ -1,6 +1,7 @@
 import sys
 
 import mock
+import pytest
 
 from py_zipkin import util
 from py_zipkin.util import ZipkinAttrs
@@ -81,3 +82,56 @@ def test_create_attrs_for_span(random_64bit_mock, random_128bit_mock):
         is_sampled=True,
     )
     assert expected_attrs == util.create_attrs_for_span(use_128bit_trace_id=True)
+
+
+def test_create_attrs_for_span_with_sampler():
+    sampler = mock.Mock()
+    sampler.should_sample.return_value = True
+
+    attrs = util.create_attrs_for_span(
+        sample_rate=0.0,
+        trace_id="0000000000000045",
+        sampler=sampler,
+        span_name="span_name",
+    )
+
+    assert attrs.is_sampled is True
+    assert sampler.should_sample.call_args == mock.call(
+        "0000000000000045", "span_name",
+    )
+
+
+@pytest.mark.parametrize(
+    "trace_id,sample_rate,expected",
+    [
+        ("0000000000000000", 0.0, False),
+        ("ffffffffffffffff", 100.0, True),
+        ("0000000000000000", 0.001, True),
+        ("7fffffffffffffff", 50.0, True),
+        ("8000000000000000", 50.0, False),
+        # Only the lower 64 bits of 128 bit ids are used.
+        ("ffffffffffffffff7fffffffffffffff", 50.0, True),
+    ],
+)
+def test_should_sample_trace_id(trace_id, sample_rate, expected):
+    assert util._should_sample_trace_id(trace_id, sample_rate) is expected
+
+
+@mock.patch("py_zipkin.util.random.random", autospec=True)
+def test_should_sample_trace_id_not_hex(mock_random):
+    mock_random.return_value = 0.1
+    assert util._should_sample_trace_id("zzzz-not-hex", 20.0) is True
+    mock_random.return_value = 0.3
+    assert util._should_sample_trace_id("zzzz-not-hex", 20.0) is False
+    assert util._should_sample_trace_id("", 20.0) is False
+
+
+@mock.patch("py_zipkin.util.random.random", autospec=True)
+def test_create_attrs_for_span_sample_by_trace_id(mock_random):
+    assert util.create_attrs_for_span(
+        sample_rate=50.0, trace_id="7fffffffffffffff", sample_by_trace_id=True,
+    ).is_sampled
+    assert not util.create_attrs_for_span(
+        sample_rate=50.0, trace_id="8000000000000000", sample_by_trace_id=True,
+    ).is_sampled
+    assert mock_random.call_count == 0
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import inspect
+import json
 import time
 
 import mock
@@ -12,6 +13,7 @@ from py_zipkin import Kind
 from py_zipkin.encoding._helpers import create_endpoint
 from py_zipkin.encoding._helpers import Span
 from py_zipkin.exception import ZipkinError
+from py_zipkin.sampling import Sampler
 from py_zipkin.storage import default_span_storage
 from py_zipkin.storage import get_default_tracer
 from py_zipkin.storage import SpanStorage
@@ -286,7 +288,10 @@ class TestZipkinSpan(object):
         report_root, _ = context._get_current_context()
 
         assert mock_create_attr.call_args == mock.call(
-            sample_rate=100.0, trace_id=zipkin_attrs.trace_id,
+            sample_rate=100.0,
+            trace_id=zipkin_attrs.trace_id,
+            sampler=None,
+            span_name="test_span",
         )
         # It wasn't sampled before and now it is, so this is the trace root
         assert report_root is True
@@ -336,11 +341,32 @@ class TestZipkinSpan(object):
         report_root, _ = context._get_current_context()
 
         assert mock_create_attr.call_args == mock.call(
-            sample_rate=100.0, use_128bit_trace_id=False,
+            sample_rate=100.0,
+            use_128bit_trace_id=False,
+            sampler=None,
+            span_name="test_span",
         )
         # No override, which means this is for sure the trace root
         assert report_root is True
 
+    def test_get_current_context_root_sampler(self):
+        sampler = mock.Mock(spec=Sampler)
+        sampler.should_sample.return_value = True
+        context = zipkin.zipkin_span(
+            service_name="test_service",
+            span_name="test_span",
+            transport_handler=MockTransportHandler(),
+            sampler=sampler,
+        )
+
+        report_root, attrs = context._get_current_context()
+
+        assert report_root is True
+        assert attrs.is_sampled is True
+        assert sampler.should_sample.call_args == mock.call(
+            attrs.trace_id, "test_span",
+        )
+
     @mock.patch.object(zipkin, "create_attrs_for_span", autospec=True)
     def test_get_current_context_root_no_sample_rate_no_override_firehose(
         self, mock_create_attr,
@@ -451,6 +477,8 @@ class TestZipkinSpan(object):
             firehose_handler=firehose,
             encoding=Encoding.V2_JSON,
             annotations={},
+            max_buffered_spans=None,
+            max_buffer_seconds=None,
         )
         assert mock_log_ctx.return_value.start.call_count == 1
         assert tracer.is_transport_configured() is True
@@ -856,3 +884,72 @@ def test_create_headers_for_new_span(mock_create_http_headers):
 
     assert mock_create_http_headers.call_count == 1
     assert mock_create_http_headers.call_args == mock.call(context_stack, tracer, True,)
+
+
+@pytest.mark.parametrize(
+    "flush_kwargs", [{"max_buffered_spans": 2}, {"max_buffer_seconds": 0}],
+)
+def test_zipkin_span_flushes_child_spans_incrementally(flush_kwargs):
+    transport = MockTransportHandler()
+    tracer = MockTracer()
+
+    with tracer.zipkin_span(
+        service_name="test_service",
+        span_name="root",
+        transport_handler=transport,
+        sample_rate=100.0,
+        encoding=Encoding.V2_JSON,
+        **flush_kwargs
+    ):
+        for name in ["a", "b"]:
+            with tracer.zipkin_span(service_name="test_service", span_name=name):
+                pass
+        # Child spans have been sent while the root span is still open.
+        assert len(transport.get_payloads()) > 0
+        assert len(tracer.get_spans()) == 0
+
+    names = [
+        span["name"]
+        for payload in transport.get_payloads()
+        for span in json.loads(payload)
+    ]
+    assert names == ["a", "b", "root"]
+    assert tracer._span_added_callback is None
+
+
+def test_zipkin_span_restores_the_enclosing_flush_callback():
+    tracer = MockTracer()
+    outer_callback = mock.Mock()
+    tracer.set_span_added_callback(outer_callback)
+
+    with tracer.zipkin_span(
+        service_name="test_service",
+        span_name="inner_root",
+        transport_handler=MockTransportHandler(),
+        sample_rate=100.0,
+        max_buffered_spans=2,
+    ):
+        assert tracer.get_span_added_callback() is not outer_callback
+
+    assert tracer.get_span_added_callback() is outer_callback
+
+
+def test_zipkin_span_decorator_passes_flush_settings():
+    transport = MockTransportHandler()
+    tracer = MockTracer()
+
+    @tracer.zipkin_span(
+        service_name="test_service",
+        span_name="root",
+        transport_handler=transport,
+        sample_rate=100.0,
+        encoding=Encoding.V2_JSON,
+        max_buffered_spans=1,
+    )
+    def root():
+        with tracer.zipkin_span(service_name="test_service", span_name="child"):
+            pass
+        assert len(transport.get_payloads()) == 1
+
+    root()
+    assert len(transport.get_payloads()) == 2